@@ -429,7 +429,7 @@ create_sdcard_image() {
     SDIMG_PARM="${SDIMG_PARM# }"
     debug "SDIMG_PARM=$SDIMG_PARM"
 
-    SDIMG_GEN_CMD="python3 $GEN_SDIMG_TOOL -o $SDIMG_PATH -P $SDIMG_PARM"
+    SDIMG_GEN_CMD="python3 $GEN_SDIMG_TOOL -j $(nproc) -o $SDIMG_PATH -P $SDIMG_PARM"
     if [ "$DEBUG" = "TRUE" ]; then
         SDIMG_GEN_CMD+=" -d -v"
         debug "SDIMG_GEN_CMD: $SDIMG_GEN_CMD"
@@ -527,7 +527,7 @@ main() {
 
     generate_axp_parameters "${IMAGE_NAMES_ARRAY[@]}"
 
-    AXP_GEN_CMD="python3 $GEN_AXP_TOOL -n $PROJECT -v $VERSION_EXT -x $PAC_XML_PATH -o $AXP_PATH -P ${AXP_PARM}"
+    AXP_GEN_CMD="python3 $GEN_AXP_TOOL -j $(nproc) -n $PROJECT -v $VERSION_EXT -x $PAC_XML_PATH -o $AXP_PATH -P ${AXP_PARM}"
 
     if [ "$DEBUG" = "TRUE" ]; then
         AXP_GEN_CMD+=" -d -V"
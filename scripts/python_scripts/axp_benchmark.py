@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+# Copyright (C) 2025, Charleye
+#
+# Throughput benchmarks for the AXP packaging helpers.
+#
+# Usage:
+#   python3 axp_benchmark.py crc16 [--size 1G] [--legacy-size 64M]
+#   python3 axp_benchmark.py deflate [--size 512M] [--jobs 1,2,4,8]
+#   python3 axp_benchmark.py auth [--size 1G]
+#   python3 axp_benchmark.py delta [--base OLD_IMG --target NEW_IMG] [--size 256M]
+#   python3 axp_benchmark.py sha1 [--partitions 10] [--size 128M] [--jobs 1,2,4,8]
+#   python3 axp_benchmark.py bundle [--scale 1.0] [--jobs N] [--zstd-level 3]
+#
+# Commands:
+#   crc16       Compare the CRC16 backends of checksum.py against the
+#               original byte-by-byte implementation of create_axp.py
+#   deflate     Scaling of the parallel DEFLATE backend of fastzip.py
+#   auth        Throughput of every <Auth> algorithm of create_axp.py
+#   delta       Package size and encode/apply time of axp_delta.py for two
+#               revisions of an image (e.g. rootfs), or a synthetic pair
+#   sha1        Copy and sha1sum.txt stage of create_sdcard_image.py for a
+#               synthetic SD bundle, sequential versus thread pool
+#   bundle      Build time, unpack time and size of the zip, tar and
+#               tar.zst SD bundles of create_sdcard_image.py
+#
+# For any questions, please contact: wangkart@aliyun.com
+
+import os
+import sys
+import mmap
+import time
+import hashlib
+import random
+import zipfile
+import argparse
+import tempfile
+
+import checksum
+from fastzip import FastZipFile, default_jobs, parse_size
+from axp_delta import DeltaEncoder, apply_delta, DEFAULT_DELTA_BLOCK_SIZE
+
+BLOCK_SIZE = 10 * 1024 * 1024
+
+def synthetic_blocks(total_size, block_size=BLOCK_SIZE, compressible=False):
+    """
+    Yield 'total_size' bytes of synthetic data in block_size pieces.
+
+    A single random block is reused with its first bytes changed, so
+    generating gigabytes of input costs almost nothing. Compressible
+    data uses 16 symbols per byte, which deflates to roughly 55%.
+    """
+    rnd = random.Random(0)
+    size = min(block_size, total_size)
+    if compressible:
+        tile = bytes(rnd.choices(range(16), k=min(size, 1024 * 1024)))
+        pattern = bytearray((tile * (size // len(tile) + 1))[:size])
+    else:
+        pattern = bytearray(rnd.randbytes(size))
+    produced = 0
+    index = 0
+    while produced < total_size:
+        size = min(block_size, total_size - produced)
+        pattern[:8] = index.to_bytes(8, 'little')
+        yield memoryview(pattern)[:size]
+        produced += size
+        index += 1
+
+def legacy_crc16(crc, block):
+    # Original create_axp.calc_crc16 inner loop, kept as the baseline
+    table = checksum.CRC16_TABLE
+    for data in block:
+        crc = (crc >> 8) ^ (table[(crc ^ data) & 0xFF])
+    return crc
+
+def run_crc16(func, total_size):
+    crc = 0
+    start = time.perf_counter()
+    for block in synthetic_blocks(total_size):
+        crc = func(crc, block)
+    return crc, time.perf_counter() - start
+
+def format_rate(size, elapsed):
+    return f"{size / (1024 * 1024) / elapsed:10.1f} MB/s" if elapsed else "       inf MB/s"
+
+def bench_crc16(args):
+    size = parse_size(args.size)
+    legacy_size = min(parse_size(args.legacy_size), size)
+    backends = args.backend or checksum.available_crc16_backends()
+
+    print(f"CRC16 throughput, {size} bytes of synthetic data")
+    print(f"{'backend':<10} {'bytes':>14} {'seconds':>10} {'throughput':>15} {'speedup':>8}")
+
+    ref_crc, legacy_time = run_crc16(legacy_crc16, legacy_size)
+    legacy_rate = legacy_size / legacy_time
+    print(f"{'legacy':<10} {legacy_size:>14} {legacy_time:>10.2f} {format_rate(legacy_size, legacy_time):>15} {1.0:>7.1f}x")
+
+    for name in backends:
+        func = checksum.CRC16_BACKENDS[name]
+        check_crc, _ = run_crc16(func, legacy_size)
+        if check_crc != ref_crc:
+            print(f"Error: backend {name} returned {hex(check_crc)}, expected {hex(ref_crc)}")
+            sys.exit(1)
+        crc, elapsed = run_crc16(func, size)
+        speedup = (size / elapsed) / legacy_rate if elapsed else float('inf')
+        print(f"{name:<10} {size:>14} {elapsed:>10.2f} {format_rate(size, elapsed):>15} {speedup:>7.1f}x  crc={hex(crc)}")
+
+    if legacy_size < size:
+        print(f"legacy estimate for {size} bytes: {size / legacy_rate:.1f} s")
+
+def bench_deflate(args):
+    size = parse_size(args.size)
+    if args.jobs:
+        jobs_list = [int(j) for j in args.jobs.split(',')]
+    else:
+        jobs_list = sorted({1 << n for n in range(default_jobs().bit_length())} | {default_jobs()})
+
+    print(f"DEFLATE scaling, {size} bytes of synthetic data, level {args.level}, {default_jobs()} CPUs")
+    print(f"{'jobs':>5} {'seconds':>10} {'throughput':>15} {'ratio':>7} {'speedup':>8}")
+
+    base_time = None
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        zip_path = os.path.join(tmp_dir, 'bench.zip')
+        for jobs in jobs_list:
+            start = time.perf_counter()
+            with FastZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED, compresslevel=args.level, jobs=jobs) as zf:
+                with zf.open('member.bin', 'w', force_zip64=True) as dst:
+                    for block in synthetic_blocks(size, compressible=True):
+                        dst.write(block)
+            elapsed = time.perf_counter() - start
+            if base_time is None:
+                base_time = elapsed
+
+            with zipfile.ZipFile(zip_path) as zf:
+                bad = zf.testzip()
+                ratio = zf.getinfo('member.bin').compress_size / size
+            if bad:
+                print(f"Error: member {bad} failed CRC check with {jobs} jobs")
+                sys.exit(1)
+            print(f"{jobs:>5} {elapsed:>10.2f} {format_rate(size, elapsed):>15} {ratio:>7.3f} {base_time / elapsed:>7.1f}x")
+
+def bench_auth(args):
+    from create_axp import AUTH_ALGOS
+
+    size = parse_size(args.size)
+    print(f"<Auth> throughput, {size} bytes of synthetic data")
+    print(f"{'algo':>4} {'name':<8} {'seconds':>10} {'throughput':>15}  digest")
+    for algo, factory in AUTH_ALGOS.items():
+        hasher = factory()
+        start = time.perf_counter()
+        for block in synthetic_blocks(size):
+            hasher.update(block)
+        elapsed = time.perf_counter() - start
+        print(f"{algo:>4} {hasher.name:<8} {elapsed:>10.2f} {format_rate(size, elapsed):>15}  {hasher.hexdigest()}")
+
+def make_revisions(tmp_dir, size, change):
+    """
+    Write a synthetic base image and a revision of it with 'change' of
+    its bytes rewritten in scattered 1 MiB extents and 64 KiB inserted
+    near the middle, which shifts every following block.
+    """
+    base_path = os.path.join(tmp_dir, 'base.img')
+    target_path = os.path.join(tmp_dir, 'target.img')
+    with open(base_path, 'wb') as f:
+        for block in synthetic_blocks(size, compressible=True):
+            f.write(block)
+    rnd = random.Random(1)
+    with open(base_path, 'rb') as src, open(target_path, 'wb') as dst:
+        data = bytearray(src.read())
+        extent = 1024 * 1024
+        for _ in range(int(size * change) // extent):
+            offset = rnd.randrange(0, max(1, size - extent))
+            data[offset:offset + extent] = rnd.randbytes(extent)
+        middle = size // 2
+        data[middle:middle] = rnd.randbytes(64 * 1024)
+        dst.write(data)
+    return base_path, target_path
+
+def bench_delta(args):
+    block_size = parse_size(args.block_size)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if args.base and args.target:
+            base_path, target_path = args.base, args.target
+        else:
+            base_path, target_path = make_revisions(tmp_dir, parse_size(args.size), args.change)
+        target_size = os.path.getsize(target_path)
+        full_path = os.path.join(tmp_dir, 'full.axp')
+        delta_path = os.path.join(tmp_dir, 'delta.axp')
+        rebuilt_path = os.path.join(tmp_dir, 'rebuilt.img')
+
+        start = time.perf_counter()
+        with FastZipFile(full_path, 'w', zipfile.ZIP_DEFLATED, jobs=args.jobs) as zf:
+            zf.write(target_path, 'target.img')
+        full_time = time.perf_counter() - start
+
+        with open(base_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data, \
+                memoryview(data) as base:
+            start = time.perf_counter()
+            encoder = DeltaEncoder(base, block_size)
+            with FastZipFile(delta_path, 'w', zipfile.ZIP_DEFLATED, jobs=args.jobs) as zf, \
+                    open(target_path, 'rb') as src, zf.open('target.img.delta', 'w', force_zip64=True) as dst:
+                stats = encoder.encode(src, dst, target_size)
+            encode_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            sha256 = hashlib.sha256()
+            with zipfile.ZipFile(delta_path) as zf, zf.open('target.img.delta') as src, \
+                    open(rebuilt_path, 'wb') as dst:
+                apply_delta(base, src, dst, [sha256])
+            apply_time = time.perf_counter() - start
+            del encoder
+
+        if sha256.hexdigest() != stats['target_sha256']:
+            print("Error: rebuilt image does not match the target")
+            sys.exit(1)
+
+        full_size = os.path.getsize(full_path)
+        delta_size = os.path.getsize(delta_path)
+        print(f"Delta of {target_size} bytes against {os.path.getsize(base_path)} bytes, "
+              f"{block_size} byte blocks")
+        print(f"  reused from base: {stats['copied']:>14} bytes")
+        print(f"  new data:         {stats['literal']:>14} bytes")
+        print(f"{'package':<8} {'bytes':>14} {'ratio':>7} {'build s':>9} {'apply s':>9}")
+        print(f"{'full':<8} {full_size:>14} {full_size / target_size:>7.3f} {full_time:>9.2f} {'-':>9}")
+        print(f"{'delta':<8} {delta_size:>14} {delta_size / target_size:>7.3f} {encode_time:>9.2f} {apply_time:>9.2f}")
+
+def bench_sha1(args):
+    import shutil
+    from digest_cache import DigestCache
+    from create_sdcard_image import Sha1Manifest, calc_sha1
+
+    size = parse_size(args.size)
+    if args.jobs:
+        jobs_list = [int(j) for j in args.jobs.split(',')]
+    else:
+        jobs_list = sorted({1 << n for n in range(default_jobs().bit_length())} | {default_jobs()})
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        inputs = []
+        for index in range(args.partitions):
+            path = os.path.join(tmp_dir, f'part{index}.img')
+            with open(path, 'wb') as f:
+                for block in synthetic_blocks(size):
+                    block[8:16] = index.to_bytes(8, 'little')
+                    f.write(block)
+            inputs.append(path)
+        bundle_dir = os.path.join(tmp_dir, 'bundle')
+
+        def reset_bundle():
+            shutil.rmtree(bundle_dir, ignore_errors=True)
+            os.makedirs(bundle_dir)
+
+        def copy_inputs(manifest=None):
+            for path in inputs:
+                if manifest:
+                    manifest.add(path, os.path.basename(path))
+                shutil.copy(path, bundle_dir)
+
+        print(f"sha1sum.txt of {args.partitions} partitions of {size} bytes, {default_jobs()} CPUs")
+        print(f"{'jobs':>10} {'seconds':>10} {'throughput':>15} {'speedup':>8}")
+        total_size = size * args.partitions
+
+        # Copy everything, then hash one file after the other
+        start = time.perf_counter()
+        reset_bundle()
+        copy_inputs()
+        with open(os.path.join(bundle_dir, 'sha1sum.txt'), 'w') as f:
+            for path in inputs:
+                f.write(f"{calc_sha1(path)}  {os.path.basename(path)}\n")
+        base_time = time.perf_counter() - start
+        with open(os.path.join(bundle_dir, 'sha1sum.txt')) as f:
+            expected = f.read()
+        print(f"{'sequential':>10} {base_time:>10.2f} {format_rate(total_size, base_time):>15} {1:>7.1f}x")
+
+        for jobs in jobs_list:
+            start = time.perf_counter()
+            # The manifest opens sha1sum.txt right away, in the emptied bundle
+            reset_bundle()
+            with DigestCache(enabled=False) as cache, \
+                    Sha1Manifest(cache, os.path.join(bundle_dir, 'sha1sum.txt'), jobs) as manifest:
+                copy_inputs(manifest)
+                manifest.finish()
+            elapsed = time.perf_counter() - start
+            with open(os.path.join(bundle_dir, 'sha1sum.txt')) as f:
+                if f.read() != expected:
+                    print(f"Error: sha1sum.txt differs with {jobs} jobs")
+                    sys.exit(1)
+            print(f"{jobs:>10} {elapsed:>10.2f} {format_rate(total_size, elapsed):>15} {base_time / elapsed:>7.1f}x")
+
+# Partition set of an SD bundle: name, size in MiB, compressible content
+SD_PARTITIONS = [
+    ('FDL2', 1, False), ('ATF_A', 1, False), ('ATF_B', 1, False),
+    ('UBOOT_A', 2, False), ('UBOOT_B', 2, False), ('BOOT', 64, False),
+    ('DTB', 1, True), ('KERNEL', 32, True), ('ROOTFS', 512, True), ('FDL_PARTITION', 1, True),
+]
+
+def bench_bundle(args):
+    import shutil
+    import tarfile
+    import subprocess
+    from zstdio import open_zstd_reader
+
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'create_sdcard_image.py')
+    jobs = args.jobs or default_jobs()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        partitions = []
+        total_size = 0
+        for name, size_mb, compressible in SD_PARTITIONS:
+            path = os.path.join(tmp_dir, name.lower() + '.img')
+            size = int(size_mb * args.scale * 1024 * 1024)
+            with open(path, 'wb') as f:
+                for block in synthetic_blocks(size, compressible=compressible):
+                    f.write(block)
+            partitions.append(f'{name}={path}')
+            total_size += size
+
+        print(f"SD bundle of {len(partitions)} partitions, {total_size} bytes, {jobs} jobs, "
+              f"zstd level {args.zstd_level}")
+        print(f"{'format':<8} {'bytes':>12} {'ratio':>7} {'build s':>9} {'unpack s':>9}")
+        for fmt in ('zip', 'tar', 'tar.zst'):
+            output = os.path.join(tmp_dir, 'sdcard.' + fmt)
+            command = [sys.executable, script, '-F', fmt, '-o', output, '-j', str(jobs),
+                       '-L', str(args.zstd_level), '--no-digest-cache', '-P'] + partitions
+            start = time.perf_counter()
+            subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+            build_time = time.perf_counter() - start
+
+            unpack_dir = os.path.join(tmp_dir, 'unpack')
+            start = time.perf_counter()
+            if fmt == 'zip':
+                with zipfile.ZipFile(output) as zf:
+                    zf.extractall(unpack_dir)
+            elif fmt == 'tar':
+                with tarfile.open(output) as tar:
+                    tar.extractall(unpack_dir)
+            else:
+                with open_zstd_reader(output) as stream, tarfile.open(fileobj=stream, mode='r|') as tar:
+                    tar.extractall(unpack_dir)
+            unpack_time = time.perf_counter() - start
+            shutil.rmtree(unpack_dir)
+
+            size = os.path.getsize(output)
+            print(f"{fmt:<8} {size:>12} {size / total_size:>7.3f} {build_time:>9.2f} {unpack_time:>9.2f}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark AXP packaging helpers.',
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    crc16 = subparsers.add_parser('crc16', help='CRC16 backend throughput')
+    crc16.add_argument('-s', '--size', default='1G', help='Amount of synthetic data (default: 1G)')
+    crc16.add_argument('-l', '--legacy-size', default='64M',
+                       help='Amount of data fed to the slow legacy loop (default: 64M)')
+    crc16.add_argument('-b', '--backend', action='append', choices=sorted(checksum.CRC16_BACKENDS),
+                       help='Backend to measure, may be repeated (default: all available)')
+    crc16.set_defaults(func=bench_crc16)
+
+    deflate = subparsers.add_parser('deflate', help='Parallel DEFLATE scaling')
+    deflate.add_argument('-s', '--size', default='512M', help='Amount of synthetic data (default: 512M)')
+    deflate.add_argument('-j', '--jobs', help='Comma separated job counts (default: powers of two up to all CPUs)')
+    deflate.add_argument('-L', '--level', type=int, default=6, help='zlib compression level (default: 6)')
+    deflate.set_defaults(func=bench_deflate)
+
+    auth = subparsers.add_parser('auth', help='<Auth> algorithm throughput')
+    auth.add_argument('-s', '--size', default='1G', help='Amount of synthetic data (default: 1G)')
+    auth.set_defaults(func=bench_auth)
+
+    delta = subparsers.add_parser('delta', help='Delta package size and apply time')
+    delta.add_argument('--base', help='Old image revision (default: synthetic)')
+    delta.add_argument('--target', help='New image revision (default: synthetic)')
+    delta.add_argument('-s', '--size', default='256M', help='Size of the synthetic images (default: 256M)')
+    delta.add_argument('-c', '--change', type=float, default=0.02,
+                       help='Fraction of the synthetic image rewritten (default: 0.02)')
+    delta.add_argument('-B', '--block-size', default=str(DEFAULT_DELTA_BLOCK_SIZE),
+                       help='Delta block size (default: 64K)')
+    delta.add_argument('-j', '--jobs', type=int, default=default_jobs(),
+                       help='Parallel DEFLATE processes (default: all CPUs)')
+    delta.set_defaults(func=bench_delta)
+
+    sha1 = subparsers.add_parser('sha1', help='Parallel sha1sum.txt of an SD bundle')
+    sha1.add_argument('-p', '--partitions', type=int, default=10, help='Number of partitions (default: 10)')
+    sha1.add_argument('-s', '--size', default='128M', help='Size of each partition (default: 128M)')
+    sha1.add_argument('-j', '--jobs', help='Comma separated thread counts (default: powers of two up to all CPUs)')
+    sha1.set_defaults(func=bench_sha1)
+
+    bundle = subparsers.add_parser('bundle', help='zip, tar and tar.zst SD bundles')
+    bundle.add_argument('-S', '--scale', type=float, default=1.0,
+                        help='Scale of the partition sizes, 1.0 is about 620 MiB (default: 1.0)')
+    bundle.add_argument('-j', '--jobs', type=int, default=0,
+                        help='DEFLATE processes and zstd threads (default: all CPUs)')
+    bundle.add_argument('-L', '--zstd-level', type=int, default=3, help='zstd compression level (default: 3)')
+    bundle.set_defaults(func=bench_bundle)
+
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+# Copyright (C) 2025, Charleye
+#
+# Block-level delta packages between two AXP releases.
+#
+# create_axp.py --delta-base OLD.axp encodes every image that also exists
+# in the old AXP as a delta member NAME.delta: the new image is cut into
+# fixed-size blocks, and each block found in the old image (same offset
+# first, then any offset with the same content) becomes a reference to
+# it, while other blocks are stored literally. A short last block can
+# only match the tail of the base. The <Img> node gets a
+# <Delta> node with the member name, block size, target size and the
+# SHA-256 of both the base and the target image. Images without a base
+# are stored whole, as in a normal AXP.
+#
+# Delta member layout (little endian):
+#   header  'AXPD', u16 version, u32 block size, u64 target size
+#   'C'     u64 first base block, u32 block count   copy from the base
+#   'D'     u32 length, data                        literal data
+#   'E'                                             end of stream
+#
+# The applier rebuilds the full AXP from the old AXP and the delta
+# package, streaming every target image into the output while checking
+# its SHA-256.
+#
+# Usage:
+#   python3 axp_delta.py -b <old_axp> -d <delta_axp> -o <new_axp> [-j JOBS] [-A [BYTES]]
+#
+# For any questions, please contact: wangkart@aliyun.com
+
+import io
+import os
+import sys
+import time
+import mmap
+import struct
+import hashlib
+import zipfile
+import argparse
+import tempfile
+import contextlib
+import xml.etree.ElementTree as ET
+from axp_reader import AXPReader, find_xml_member
+from fastzip import FastZipFile, default_jobs, choose_compression, member_data_offset
+
+DELTA_MAGIC = b'AXPD'
+DELTA_VERSION = 1
+DELTA_HEADER_FORMAT = '<4sHIQ'
+DEFAULT_DELTA_BLOCK_SIZE = 64 * 1024
+# Literal runs are flushed once they reach this size
+MAX_LITERAL_RUN = 1024 * 1024
+READ_BLOCK_SIZE = 10 * 1024 * 1024
+
+@contextlib.contextmanager
+def base_image(axp, img_id):
+    """
+    Give random access to an image of an AXP.
+
+    Stored images are used in place through the mapping of the AXP, other
+    ones are decompressed once into an anonymous temporary file.
+
+    Yields:
+        memoryview: Content of the image.
+    """
+    if not axp.is_chunked(img_id) and axp.member(img_id).compress_type == zipfile.ZIP_STORED:
+        with axp.image(img_id) as view:
+            yield view
+        return
+    with tempfile.TemporaryFile() as spool:
+        for block in axp.read_blocks(img_id, READ_BLOCK_SIZE):
+            spool.write(block)
+        spool.flush()
+        if not spool.tell():
+            yield memoryview(b'')
+            return
+        with mmap.mmap(spool.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            with memoryview(data) as view:
+                yield view
+
+class DeltaEncoder:
+    """
+    Encode new images against one base image.
+
+    Args:
+        base (memoryview): Read-only content of the base image.
+        block_size (int): Delta block size.
+
+    The constructor reads the base once to index its blocks and to take
+    its SHA-256 (base_sha256).
+    """
+
+    def __init__(self, base, block_size=DEFAULT_DELTA_BLOCK_SIZE):
+        self.base = base
+        self.block_size = block_size
+        self.index = {}
+        sha256 = hashlib.sha256()
+        for offset in range(0, len(base), READ_BLOCK_SIZE):
+            sha256.update(base[offset:offset + READ_BLOCK_SIZE])
+        self.base_sha256 = sha256.hexdigest()
+        # hash() is only a hint, every match is compared byte for byte
+        for number in range(len(base) // block_size):
+            self.index.setdefault(hash(base[number * block_size:(number + 1) * block_size]), number)
+
+    def _find(self, number, block):
+        """Return the number of a base block equal to block, or None."""
+        size = self.block_size
+        if len(block) != size:
+            # A short last block can only be the tail of the base
+            start = number * size
+            if start + len(block) == len(self.base) and self.base[start:] == block:
+                return number
+            return None
+        if (number + 1) * size <= len(self.base) and self.base[number * size:(number + 1) * size] == block:
+            return number
+        candidate = self.index.get(hash(block))
+        if candidate is not None and self.base[candidate * size:(candidate + 1) * size] == block:
+            return candidate
+        return None
+
+    def encode(self, src, dst, target_size, hashers=()):
+        """
+        Write the delta of one image.
+
+        Args:
+            src (file): New image opened in binary mode.
+            dst (file): Writable delta member.
+            target_size (int): Size of the new image.
+            hashers (list): hashlib-like objects updated with the new image.
+
+        Returns:
+            dict: target_sha256, copied and literal byte counts.
+        """
+        size = self.block_size
+        sha256 = hashlib.sha256()
+        stats = {'copied': 0, 'literal': 0}
+        copy_start = copy_count = 0
+        literal = bytearray()
+
+        def flush_copy():
+            nonlocal copy_count
+            if copy_count:
+                dst.write(b'C' + struct.pack('<QI', copy_start, copy_count))
+                copy_count = 0
+
+        def flush_literal():
+            if literal:
+                dst.write(b'D' + struct.pack('<I', len(literal)))
+                dst.write(literal)
+                literal.clear()
+
+        dst.write(struct.pack(DELTA_HEADER_FORMAT, DELTA_MAGIC, DELTA_VERSION, size, target_size))
+        # Whole blocks per read, only the last block of the image can be short
+        read_size = max(size, READ_BLOCK_SIZE - READ_BLOCK_SIZE % size)
+        number = 0
+        while True:
+            data = src.read(read_size)
+            if not data:
+                break
+            for hasher in hashers:
+                hasher.update(data)
+            sha256.update(data)
+            view = memoryview(data)
+            for offset in range(0, len(data), size):
+                block = view[offset:offset + size]
+                found = self._find(number, block)
+                if found is not None:
+                    flush_literal()
+                    if copy_count and copy_start + copy_count == found:
+                        copy_count += 1
+                    else:
+                        flush_copy()
+                        copy_start, copy_count = found, 1
+                    stats['copied'] += len(block)
+                else:
+                    flush_copy()
+                    literal += block
+                    if len(literal) >= MAX_LITERAL_RUN:
+                        flush_literal()
+                    stats['literal'] += len(block)
+                number += 1
+        flush_copy()
+        flush_literal()
+        dst.write(b'E')
+        stats['target_sha256'] = sha256.hexdigest()
+        return stats
+
+def read_exact(src, length):
+    data = src.read(length)
+    if len(data) != length:
+        raise ValueError("Truncated delta stream")
+    return data
+
+def apply_delta(base, src, dst, hashers=()):
+    """
+    Rebuild an image from its base and a delta stream.
+
+    Args:
+        base (memoryview): Content of the base image.
+        src (file): Delta member opened for reading.
+        dst (file): Output the rebuilt image is written to.
+        hashers (list): hashlib-like objects updated with the rebuilt image.
+
+    Returns:
+        int: Size of the rebuilt image.
+
+    Raises:
+        ValueError: If the delta stream is malformed.
+    """
+    magic, version, block_size, target_size = struct.unpack(
+        DELTA_HEADER_FORMAT, read_exact(src, struct.calcsize(DELTA_HEADER_FORMAT)))
+    if magic != DELTA_MAGIC or version != DELTA_VERSION:
+        raise ValueError("Not an AXP delta stream")
+
+    def emit(data):
+        for hasher in hashers:
+            hasher.update(data)
+        dst.write(data)
+
+    written = 0
+    while True:
+        op = read_exact(src, 1)
+        if op == b'E':
+            break
+        if op == b'C':
+            start, count = struct.unpack('<QI', read_exact(src, 12))
+            begin = start * block_size
+            # The last block of the base may be short
+            end = min(begin + count * block_size, len(base))
+            if begin >= end:
+                raise ValueError("Delta references data past the end of the base image")
+            for offset in range(begin, end, READ_BLOCK_SIZE):
+                emit(base[offset:min(offset + READ_BLOCK_SIZE, end)])
+            written += end - begin
+        elif op == b'D':
+            length, = struct.unpack('<I', read_exact(src, 4))
+            emit(read_exact(src, length))
+            written += length
+        else:
+            raise ValueError(f"Unknown delta operation {op!r}")
+    if written != target_size:
+        raise ValueError(f"Delta produced {written} bytes, expected {target_size}")
+    return written
+
+def apply_axp(base_path, delta_path, output_path, jobs=1, align=0, verbose=False):
+    """
+    Rebuild a full AXP from the previous release and a delta package.
+
+    Args:
+        base_path (str): AXP the delta was created against.
+        delta_path (str): Delta AXP created by create_axp.py --delta-base.
+        output_path (str): Rebuilt AXP.
+        jobs (int): Number of parallel DEFLATE processes.
+        align (int): Data alignment of stored members, 0 for none.
+        verbose (bool): Print progress if True.
+
+    Raises:
+        ValueError: If a base or target digest does not match.
+    """
+    tmp_path = output_path + '.tmp'
+    try:
+        with AXPReader(base_path) as base, zipfile.ZipFile(delta_path) as delta, \
+                open(delta_path, 'rb') as delta_fp, \
+                FastZipFile(tmp_path, 'w', zipfile.ZIP_DEFLATED, allowZip64=True,
+                            jobs=jobs, align=align) as zf:
+            xml_name = find_xml_member(delta.namelist())
+            if xml_name is None:
+                raise ValueError(f"No XML member found in {delta_path}")
+            tree = ET.ElementTree(ET.fromstring(delta.read(xml_name)))
+            written = set()
+            for node_img in tree.getroot().iter('Img'):
+                node_delta = node_img.find('Delta')
+                target_name = node_img.find('File').text
+                if target_name in written or (node_delta is None and target_name not in delta.NameToInfo):
+                    if node_delta is not None:
+                        node_img.remove(node_delta)
+                    continue
+                if node_delta is None:
+                    zinfo = delta.getinfo(target_name)
+                    if verbose:
+                        print(f'{node_img.find("ID").text}: copying {target_name}')
+                    zf.write_raw(zinfo, delta_fp, member_data_offset(delta_fp, zinfo))
+                else:
+                    img_id = node_img.find('ID').text
+                    if verbose:
+                        print(f'{img_id}: applying {node_delta.get("file")} to {target_name}')
+                    with base_image(base, img_id) as base_data:
+                        base_sha256 = hashlib.sha256(base_data).hexdigest()
+                        if base_sha256 != node_delta.get('base'):
+                            raise ValueError(f"{img_id}: base image does not match the delta")
+                        compress_type, level, _ = choose_compression(None, node_delta.get('compress'))
+                        zinfo = zipfile.ZipInfo(target_name, time.localtime()[:6])
+                        zinfo.compress_type = compress_type
+                        zinfo._compresslevel = level
+                        zinfo.file_size = int(node_delta.get('size'))
+                        zinfo.external_attr = 0o644 << 16
+                        sha256 = hashlib.sha256()
+                        with delta.open(node_delta.get('file')) as src, zf.open(zinfo, 'w') as dst:
+                            apply_delta(base_data, src, dst, [sha256])
+                    if sha256.hexdigest() != node_delta.get('target'):
+                        raise ValueError(f"{img_id}: rebuilt image does not match the target digest")
+                    node_img.remove(node_delta)
+                written.add(target_name)
+            xml_data = io.BytesIO()
+            tree.write(xml_data)
+            zf.writestr(xml_name, xml_data.getvalue())
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Rebuild an AXP from the previous release and a delta package.',
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument('-b', '--base', required=True, help='AXP the delta was created against')
+    parser.add_argument('-d', '--delta', required=True, help='Delta AXP')
+    parser.add_argument('-o', '--output', default='output.axp', help='Rebuilt .axp file')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='Number of parallel DEFLATE processes (default: 1, 0: all CPUs)')
+    parser.add_argument('-A', '--align', type=int, nargs='?', const=4096, default=0, metavar='BYTES',
+                        help='Align the data of stored images to BYTES (default without value: 4096)')
+    parser.add_argument('-V', '--verbose', action='store_true', default=False, help='Enable verbose output')
+    args = parser.parse_args()
+    if args.jobs < 0:
+        parser.error("--jobs must not be negative")
+    if args.jobs == 0:
+        args.jobs = default_jobs()
+    return args
+
+def main():
+    args = parse_args()
+    try:
+        apply_axp(args.base, args.delta, os.path.abspath(args.output), args.jobs, args.align, args.verbose)
+        print(f"AXP file rebuilt successfully at {os.path.abspath(args.output)}.")
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile) as e:
+        print(f"Error applying delta: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+# Copyright (C) 2025, Charleye
+#
+# Zero-copy reader for AXP files.
+#
+# The AXP is memory-mapped, its central directory and embedded XML are
+# parsed, and every <Img> is resolved to the member named by its <File>.
+# Stored members (see create_axp.py --align) are returned as memoryview
+# slices of the mapping, so a flashing host can stream an image to the
+# device without unpacking the archive first. Deflated members can still
+# be read through open_image(), and images split into chunks (see
+# create_axp.py --chunk-threshold) through parts() and read_blocks().
+#
+# Usage:
+#   python3 axp_reader.py <axp_file> [ID...]
+#
+# Lists the images of the AXP with their data offset, size and method.
+#
+# For any questions, please contact: wangkart@aliyun.com
+
+import os
+import sys
+import mmap
+import zipfile
+import argparse
+import xml.etree.ElementTree as ET
+from fastzip import member_data_offset
+
+def find_xml_member(names, xml_name=None):
+    """
+    Return the name of the XML member of an AXP, or None.
+
+    Args:
+        names (list): Member names of the archive.
+        xml_name (str): Expected name, any single .xml member otherwise.
+    """
+    if xml_name in names:
+        return xml_name
+    xml_names = [name for name in names if name.lower().endswith('.xml')]
+    return xml_names[0] if len(xml_names) == 1 else None
+
+class AXPReader:
+    """
+    Memory-mapped, read-only view of an AXP file.
+
+    Args:
+        path (str): AXP file.
+        xml_name (str): Name of the XML member, found automatically if None.
+
+    Raises:
+        zipfile.BadZipFile: If the file is not an AXP.
+
+    Views returned by image() point into the mapping and must be
+    released before close().
+    """
+
+    def __init__(self, path, xml_name=None):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = None
+        self._zip = None
+        try:
+            self._zip = zipfile.ZipFile(self._file)
+            self.xml_name = find_xml_member(self._zip.namelist(), xml_name)
+            if self.xml_name is None:
+                raise zipfile.BadZipFile(f"No XML member found in {path}")
+            self.xml_data = self._zip.read(self.xml_name)
+            self.root = ET.fromstring(self.xml_data)
+            if os.fstat(self._file.fileno()).st_size:
+                self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except BaseException:
+            self.close()
+            raise
+
+        self._nodes = {}
+        self._all_nodes = {}
+        self._offsets = {}
+        for node_img in self.root.iter('Img'):
+            self._all_nodes.setdefault(node_img.find('ID').text, node_img)
+            names = [name for name, _ in self._part_names(node_img)]
+            if names and all(name in self._zip.NameToInfo for name in names):
+                self._nodes[node_img.find('ID').text] = node_img
+
+    @staticmethod
+    def _part_names(node_img):
+        node_chunks = node_img.find('Chunks')
+        if node_chunks is not None:
+            return [(node_chunk.get('file'), node_chunk) for node_chunk in node_chunks.iter('Chunk')]
+        node_file = node_img.find('File')
+        if node_file is not None and node_file.text:
+            return [(node_file.text, None)]
+        return []
+
+    def ids(self):
+        """Return the IDs of the <Img> nodes stored in the AXP, in XML order."""
+        return list(self._nodes)
+
+    def all_ids(self):
+        """Return the IDs of every <Img> node of the XML, stored or not."""
+        return list(self._all_nodes)
+
+    def xml_node(self, img_id):
+        """Return the <Img> node of an image of the XML, stored or not."""
+        if img_id not in self._all_nodes:
+            raise KeyError(f"No image {img_id} in {self.path}")
+        return self._all_nodes[img_id]
+
+    def missing_members(self, img_id):
+        """
+        Return the names of the <File> or chunk members of an image that
+        are not in the archive. Images with an empty <File>, such as INIT,
+        have none.
+
+        Raises:
+            KeyError: If the XML has no such image.
+        """
+        return [name for name, _ in self._part_names(self.xml_node(img_id))
+                if name not in self._zip.NameToInfo]
+
+    def node(self, img_id):
+        """Return the <Img> node of an image."""
+        if img_id not in self._nodes:
+            raise KeyError(f"No image {img_id} in {self.path}")
+        return self._nodes[img_id]
+
+    def parts(self, img_id):
+        """
+        Return the members holding an image, in order.
+
+        Returns:
+            list: (zipfile.ZipInfo, <Chunk> node) pairs; a single pair
+            with no <Chunk> node unless the image is chunked.
+        """
+        return [(self._zip.getinfo(name), node_chunk)
+                for name, node_chunk in self._part_names(self.node(img_id))]
+
+    def is_chunked(self, img_id):
+        return self.node(img_id).find('Chunks') is not None
+
+    def member(self, img_id):
+        """Return the zipfile.ZipInfo of the member holding an unchunked image."""
+        if self.is_chunked(img_id):
+            raise ValueError(f"Image {img_id} is split into chunks, see parts()")
+        return self.parts(img_id)[0][0]
+
+    def member_offset(self, zinfo):
+        """Return the offset of the data of a member in the AXP."""
+        if zinfo.filename not in self._offsets:
+            self._offsets[zinfo.filename] = member_data_offset(self._file, zinfo)
+        return self._offsets[zinfo.filename]
+
+    def data_offset(self, img_id):
+        """Return the offset of the member data of an image in the AXP."""
+        return self.member_offset(self.member(img_id))
+
+    def image(self, img_id):
+        """
+        Return the content of an image without copying it.
+
+        Args:
+            img_id (str): <ID> of the image.
+
+        Returns:
+            memoryview: Read-only view of the member data in the mapping.
+
+        Raises:
+            KeyError: If the image is not in the AXP.
+            ValueError: If the member is compressed or chunked, use
+                open_image() or read_blocks() instead.
+        """
+        zinfo = self.member(img_id)
+        if zinfo.compress_type != zipfile.ZIP_STORED:
+            raise ValueError(f"Image {img_id} is compressed, it cannot be mapped")
+        return self._member_view(zinfo)
+
+    def _member_view(self, zinfo):
+        if not zinfo.file_size:
+            return memoryview(b'')
+        start = self.member_offset(zinfo)
+        return memoryview(self._map)[start:start + zinfo.file_size]
+
+    def open_image(self, img_id):
+        """Return a file object reading (and decompressing) an unchunked image."""
+        return self._zip.open(self.member(img_id))
+
+    def read_member_blocks(self, zinfo, block_size):
+        """
+        Yield the content of a member in blocks of up to block_size bytes.
+
+        Stored members are yielded as views of the mapping, which are
+        released when the next block is requested.
+        """
+        if zinfo.compress_type == zipfile.ZIP_STORED:
+            with self._member_view(zinfo) as view:
+                for offset in range(0, len(view), block_size):
+                    with view[offset:offset + block_size] as block:
+                        yield block
+        else:
+            with self._zip.open(zinfo) as fp:
+                while True:
+                    block = fp.read(block_size)
+                    if not block:
+                        break
+                    yield block
+
+    def read_blocks(self, img_id, block_size):
+        """Yield the content of an image, chunks included, in blocks."""
+        for zinfo, _ in self.parts(img_id):
+            yield from self.read_member_blocks(zinfo, block_size)
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._zip is not None:
+            self._zip.close()
+            self._zip = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='List the images of an AXP file.')
+    parser.add_argument('axp', help='AXP file')
+    parser.add_argument('ids', nargs='*', metavar='ID', help='Images to list (default: all)')
+    args = parser.parse_args()
+
+    try:
+        with AXPReader(args.axp) as axp:
+            print(f"{'ID':<16} {'file':<24} {'offset':>12} {'size':>12} {'method':<8} aligned")
+            for img_id in args.ids or axp.ids():
+                for index, (zinfo, node_chunk) in enumerate(axp.parts(img_id)):
+                    offset = axp.member_offset(zinfo)
+                    method = 'stored' if zinfo.compress_type == zipfile.ZIP_STORED else 'deflated'
+                    aligned = f'{offset & -offset}' if offset else '-'
+                    name = img_id if node_chunk is None else f'{img_id}[{index}]'
+                    print(f"{name:<16} {zinfo.filename:<24} {offset:>12} {zinfo.file_size:>12} {method:<8} {aligned}")
+    except (OSError, KeyError, zipfile.BadZipFile) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+#
+# SPDX-License-Identifier: GPL-2.0+
+#
+# Copyright (C) 2025, Charleye <wangkart@aliyun.com>
+#
+# Block map (bmap) support for raw SD card and disk images.
+#
+# create writes a bmap file in the bmaptool 2.0 format next to an image.
+# The data extents of the image are found with SEEK_DATA/SEEK_HOLE and
+# every block of them is scanned, so all-zero blocks the filesystem did
+# store are left out as well. Each mapped range carries a SHA-256.
+#
+# copy writes only the mapped ranges of an image to a file or block
+# device, checking every range against its checksum. Unmapped blocks are
+# not written: a target file is truncated so they read as zeros, and on
+# a device they keep their old content, as with bmaptool copy.
+#
+# Usage:
+#   python3 bmap.py create <image> [-o BMAP] [-b BLOCK_SIZE]
+#   python3 bmap.py copy <image> <target> [-m BMAP] [--no-verify] [--readback]
+#
+# Options:
+#   -o, --output        bmap file (default: <image>.bmap)
+#   -b, --block-size    Block size of the map (default: 4096)
+#   -m, --bmap          bmap file of the image (default: <image>.bmap)
+#   --no-verify         Do not check the range checksums
+#   --readback          Read the ranges back from the target and check them again
+#   -v, --verbose       Enable verbose output
+#
+# For any questions, please contact: wangkart@aliyun.com
+
+import os
+import sys
+import stat
+import time
+import errno
+import hashlib
+import argparse
+import xml.etree.ElementTree as ET
+
+BMAP_VERSION = "2.0"
+CHECKSUM_TYPE = "sha256"
+DEFAULT_BLOCK_SIZE = 4096
+IO_BLOCK_SIZE = 8 * 1024 * 1024
+
+def data_extents(fd, size):
+    """
+    Yield the (start, end) byte extents of a file that hold data.
+
+    Falls back to a single extent covering the file when the filesystem
+    does not support SEEK_DATA/SEEK_HOLE.
+    """
+    if not hasattr(os, 'SEEK_DATA'):
+        yield 0, size
+        return
+    offset = 0
+    while offset < size:
+        try:
+            start = os.lseek(fd, offset, os.SEEK_DATA)
+        except OSError as e:
+            if e.errno == errno.ENXIO:
+                return
+            if e.errno in (errno.EINVAL, errno.EOPNOTSUPP) and offset == 0:
+                yield 0, size
+                return
+            raise
+        end = min(os.lseek(fd, start, os.SEEK_HOLE), size)
+        yield start, end
+        offset = end
+
+def mapped_ranges(image_path, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Find the non-zero block ranges of an image.
+
+    Returns:
+        tuple: (image size, list of (first block, last block, SHA-256)),
+        blocks inclusive and ranges in ascending order.
+    """
+    zero_block = bytes(block_size)
+    ranges = []
+    current = None
+    scanned = 0
+    with open(image_path, 'rb', buffering=0) as f:
+        fd = f.fileno()
+        size = os.fstat(fd).st_size
+        for start, end in data_extents(fd, size):
+            # Extents are byte ranges, two of them may share a block
+            offset = max(start // block_size * block_size, scanned)
+            end = min(-(-end // block_size) * block_size, size)
+            scanned = max(scanned, end)
+            while offset < end:
+                data = os.pread(fd, min(IO_BLOCK_SIZE, end - offset), offset)
+                if not data:
+                    break
+                view = memoryview(data)
+                for pos in range(0, len(view), block_size):
+                    block = view[pos:pos + block_size]
+                    index = (offset + pos) // block_size
+                    if block == zero_block[:len(block)]:
+                        if current:
+                            ranges.append((current[0], current[1], current[2].hexdigest()))
+                            current = None
+                        continue
+                    if current and current[1] + 1 == index:
+                        current[1] = index
+                    else:
+                        if current:
+                            ranges.append((current[0], current[1], current[2].hexdigest()))
+                        current = [index, index, hashlib.sha256()]
+                    current[2].update(block)
+                offset += len(data)
+    if current:
+        ranges.append((current[0], current[1], current[2].hexdigest()))
+    return size, ranges
+
+def format_bmap(size, block_size, ranges):
+    """Return the bmap XML text of an image, with its own checksum filled in."""
+    blocks_count = -(-size // block_size)
+    mapped = sum(last - first + 1 for first, last, _ in ranges)
+    lines = [
+        '<?xml version="1.0" ?>',
+        f'<bmap version="{BMAP_VERSION}">',
+        f'    <!-- Image size in bytes: {size}, {mapped * 100 / max(blocks_count, 1):.1f}% mapped -->',
+        f'    <ImageSize> {size} </ImageSize>',
+        f'    <BlockSize> {block_size} </BlockSize>',
+        f'    <BlocksCount> {blocks_count} </BlocksCount>',
+        f'    <MappedBlocksCount> {mapped} </MappedBlocksCount>',
+        f'    <ChecksumType> {CHECKSUM_TYPE} </ChecksumType>',
+        f'    <BmapFileChecksum> {"0" * 64} </BmapFileChecksum>',
+        '    <BlockMap>',
+    ]
+    for first, last, digest in ranges:
+        blocks = f'{first}' if first == last else f'{first}-{last}'
+        lines.append(f'        <Range chksum="{digest}"> {blocks} </Range>')
+    lines += ['    </BlockMap>', '</bmap>', '']
+    text = '\n'.join(lines)
+    return text.replace("0" * 64, hashlib.sha256(text.encode()).hexdigest(), 1)
+
+def create_bmap(image_path, bmap_path=None, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Write the bmap file of an image.
+
+    Returns:
+        dict: bmap path, image size, mapped bytes and ranges count.
+    """
+    bmap_path = bmap_path or image_path + '.bmap'
+    size, ranges = mapped_ranges(image_path, block_size)
+    with open(bmap_path, 'w') as f:
+        f.write(format_bmap(size, block_size, ranges))
+    mapped = sum(min((last + 1) * block_size, size) - first * block_size for first, last, _ in ranges)
+    return {'bmap': bmap_path, 'size': size, 'mapped': mapped, 'ranges': len(ranges)}
+
+def load_bmap(bmap_path):
+    """
+    Parse and check a bmap file.
+
+    Returns:
+        dict: size, block_size and ranges (first block, last block, checksum).
+
+    Raises:
+        ValueError: If the file is not a valid bmap or its checksum is wrong.
+    """
+    with open(bmap_path, 'r') as f:
+        text = f.read()
+    try:
+        root = ET.fromstring(text)
+    except ET.ParseError as e:
+        raise ValueError(f"Invalid bmap file {bmap_path}: {e}")
+    if root.tag != 'bmap' or not root.get('version', '').startswith('2.'):
+        raise ValueError(f"Unsupported bmap version {root.get('version')} in {bmap_path}")
+    checksum_type = root.findtext('ChecksumType', '').strip()
+    if checksum_type != CHECKSUM_TYPE:
+        raise ValueError(f"Unsupported bmap checksum type {checksum_type}")
+    file_checksum = root.findtext('BmapFileChecksum', '').strip()
+    if hashlib.sha256(text.replace(file_checksum, "0" * len(file_checksum), 1).encode()).hexdigest() != file_checksum:
+        raise ValueError(f"bmap file {bmap_path} checksum mismatch")
+
+    ranges = []
+    for node in root.find('BlockMap').iter('Range'):
+        first, _, last = node.text.strip().partition('-')
+        ranges.append((int(first), int(last or first), node.get('chksum')))
+    return {'size': int(root.findtext('ImageSize')), 'block_size': int(root.findtext('BlockSize')),
+            'ranges': ranges}
+
+def open_target(target_path, size):
+    """
+    Open the copy target. Regular files are truncated to the image size,
+    so unmapped blocks read as zeros; block devices must be large enough.
+    """
+    if os.path.exists(target_path) and stat.S_ISBLK(os.stat(target_path).st_mode):
+        fd = os.open(target_path, os.O_WRONLY)
+        device_size = os.lseek(fd, 0, os.SEEK_END)
+        if device_size < size:
+            os.close(fd)
+            raise ValueError(f"Target {target_path} ({device_size} bytes) is smaller than the image ({size} bytes)")
+        return fd
+    fd = os.open(target_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    os.ftruncate(fd, size)
+    return fd
+
+def range_blocks(fd, start, end):
+    offset = start
+    while offset < end:
+        data = os.pread(fd, min(IO_BLOCK_SIZE, end - offset), offset)
+        if not data:
+            raise ValueError(f"Unexpected end of data at offset {offset}")
+        yield offset, data
+        offset += len(data)
+
+def copy_image(image_path, target_path, bmap_path=None, verify=True, readback=False, verbose=False):
+    """
+    Copy the mapped ranges of an image to a file or block device.
+
+    Returns:
+        dict: size, copied bytes and seconds.
+
+    Raises:
+        ValueError: If the bmap does not match the image or a range checksum
+            is wrong.
+    """
+    bmap = load_bmap(bmap_path or image_path + '.bmap')
+    block_size = bmap['block_size']
+    size = bmap['size']
+    start_time = time.perf_counter()
+    copied = 0
+    with open(image_path, 'rb', buffering=0) as src:
+        if os.fstat(src.fileno()).st_size != size:
+            raise ValueError(f"Image {image_path} size does not match its bmap ({size} bytes)")
+        fd = open_target(target_path, size)
+        try:
+            for first, last, digest in bmap['ranges']:
+                start = first * block_size
+                end = min((last + 1) * block_size, size)
+                sha256 = hashlib.sha256()
+                for offset, data in range_blocks(src.fileno(), start, end):
+                    sha256.update(data)
+                    os.pwrite(fd, data, offset)
+                copied += end - start
+                if verify and sha256.hexdigest() != digest:
+                    raise ValueError(f"Checksum mismatch in blocks {first}-{last} of {image_path}")
+                if verbose:
+                    print(f"Copied blocks {first}-{last} ({end - start} bytes)")
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    if readback:
+        with open(target_path, 'rb', buffering=0) as dst:
+            if hasattr(os, 'posix_fadvise'):
+                os.posix_fadvise(dst.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+            for first, last, digest in bmap['ranges']:
+                sha256 = hashlib.sha256()
+                for _, data in range_blocks(dst.fileno(), first * block_size,
+                                            min((last + 1) * block_size, size)):
+                    sha256.update(data)
+                if sha256.hexdigest() != digest:
+                    raise ValueError(f"Read back mismatch in blocks {first}-{last} of {target_path}")
+    return {'size': size, 'copied': copied, 'seconds': time.perf_counter() - start_time}
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Create or copy with a block map of a raw image.',
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    create = subparsers.add_parser('create', help='Write the bmap file of an image')
+    create.add_argument('image', help='Raw image')
+    create.add_argument('-o', '--output', help='bmap file (default: <image>.bmap)')
+    create.add_argument('-b', '--block-size', type=int, default=DEFAULT_BLOCK_SIZE,
+                        help=f'Block size of the map (default: {DEFAULT_BLOCK_SIZE})')
+
+    copy = subparsers.add_parser('copy', help='Write the mapped ranges of an image to a file or device')
+    copy.add_argument('image', help='Raw image')
+    copy.add_argument('target', help='Target file or block device')
+    copy.add_argument('-m', '--bmap', help='bmap file of the image (default: <image>.bmap)')
+    copy.add_argument('--no-verify', action='store_false', dest='verify', default=True,
+                      help='Do not check the range checksums')
+    copy.add_argument('--readback', action='store_true', default=False,
+                      help='Read the ranges back from the target and check them again')
+    copy.add_argument('-v', '--verbose', action='store_true', default=False, help='Enable verbose output')
+
+    args = parser.parse_args()
+    if not os.path.isfile(args.image):
+        parser.error(f"The image '{args.image}' does not exist.")
+    if args.command == 'create' and (args.block_size <= 0 or args.block_size & (args.block_size - 1)):
+        parser.error("--block-size must be a power of two")
+    return args
+
+def main():
+    args = parse_args()
+    try:
+        if args.command == 'create':
+            result = create_bmap(args.image, args.output, args.block_size)
+            print(f"bmap created at {result['bmap']}: {result['mapped']} of {result['size']} bytes "
+                  f"mapped in {result['ranges']} ranges.")
+        else:
+            result = copy_image(args.image, args.target, args.bmap, args.verify, args.readback, args.verbose)
+            print(f"Copied {result['copied']} of {result['size']} bytes to {args.target} "
+                  f"in {result['seconds']:.2f} s.")
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -7,12 +7,14 @@
 # This script calculates the hash of specified input files
 # and writes the results to an output file.
 # It supports SHA1, SHA256, and SHA512 algorithms.
-#
+# Digests of unchanged files are reused from the digest cache
+# shared with create_axp.py and create_sdcard_image.py.
 #
 
 import hashlib
 import os
 import argparse
+from digest_cache import add_cache_arguments, open_cache
 
 def calculate_hash(filepath, hash_algorithm="sha1"):
     """Calculates the hash of a file using the specified algorithm."""
@@ -36,6 +38,8 @@ def main():
     parser.add_argument("-i", "--input_files", nargs="+", help="List of input files to process")
     parser.add_argument("-o", "--output_file", default="sha1sum.txt", help="Output file to write hash results")
     parser.add_argument("-sha", "--hash_algo", default="sha1", choices=["sha1", "sha256", "sha512"], help="Hash algorithm to use: sha1, sha256, or sha512 (default: sha1)")
+    parser.add_argument("-v", "--verbose", action="store_true", default=False, help="Print digest cache statistics")
+    add_cache_arguments(parser)
     args = parser.parse_args()
 
     if args.output_file == "sha1sum.txt":
@@ -50,13 +54,16 @@ def main():
             return
 
     try:
-        with open(args.output_file, "w") as outfile:
+        with open(args.output_file, "w") as outfile, open_cache(args) as cache:
             for filepath in args.input_files:
-                hash_value = calculate_hash(filepath, args.hash_algo)
+                hash_value = cache.digest(filepath, args.hash_algo,
+                                          lambda path: calculate_hash(path, args.hash_algo))
                 if hash_value:
                     filename = os.path.basename(filepath)
                     outfile.write(f"{hash_value} {filename}\n")
         print(f"Successfully wrote hash values to {args.output_file}")
+        if args.verbose and cache.enabled:
+            print(cache.report())
     except Exception as e:
         print(f"Error: An error occurred during hash calculation: {e}")
 
@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+# Copyright (C) 2025, Charleye
+#
+# Buffer-oriented checksum engines used for the AXP <Auth> digests.
+#
+# The checksum is CRC-16/ARC (reflected polynomial 0x8005, init 0,
+# no final xor), exactly what the byte-by-byte table loop in
+# create_axp.calc_crc16 used to compute. Several backends are provided
+# and the fastest available one is picked automatically:
+#
+#   crcmod  - native C extension of the 'crcmod' package (optional)
+#   numpy   - lane-parallel table lookups with NumPy (optional)
+#   slice8  - pure Python slicing-by-8 tables (always available)
+#
+# algo="2" is CRC16 above, algo="3" CRC32 (zlib) and algo="4" CRC32C,
+# the Castagnoli CRC computed in hardware (SSE4.2 crc32, ARMv8 CRC
+# extension) by the optional 'crc32c' or 'google-crc32c' packages, with
+# the same NumPy and slicing-by-8 fallbacks as CRC16.
+#
+# For any questions, please contact: wangkart@aliyun.com
+
+import zlib
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    from crc32c import crc32c as _native_crc32c
+except ImportError:
+    try:
+        from google_crc32c import extend as _google_extend
+        _native_crc32c = lambda data, crc=0: _google_extend(crc, data)
+    except ImportError:
+        _native_crc32c = None
+
+try:
+    # Without the C extension crcmod is slower than slice8
+    from crcmod import _crcfunext
+    import crcmod.predefined
+    _crcmod_crc16 = crcmod.predefined.mkPredefinedCrcFun('crc-16')
+except ImportError:
+    _crcmod_crc16 = None
+
+CRC16_POLY = 0xA001
+CRC32C_POLY = 0x82F63B78
+
+# Buffers shorter than this are not worth the NumPy setup cost
+NUMPY_MIN_SIZE = 64 * 1024
+NUMPY_MAX_LANES = 1 << 16
+NUMPY_MIN_LANE_LEN = 64
+
+def _make_table(poly):
+    table = []
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            crc = (crc >> 1) ^ poly if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+def _make_slice_tables(table, count):
+    """
+    Build slicing-by-N tables: tables[k][b] is the CRC of byte b
+    followed by k zero bytes.
+    """
+    tables = [table]
+    for _ in range(1, count):
+        prev = tables[-1]
+        tables.append([(crc >> 8) ^ table[crc & 0xFF] for crc in prev])
+    return tables
+
+CRC16_TABLE = _make_table(CRC16_POLY)
+_T0, _T1, _T2, _T3, _T4, _T5, _T6, _T7 = _make_slice_tables(CRC16_TABLE, 8)
+CRC32C_TABLE = _make_table(CRC32C_POLY)
+_CRC_TABLES = {CRC16_POLY: (CRC16_TABLE, 16), CRC32C_POLY: (CRC32C_TABLE, 32)}
+_C0, _C1, _C2, _C3, _C4, _C5, _C6, _C7 = _make_slice_tables(CRC32C_TABLE, 8)
+
+def _crc16_bytewise(crc, data):
+    table = CRC16_TABLE
+    for byte in data:
+        crc = (crc >> 8) ^ table[(crc ^ byte) & 0xFF]
+    return crc
+
+def crc16_slice8(crc, data):
+    """
+    Update a CRC16 value with data using slicing-by-8 tables.
+
+    Args:
+        crc (int): Current CRC16 value.
+        data (bytes-like): Data to checksum.
+
+    Returns:
+        int: Updated CRC16 value.
+    """
+    view = memoryview(data).cast('B')
+    tail = len(view) & 7
+    it = iter(view[:len(view) - tail])
+    t0, t1, t2, t3, t4, t5, t6, t7 = _T0, _T1, _T2, _T3, _T4, _T5, _T6, _T7
+    for b0, b1, b2, b3, b4, b5, b6, b7 in zip(it, it, it, it, it, it, it, it):
+        crc ^= b0 | (b1 << 8)
+        crc = (t7[crc & 0xFF] ^ t6[crc >> 8] ^ t5[b2] ^ t4[b3] ^
+               t3[b4] ^ t2[b5] ^ t1[b6] ^ t0[b7])
+    if tail:
+        crc = _crc16_bytewise(crc, view[len(view) - tail:])
+    return crc
+
+def _raw_bytewise(table, crc, data):
+    for byte in data:
+        crc = (crc >> 8) ^ table[(crc ^ byte) & 0xFF]
+    return crc
+
+@lru_cache(maxsize=128)
+def _zeros_operator(length, poly=CRC16_POLY):
+    """
+    Return the linear operator that advances a CRC register over
+    'length' zero bytes, as one 256-entry table per register byte
+    (low byte first).
+    """
+    table, width = _CRC_TABLES[poly]
+    # Column k is the image of register bit k; start from one zero byte
+    op = [_raw_bytewise(table, 1 << k, b'\0') for k in range(width)]
+    result = [1 << k for k in range(width)]
+
+    def apply(cols, value):
+        out = 0
+        k = 0
+        while value:
+            if value & 1:
+                out ^= cols[k]
+            value >>= 1
+            k += 1
+        return out
+
+    n = length
+    while n:
+        if n & 1:
+            result = [apply(op, c) for c in result]
+        op = [apply(op, c) for c in op]
+        n >>= 1
+
+    return tuple([apply(result, b << shift) for b in range(256)] for shift in range(0, width, 8))
+
+def _shift(crc, length, poly):
+    if not crc or not length:
+        return crc
+    out = 0
+    for table in _zeros_operator(length, poly):
+        out ^= table[crc & 0xFF]
+        crc >>= 8
+    return out
+
+def crc16_shift(crc, length):
+    """
+    Advance a CRC16 register over 'length' zero bytes in O(1) lookups.
+
+    CRC-16/ARC is linear, so crc(a + b) == crc16_shift(crc(a), len(b)) ^ crc(b)
+    when crc(b) is computed from a zero register.
+    """
+    return _shift(crc, length, CRC16_POLY)
+
+def _numpy_lanes(view, poly):
+    """
+    Compute the raw CRC (zero register, no final xor) of the largest
+    lane-aligned prefix of view with NumPy.
+
+    The prefix is split into equally sized lanes whose CRCs are computed
+    side by side (one vectorised table lookup per byte column), then
+    folded together pairwise with the zero-shift operator.
+
+    Returns:
+        tuple: (raw CRC, prefix length), prefix length 0 if view is too short.
+    """
+    size = len(view)
+    lanes = NUMPY_MAX_LANES
+    while lanes > 1 and lanes * NUMPY_MIN_LANE_LEN > size:
+        lanes >>= 1
+    if lanes < 2:
+        return 0, 0
+
+    table = _numpy_table(poly)
+    dtype = table.dtype
+    lane_len = size // lanes
+    body = lanes * lane_len
+    columns = np.frombuffer(view, dtype=np.uint8, count=body).reshape(lanes, lane_len).T.copy()
+    regs = np.zeros(lanes, dtype=dtype)
+    for column in columns:
+        regs = (regs >> 8) ^ table[(regs ^ column) & 0xFF]
+
+    # Fold neighbouring lanes pairwise: crc(a + b) = shift(crc(a), len(b)) ^ crc(b)
+    span = lane_len
+    while len(regs) > 1:
+        left = regs[0::2]
+        folded = regs[1::2].copy()
+        for shift, t in zip(range(0, 64, 8), _zeros_operator(span, poly)):
+            folded ^= np.array(t, dtype=dtype)[(left >> shift) & 0xFF]
+        regs = folded
+        span *= 2
+    return int(regs[0]), body
+
+def crc16_numpy(crc, data):
+    """
+    Update a CRC16 value with data using NumPy lane-parallel lookups.
+
+    Args:
+        crc (int): Current CRC16 value.
+        data (bytes-like): Data to checksum.
+
+    Returns:
+        int: Updated CRC16 value.
+    """
+    if np is None:
+        raise RuntimeError("NumPy is not available")
+    view = memoryview(data).cast('B')
+    raw, body = _numpy_lanes(view, CRC16_POLY)
+    if not body:
+        return crc16_slice8(crc, view)
+    crc = crc16_shift(crc, body) ^ raw
+    if body < len(view):
+        crc = crc16_slice8(crc, view[body:])
+    return crc
+
+@lru_cache(maxsize=2)
+def _numpy_table(poly=CRC16_POLY):
+    table, width = _CRC_TABLES[poly]
+    return np.array(table, dtype=np.uint16 if width == 16 else np.uint32)
+
+def crc16_crcmod(crc, data):
+    """Update a CRC16 value with data using the native crcmod extension."""
+    if _crcmod_crc16 is None:
+        raise RuntimeError("crcmod C extension is not available")
+    return _crcmod_crc16(data, crc)
+
+def crc16_auto(crc, data):
+    """Update a CRC16 value with the fastest backend for this buffer."""
+    if _crcmod_crc16 is not None:
+        return _crcmod_crc16(data, crc)
+    if np is not None and len(data) >= NUMPY_MIN_SIZE:
+        return crc16_numpy(crc, data)
+    return crc16_slice8(crc, data)
+
+CRC16_BACKENDS = {
+    'auto': crc16_auto,
+    'crcmod': crc16_crcmod,
+    'numpy': crc16_numpy,
+    'slice8': crc16_slice8,
+}
+
+def available_crc16_backends():
+    """Return the names of CRC16 backends usable on this host."""
+    names = ['slice8']
+    if np is not None:
+        names.append('numpy')
+    if _crcmod_crc16 is not None:
+        names.append('crcmod')
+    return names
+
+class CRC16:
+    """
+    Incremental CRC16 with a hashlib-like interface.
+
+    hexdigest() keeps the hex() formatting ("0x1a2b") that the flashing
+    tool expects in the <Auth> node.
+    """
+    name = 'crc16'
+
+    def __init__(self, data=None, backend='auto'):
+        self._update = CRC16_BACKENDS[backend]
+        self.crc = 0
+        if data:
+            self.update(data)
+
+    def update(self, data):
+        self.crc = self._update(self.crc, data)
+
+    def hexdigest(self):
+        return hex(self.crc)
+
+class CRC32:
+    """
+    Incremental CRC-32 (zlib, same as the ZIP member CRC) with a
+    hashlib-like interface. hexdigest() returns "0x" and 8 hex digits.
+    """
+    name = 'crc32'
+
+    def __init__(self, data=None):
+        self.crc = 0
+        if data:
+            self.update(data)
+
+    def update(self, data):
+        self.crc = zlib.crc32(data, self.crc)
+
+    def hexdigest(self):
+        return f'0x{self.crc:08x}'
+
+def crc32c_slice8(crc, data):
+    """
+    Update a CRC32C value with data using slicing-by-8 tables.
+
+    Args:
+        crc (int): Current CRC32C value (0 for an empty message).
+        data (bytes-like): Data to checksum.
+
+    Returns:
+        int: Updated CRC32C value.
+    """
+    view = memoryview(data).cast('B')
+    tail = len(view) & 7
+    it = iter(view[:len(view) - tail])
+    t0, t1, t2, t3, t4, t5, t6, t7 = _C0, _C1, _C2, _C3, _C4, _C5, _C6, _C7
+    crc ^= 0xFFFFFFFF
+    for b0, b1, b2, b3, b4, b5, b6, b7 in zip(it, it, it, it, it, it, it, it):
+        crc ^= b0 | (b1 << 8) | (b2 << 16) | (b3 << 24)
+        crc = (t7[crc & 0xFF] ^ t6[(crc >> 8) & 0xFF] ^ t5[(crc >> 16) & 0xFF] ^ t4[crc >> 24] ^
+               t3[b4] ^ t2[b5] ^ t1[b6] ^ t0[b7])
+    table = CRC32C_TABLE
+    for byte in view[len(view) - tail:]:
+        crc = (crc >> 8) ^ table[(crc ^ byte) & 0xFF]
+    return crc ^ 0xFFFFFFFF
+
+def crc32c_numpy(crc, data):
+    """
+    Update a CRC32C value with data using NumPy lane-parallel lookups.
+
+    Args:
+        crc (int): Current CRC32C value (0 for an empty message).
+        data (bytes-like): Data to checksum.
+
+    Returns:
+        int: Updated CRC32C value.
+    """
+    if np is None:
+        raise RuntimeError("NumPy is not available")
+    view = memoryview(data).cast('B')
+    raw, body = _numpy_lanes(view, CRC32C_POLY)
+    if not body:
+        return crc32c_slice8(crc, view)
+    # The init/final inversions cancel out around the raw register
+    crc = (_shift(crc ^ 0xFFFFFFFF, body, CRC32C_POLY) ^ raw) ^ 0xFFFFFFFF
+    if body < len(view):
+        crc = crc32c_slice8(crc, view[body:])
+    return crc
+
+def crc32c_native(crc, data):
+    """Update a CRC32C value with data using the hardware accelerated package."""
+    if _native_crc32c is None:
+        raise RuntimeError("Neither crc32c nor google-crc32c is available")
+    return _native_crc32c(data, crc)
+
+def crc32c_auto(crc, data):
+    """Update a CRC32C value with the fastest available backend."""
+    if _native_crc32c is not None:
+        return _native_crc32c(data, crc)
+    if np is not None and len(data) >= NUMPY_MIN_SIZE:
+        return crc32c_numpy(crc, data)
+    return crc32c_slice8(crc, data)
+
+CRC32C_BACKENDS = {
+    'auto': crc32c_auto,
+    'native': crc32c_native,
+    'numpy': crc32c_numpy,
+    'slice8': crc32c_slice8,
+}
+
+def available_crc32c_backends():
+    """Return the names of CRC32C backends usable on this host."""
+    names = ['slice8']
+    if np is not None:
+        names.append('numpy')
+    if _native_crc32c is not None:
+        names.append('native')
+    return names
+
+class CRC32C:
+    """
+    Incremental CRC32C (Castagnoli) with a hashlib-like interface.
+    hexdigest() returns "0x" and 8 hex digits.
+    """
+    name = 'crc32c'
+
+    def __init__(self, data=None, backend='auto'):
+        self._update = CRC32C_BACKENDS[backend]
+        self.crc = 0
+        if data:
+            self.update(data)
+
+    def update(self, data):
+        self.crc = self._update(self.crc, data)
+
+    def hexdigest(self):
+        return f'0x{self.crc:08x}'
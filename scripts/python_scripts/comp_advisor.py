@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+#
+# SPDX-License-Identifier: GPL-2.0+
+#
+# Copyright (C) 2025 Charleye <wangkart@aliyun.com>
+#
+# Boot time compression advisor for generate_its.py.
+#
+# Every payload is compressed with each codec the target supports and
+# decompressed on the host to measure its throughput. A board profile
+# then models the target:
+#   load        compressed size / read_bandwidth
+#   decompress  size / decompress_bandwidth[codec], or the host
+#               throughput scaled by decompress_scale
+# and the codec with the lowest load plus decompress time is recommended
+# for each payload.
+#
+# A board profile is a JSON file, sizes are bytes or K/M/G suffixed:
+#   {
+#       "name": "evb-emmc",
+#       "read_bandwidth": "45M",
+#       "decompress_scale": 0.12,
+#       "decompress_bandwidth": {"lz4": "350M"},
+#       "codecs": ["none", "gzip", "lz4"]
+#   }
+# read_bandwidth is what U-Boot gets from the boot medium per second,
+# decompress_bandwidth the decompressed bytes per second of its codecs
+# and codecs the decompressors enabled in its configuration.
+#
+
+import os
+import bz2
+import json
+import time
+import zlib
+import tempfile
+import functools
+import subprocess
+from fastzip import parse_size
+from payload_compress import compress_file
+from zstdio import open_zstd_reader, zstd_backend
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+CODECS = ("none", "gzip", "lz4", "bzip2", "zstd")
+# SD card read by U-Boot, Cortex-A53 class core
+DEFAULT_PROFILE = {
+    'name': "default",
+    'read_bandwidth': 20 * 1024 * 1024,
+    'decompress_scale': 0.15,
+    'decompress_bandwidth': {},
+    'codecs': list(CODECS)
+}
+READ_BLOCK_SIZE = 256 * 1024
+# Decompression is repeated until it took that long, for small payloads
+MEASURE_SECONDS = 0.2
+MAX_RUNS = 50
+
+def load_profile(path):
+    """
+    Load a board profile, missing keys take their DEFAULT_PROFILE value.
+
+    Raises:
+        ValueError: Malformed profile.
+    """
+    with open(path, 'r') as f:
+        try:
+            data = json.load(f)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"{path}: {e}") from e
+    if not isinstance(data, dict):
+        raise ValueError(f"{path}: a board profile must be a JSON object")
+    unknown = set(data) - set(DEFAULT_PROFILE)
+    if unknown:
+        raise ValueError(f"{path}: unknown keys {', '.join(sorted(unknown))}")
+    profile = {**DEFAULT_PROFILE, **data}
+    try:
+        profile['read_bandwidth'] = parse_size(profile['read_bandwidth'])
+        profile['decompress_scale'] = float(profile['decompress_scale'])
+        profile['decompress_bandwidth'] = {codec: parse_size(value) for codec, value
+                                           in profile['decompress_bandwidth'].items()}
+    except (AttributeError, TypeError, ValueError) as e:
+        raise ValueError(f"{path}: {e}") from e
+    for codec in list(profile['codecs']) + list(profile['decompress_bandwidth']):
+        if codec not in CODECS:
+            raise ValueError(f"{path}: unsupported codec {codec}")
+    if profile['read_bandwidth'] <= 0 or profile['decompress_scale'] <= 0 or \
+            any(value <= 0 for value in profile['decompress_bandwidth'].values()):
+        raise ValueError(f"{path}: bandwidths must be positive")
+    return profile
+
+def decompress_file(path, codec):
+    """Decompress path, discarding the output."""
+    if codec == "lz4" and lz4 is None:
+        subprocess.run(['lz4', '-q', '-d', '-c', path], stdout=subprocess.DEVNULL, check=True)
+        return
+    if codec == "zstd":
+        with open_zstd_reader(path) as reader:
+            while reader.read(READ_BLOCK_SIZE):
+                pass
+        return
+    if codec == "gzip":
+        decompressor = zlib.decompressobj(31)
+    elif codec == "bzip2":
+        decompressor = bz2.BZ2Decompressor()
+    else:
+        decompressor = lz4.frame.LZ4FrameDecompressor()
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(READ_BLOCK_SIZE)
+            if not block:
+                return
+            decompressor.decompress(block)
+
+@functools.lru_cache(maxsize=None)
+def tool_startup_seconds(codec):
+    """
+    Return the start-up time of the command line tool decompressing codec
+    when its Python module is not installed, 0 otherwise.
+    """
+    if not (codec == "lz4" and lz4 is None or codec == "zstd" and zstd_backend() == "zstd"):
+        return 0.0
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        empty = os.path.join(tmp_dir, "empty")
+        open(empty, 'wb').close()
+        compress_file(empty, empty + ".out", codec)
+        timings = []
+        for _ in range(5):
+            start = time.perf_counter()
+            decompress_file(empty + ".out", codec)
+            timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def decompress_throughput(path, codec, size):
+    """
+    Return the host decompression throughput in decompressed bytes per
+    second, not counting the start-up of a command line tool.
+    """
+    startup = tool_startup_seconds(codec)
+    runs = 0
+    start = time.perf_counter()
+    while True:
+        decompress_file(path, codec)
+        runs += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= MEASURE_SECONDS or runs >= MAX_RUNS:
+            return size * runs / max(elapsed - runs * startup, 1e-6)
+
+def estimate(size, compressed, codec, throughput, profile):
+    """
+    Return the (load, decompress) seconds of a payload on the target.
+
+    Args:
+        size (int): Uncompressed size.
+        compressed (int): Stored size.
+        throughput (float): Host decompression throughput, unused for none.
+    """
+    load = compressed / profile['read_bandwidth']
+    if codec == "none":
+        return load, 0.0
+    bandwidth = profile['decompress_bandwidth'].get(codec) or throughput * profile['decompress_scale']
+    return load, size / bandwidth
+
+def advise(paths, profile, compress):
+    """
+    Measure every supported codec on every payload.
+
+    Args:
+        paths (dict): name -> uncompressed payload path.
+        profile (dict): Board profile.
+        compress (callable): compress(codec, paths) returning
+            {path: compressed path}, None for a failure.
+
+    Returns:
+        dict: name -> list of candidate dicts (codec, size, compressed,
+        throughput, load, decompress, total), fastest first.
+    """
+    sizes = {name: os.path.getsize(path) for name, path in paths.items()}
+    results = {name: [] for name in paths}
+    for codec in profile['codecs']:
+        if codec == "none":
+            compressed_paths = {path: path for path in paths.values()}
+        else:
+            compressed_paths = compress(codec, list(paths.values()))
+        for name, path in paths.items():
+            compressed_path = compressed_paths.get(path)
+            if compressed_path is None:
+                continue
+            compressed = os.path.getsize(compressed_path)
+            throughput = None
+            if codec != "none":
+                throughput = decompress_throughput(compressed_path, codec, sizes[name])
+            load, decompress = estimate(sizes[name], compressed, codec, throughput, profile)
+            results[name].append({'codec': codec, 'size': sizes[name], 'compressed': compressed,
+                                  'throughput': throughput, 'load': load,
+                                  'decompress': decompress, 'total': load + decompress})
+    for candidates in results.values():
+        # Ties go to the codec listed first, none before the others
+        candidates.sort(key=lambda c: (c['total'], CODECS.index(c['codec'])))
+    return results
+
+def format_advice(paths, results, profile):
+    """Return the advice as a table, the recommended codec of each payload marked."""
+    lines = [f"Compression advice for board profile {profile['name']}: "
+             f"read {profile['read_bandwidth'] / 1048576:.1f} MiB/s, "
+             f"decompression x{profile['decompress_scale']:g} of this host"]
+    for name, candidates in results.items():
+        if not candidates:
+            continue
+        lines.append(f"  {name}: {paths[name]} ({candidates[0]['size']} bytes)")
+        lines.append(f"    {'codec':<6} {'stored':>11} {'ratio':>6} {'host MiB/s':>10} "
+                     f"{'load ms':>9} {'unpack ms':>9} {'total ms':>9}")
+        for i, c in enumerate(candidates):
+            host = f"{c['throughput'] / 1048576:.0f}" if c['throughput'] else "-"
+            ratio = c['compressed'] / c['size'] if c['size'] else 1.0
+            lines.append(f"    {c['codec']:<6} {c['compressed']:>11} {ratio:>6.2f} {host:>10} "
+                         f"{c['load'] * 1000:>9.1f} {c['decompress'] * 1000:>9.1f} "
+                         f"{c['total'] * 1000:>9.1f}" + ("  <- recommended" if i == 0 else ""))
+    return "\n".join(lines)
@@ -34,13 +34,28 @@ def write_xml_with_comments(xml_str, output_file):
 <!--                      [attribute] algo: 0, No Auth                       -->
 <!--                                        1, MD5                           -->
 <!--                                        2, crc16                         -->
+<!--                                        3, crc32                         -->
+<!--                                        4, crc32c                        -->
+<!--                                        5, sha256                        -->
 <!--              [tag]   File: Download file name                           -->
+<!--              [tag] Chunks: Added by create_axp.py for split images      -->
+<!--                      [tag] Chunk: file, size, crc32, sha256 per chunk   -->
 <!--              [tag]   Description: GUI display                           -->
 '''
     with open(output_file, 'w') as f:
         f.write(comments)
         f.write(xml_str)
 
+# <Auth algo="N"> codes understood by create_axp.py
+AUTH_ALGOS = {
+    "none": "0",
+    "md5": "1",
+    "crc16": "2",
+    "crc32": "3",
+    "crc32c": "4",
+    "sha256": "5",
+}
+
 def convert_to_mtdparts(json_partitions, json_unit):
     unit_mapping = {
         "1M": 1024 * 1024,
@@ -174,6 +189,11 @@ def load_and_validate_json(input_file):
             if flags_value not in ['no-image', 'selected']:
                 raise ValueError(f"Invalid value for 'flags' field: {flags_value}. Allowed values are 'no-image' and 'selected'.")
 
+        if 'auth' in partition:
+            auth_value = str(partition['auth']).lower()
+            if auth_value not in AUTH_ALGOS and auth_value not in AUTH_ALGOS.values():
+                raise ValueError(f"Invalid value for 'auth' field: {partition['auth']}. Allowed values are {', '.join(AUTH_ALGOS)} or their codes 0-5.")
+
         if 'attrs' in partition:
             attrs_value = partition['attrs']
             allowed_attrs = ['ro', 'bootable', 'ro,bootable', 'bootable,ro']
@@ -262,6 +282,10 @@ def generate_images(args, json_partitions):
                 if gui_select_val == '0' or gui_select_val == 'false':
                     select_value = "0"
 
+            # Auth algorithm by name or code, none by default
+            auth_value = str(partition.get('auth', 'none')).lower()
+            auth_value = AUTH_ALGOS.get(auth_value, auth_value)
+
             images.append({
                 "flag": flag_value,
                 "name": partition['name'].upper(),
@@ -270,6 +294,7 @@ def generate_images(args, json_partitions):
                 "type": "CODE",
                 "base": "0x0",
                 "size": "0x0",
+                "auth": auth_value,
                 "description": f"This image is used for {partition['name']} partition."
             })
 
@@ -286,7 +311,7 @@ def append_images(img_list_elem, images):
         ET.SubElement(block_elem, 'Base').text = img["base"]
         ET.SubElement(block_elem, 'Size').text = img["size"]
         ET.SubElement(img_elem, 'File')
-        ET.SubElement(img_elem, 'Auth', algo="0")
+        ET.SubElement(img_elem, 'Auth', algo=img.get("auth", "0"))
         ET.SubElement(img_elem, 'Description').text = img["description"]
 
 def create_xml_structure(args, json_partitions, json_unit):
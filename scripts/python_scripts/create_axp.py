@@ -5,8 +5,9 @@
 # Copyright (C) 2025, Charleye
 #
 # This script is used to create an AXP file from an XML configuration file.
-# It reads the XML file, copies the specified files, updates the XML content,
-# and creates an AXP file as the output.
+# It reads the XML file, streams the specified files straight into the AXP
+# archive, updates the XML content and stores it as the last member.
+# In debug mode the files are staged in a directory next to the output first.
 #
 # Usage:
 #   python3 create_axp.py -p <project_name> -o <output_axp> -x <xml_file> [files...]
@@ -17,8 +18,27 @@
 #   -o, --output        Set output .axp file (default: output.axp)
 #   -x, --xml           XML configuration file (default: output.xml)
 #   -v, --version       Set version (default: 1.0)
-#   -d, --debug         Enable debug mode
+#   -d, --debug         Enable debug mode (assemble through a kept staging directory)
 #   -V, --verbose       Enable verbose output
+#   -u, --update        Update the existing output AXP: images whose size and
+#                       CRC-32 still match their member are copied as raw
+#                       compressed bytes, only changed images are rebuilt;
+#                       the CRC-32 of unchanged inputs comes from the digest
+#                       cache, so they are not read again
+#   --no-dedup          Store every image as its own member; by default images
+#                       with identical content (A/B pairs) share one member
+#   -A, --align         Align the data of stored images to a page boundary
+#                       (default without value: 4096), so axp_reader.py
+#                       can map them without extracting the AXP
+#   --chunk-threshold   Split images larger than SIZE into ARCNAME.000,
+#                       ARCNAME.001, ... members of --chunk-size bytes
+#                       (default 64M); each chunk gets its CRC-32 and
+#                       SHA-256 in a <Chunks> node of its <Img>
+#   --delta-base        Create a delta package against the AXP of the previous
+#                       release: images found in it are stored as block-level
+#                       deltas, to be rebuilt with axp_delta.py
+#   --delta-block-size  Block size of delta packages (default: 64K)
+#   -j, --jobs          Number of parallel DEFLATE processes (default: 1, 0: all CPUs)
 #   -P, --partitions    Input image files in the format PARTITION_NAME=file_path
 #                       e.g.,
 #                         ATF_A=path/to/file1
@@ -26,16 +46,36 @@
 #                         UBOOT_A=path/to/file3
 #                         UBOOT_B=path/to/file4
 #   -f, --files         Input image files
+#   --digest-cache      Digest cache database for <Auth> values of unchanged images
+#   --no-digest-cache   Do not read or update the digest cache
+#   -C, --compress      Override the sampled compression of an image,
+#                       PARTITION_NAME=MODE with MODE one of auto, stored,
+#                       deflated or a deflate level 0-9
+#
+# Every image is sampled (first, middle and last blocks) and stored
+# without compression when it would not shrink, or deflated at a level
+# matching how well it compresses.
 #
 # For any questions, please contact: wangkart@aliyun.com
 
 import os
+import io
+import copy
+import contextlib
 import sys
 import zipfile
 import shutil
 import xml.etree.ElementTree as ET
 import hashlib
 import argparse
+from checksum import CRC16, CRC32, CRC32C
+from axp_reader import AXPReader, find_xml_member
+from axp_delta import DeltaEncoder, base_image, DEFAULT_DELTA_BLOCK_SIZE
+from digest_cache import add_cache_arguments, open_cache
+from filecopy import StagingStats
+from fastzip import (FastZipFile, default_jobs, choose_compression, describe_compression,
+                     parse_compression_overrides, parse_size, member_info, member_data_offset,
+                     COMPRESSION_MODES)
 
 def get_abspath(path):
     return os.path.normpath(os.path.abspath(path))
@@ -52,52 +92,36 @@ def read_block_from_file(file, block_size):
             else:
                 return
 
-def calc_md5(file):
-    m = hashlib.md5()
-    for block in read_block_from_file(file, 10 * 1024 * 1024):
-        m.update(block)
-    return m.hexdigest()
-
-def calc_crc16(file):
-    crc16_table = [
-        0x0000, 0xC0C1, 0xC181, 0x0140, 0xC301, 0x03C0, 0x0280, 0xC241,
-        0xC601, 0x06C0, 0x0780, 0xC741, 0x0500, 0xC5C1, 0xC481, 0x0440,
-        0xCC01, 0x0CC0, 0x0D80, 0xCD41, 0x0F00, 0xCFC1, 0xCE81, 0x0E40,
-        0x0A00, 0xCAC1, 0xCB81, 0x0B40, 0xC901, 0x09C0, 0x0880, 0xC841,
-        0xD801, 0x18C0, 0x1980, 0xD941, 0x1B00, 0xDBC1, 0xDA81, 0x1A40,
-        0x1E00, 0xDEC1, 0xDF81, 0x1F40, 0xDD01, 0x1DC0, 0x1C80, 0xDC41,
-        0x1400, 0xD4C1, 0xD581, 0x1540, 0xD701, 0x17C0, 0x1680, 0xD641,
-        0xD201, 0x12C0, 0x1380, 0xD341, 0x1100, 0xD1C1, 0xD081, 0x1040,
-        0xF001, 0x30C0, 0x3180, 0xF141, 0x3300, 0xF3C1, 0xF281, 0x3240,
-        0x3600, 0xF6C1, 0xF781, 0x3740, 0xF501, 0x35C0, 0x3480, 0xF441,
-        0x3C00, 0xFCC1, 0xFD81, 0x3D40, 0xFF01, 0x3FC0, 0x3E80, 0xFE41,
-        0xFA01, 0x3AC0, 0x3B80, 0xFB41, 0x3900, 0xF9C1, 0xF881, 0x3840,
-        0x2800, 0xE8C1, 0xE981, 0x2940, 0xEB01, 0x2BC0, 0x2A80, 0xEA41,
-        0xEE01, 0x2EC0, 0x2F80, 0xEF41, 0x2D00, 0xEDC1, 0xEC81, 0x2C40,
-        0xE401, 0x24C0, 0x2580, 0xE541, 0x2700, 0xE7C1, 0xE681, 0x2640,
-        0x2200, 0xE2C1, 0xE381, 0x2340, 0xE101, 0x21C0, 0x2080, 0xE041,
-        0xA001, 0x60C0, 0x6180, 0xA141, 0x6300, 0xA3C1, 0xA281, 0x6240,
-        0x6600, 0xA6C1, 0xA781, 0x6740, 0xA501, 0x65C0, 0x6480, 0xA441,
-        0x6C00, 0xACC1, 0xAD81, 0x6D40, 0xAF01, 0x6FC0, 0x6E80, 0xAE41,
-        0xAA01, 0x6AC0, 0x6B80, 0xAB41, 0x6900, 0xA9C1, 0xA881, 0x6840,
-        0x7800, 0xB8C1, 0xB981, 0x7940, 0xBB01, 0x7BC0, 0x7A80, 0xBA41,
-        0xBE01, 0x7EC0, 0x7F80, 0xBF41, 0x7D00, 0xBDC1, 0xBC81, 0x7C40,
-        0xB401, 0x74C0, 0x7580, 0xB541, 0x7700, 0xB7C1, 0xB681, 0x7640,
-        0x7200, 0xB2C1, 0xB381, 0x7340, 0xB101, 0x71C0, 0x7080, 0xB041,
-        0x5000, 0x90C1, 0x9181, 0x5140, 0x9301, 0x53C0, 0x5280, 0x9241,
-        0x9601, 0x56C0, 0x5780, 0x9741, 0x5500, 0x95C1, 0x9481, 0x5440,
-        0x9C01, 0x5CC0, 0x5D80, 0x9D41, 0x5F00, 0x9FC1, 0x9E81, 0x5E40,
-        0x5A00, 0x9AC1, 0x9B81, 0x5B40, 0x9901, 0x59C0, 0x5880, 0x9841,
-        0x8801, 0x48C0, 0x4980, 0x8941, 0x4B00, 0x8BC1, 0x8A81, 0x4A40,
-        0x4E00, 0x8EC1, 0x8F81, 0x4F40, 0x8D01, 0x4DC0, 0x4C80, 0x8C41,
-        0x4400, 0x84C1, 0x8581, 0x4540, 0x8701, 0x47C0, 0x4680, 0x8641,
-        0x8201, 0x42C0, 0x4380, 0x8341, 0x4100, 0x81C1, 0x8081, 0x4040
-    ]
-    crc16 = 0
+# <Auth algo="N"> codes and the incremental digest each one selects
+AUTH_ALGOS = {
+    1: hashlib.md5,
+    2: CRC16,
+    3: CRC32,
+    4: CRC32C,
+    5: hashlib.sha256,
+}
+
+# <Img> children describing how the image is stored, written by this script
+LAYOUT_TAGS = ('Chunks', 'Delta')
+
+def new_auth_hasher(node_img):
+    """
+    Create a digest object for the <Auth> algorithm of an <Img> node.
+
+    Returns:
+        object: hashlib-like object, or None when no Auth is requested.
+    """
+    algo = node_img.find('Auth').get('algo')
+    if algo and int(algo) > 0:
+        factory = AUTH_ALGOS.get(int(algo))
+        if factory:
+            return factory()
+    return None
+
+def calc_auth(file, hasher):
     for block in read_block_from_file(file, 10 * 1024 * 1024):
-        for data in block:
-            crc16 = (crc16 >> 8) ^ (crc16_table[(crc16 ^ data) & 0xFF])
-    return hex(crc16)
+        hasher.update(block)
+    return hasher.hexdigest()
 
 def get_unique_filename(file_name, copied_files):
     dst_file = file_name
@@ -110,55 +134,69 @@ def get_unique_filename(file_name, copied_files):
     copied_files.add(dst_file)
     return dst_file
 
+def update_auth_node(node_img, file_path):
+    hasher = new_auth_hasher(node_img)
+    if hasher:
+        node_img.find('Auth').text = calc_auth(file_path, hasher)
+
 def update_file_node(file, node_img, zip_dir, copied_files):
     file_name = get_fname(file)
     dst_file = get_unique_filename(file_name, copied_files)
     node_file = node_img.find('File')
     node_file.text = dst_file
-    node_auth = node_img.find('Auth')
-    algo = node_auth.get('algo')
-    if algo and int(algo) > 0:
-        file_path = os.path.join(zip_dir, dst_file)
-        if int(algo) == 1:
-            node_auth.text = calc_md5(file_path)
-        elif int(algo) == 2:
-            node_auth.text = calc_crc16(file_path)
-
-def update_xml_content(tree, args, zip_dir, copied_files):
-    """
-    Update XML content based on provided arguments.
-
-    Args:
-        tree (ET.ElementTree): XML tree to update.
-        args (argparse.Namespace): Arguments with project details, version, files, and partitions.
-        zip_dir (str): Directory where the zip files are stored.
-        copied_files (set): Set to track copied files.
-
-    Raises:
-        ValueError: If input files count doesn't match required image nodes.
-    """
-    root = tree.getroot()
+    update_auth_node(node_img, os.path.join(zip_dir, dst_file))
 
+def update_project_node(root, args):
     node_project = root.find('Project')
     node_project.set('name', args.name)
     if args.version:
         node_project.set('version', args.version)
 
+def get_img_inputs(args, root):
+    """
+    Pair every <Img> node that needs an input file with its image.
+
+    Args:
+        args (argparse.Namespace): Arguments with files or partitions.
+        root (xml.etree.ElementTree.Element): XML root element.
+
+    Returns:
+        list: (file_path, node_img) tuples in XML order.
+    """
     img_nodes = [img for img in root.iter('Img') if (int(img.get('flag', 0)) & 0x01) == 0x01]
 
     if args.files:
-        for file, node_img in zip(args.files, img_nodes):
-            update_file_node(file, node_img, zip_dir, copied_files)
+        return list(zip(args.files, img_nodes))
 
+    inputs = []
     if args.partitions:
         partition_map = {p.split('=')[0]: p.split('=')[1] for p in args.partitions}
         for node_img in img_nodes:
             part_name = node_img.find('ID').text
             file = partition_map.get(part_name)
             if file:
-                update_file_node(file, node_img, zip_dir, copied_files)
+                inputs.append((file, node_img))
+    return inputs
 
-def make_zip(zip_dir, zip_path, verbose):
+def update_xml_content(tree, args, zip_dir, copied_files):
+    """
+    Update XML content based on provided arguments.
+
+    Args:
+        tree (ET.ElementTree): XML tree to update.
+        args (argparse.Namespace): Arguments with project details, version, files, and partitions.
+        zip_dir (str): Directory where the zip files are stored.
+        copied_files (set): Set to track copied files.
+
+    Raises:
+        ValueError: If input files count doesn't match required image nodes.
+    """
+    root = tree.getroot()
+    update_project_node(root, args)
+    for file, node_img in get_img_inputs(args, root):
+        update_file_node(file, node_img, zip_dir, copied_files)
+
+def make_zip(zip_dir, zip_path, verbose, jobs=1, compression=None, align=0):
     """
     Create a zip file from a directory.
 
@@ -166,30 +204,40 @@ def make_zip(zip_dir, zip_path, verbose):
         zip_dir (str): Directory to zip.
         zip_path (str): Output zip file path.
         verbose (bool): Print file names if True.
+        jobs (int): Number of parallel compression processes.
+        compression (dict): Compression mode per member name, 'auto' if absent.
+        align (int): Data alignment of stored members, 0 for none.
 
     Raises:
         Exception: On error, prints message and exits.
     """
     try:
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED, allowZip64=True) as zf:
+        with FastZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED, allowZip64=True,
+                         jobs=jobs, align=align) as zf:
             for root, _, files in os.walk(zip_dir):
                 for file in files:
                     file_path = os.path.join(root, file)
                     arcname = os.path.relpath(file_path, zip_dir)
+                    mode = (compression or {}).get(arcname, 'auto')
+                    compress_type, level, reason = choose_compression(file_path, mode)
                     if verbose:
-                        print(f'Adding {file_path} to AXP {zip_path}')
-                    zf.write(file_path, arcname)
+                        print(f'Adding {file_path} to AXP {zip_path} '
+                              f'({describe_compression(compress_type, level)}, {reason})')
+                    zf.write(file_path, arcname, compress_type, level)
     except Exception as e:
         print(f"Error creating AXP file {zip_path}: {e}")
         sys.exit(1)
 
-def copy_file(src, dst, verbose):
-    if verbose:
-        print(f'Copying from {src} to {dst}')
+def copy_file(src, dst, verbose, stats=None):
+    stats = stats or StagingStats()
     if os.path.isfile(src):
-        shutil.copy(src, dst)
+        strategy, moved = stats.stage(src, dst)
+        if verbose:
+            print(f'Copying from {src} to {dst} ({strategy}, {moved} bytes moved)')
     elif os.path.isdir(src):
-        shutil.copytree(src, dst)
+        if verbose:
+            print(f'Copying from {src} to {dst}')
+        shutil.copytree(src, dst, copy_function=stats.stage)
 
 def prepare_directories(xml_path, output_path):
     zip_dir = os.path.splitext(output_path)[0]
@@ -200,7 +248,7 @@ def prepare_directories(xml_path, output_path):
     os.mkdir(zip_dir)
     return zip_dir
 
-def copy_files(args, root, zip_dir, copied_files):
+def copy_files(args, root, zip_dir, copied_files, stats=None):
     """
     Copies specified files to the destination directory.
 
@@ -209,6 +257,7 @@ def copy_files(args, root, zip_dir, copied_files):
         root (xml.etree.ElementTree.Element): XML root element.
         zip_dir (str): Destination directory.
         copied_files (set): Set of copied files.
+        stats (StagingStats): Strategies and bytes moved by the copies.
 
     Returns:
         int: Total files copied.
@@ -219,7 +268,7 @@ def copy_files(args, root, zip_dir, copied_files):
         for part_name, file_path in partition_map.items():
             dst_file = get_unique_filename(get_fname(file_path), copied_files)
             dst_path = os.path.join(zip_dir, dst_file)
-            copy_file(file_path, dst_path, args.verbose)
+            copy_file(file_path, dst_path, args.verbose, stats)
             total_files_copied += 1
 
     files = [get_abspath(file) for file in args.files] if args.files else []
@@ -234,7 +283,7 @@ def copy_files(args, root, zip_dir, copied_files):
     for file in files:
         dst_file = get_unique_filename(get_fname(file), copied_files)
         dst_path = os.path.join(zip_dir, dst_file)
-        copy_file(file, dst_path, args.verbose)
+        copy_file(file, dst_path, args.verbose, stats)
         total_files_copied += 1
 
     return total_files_copied
@@ -246,6 +295,460 @@ def copy_xml_file(xml_path, zip_dir, verbose):
     shutil.copy(xml_path, xml_dst_path)
     return xml_dst_path
 
+def write_zip_member(zf, file_path, arcname, hashers, verbose,
+                     compress_type=zipfile.ZIP_DEFLATED, level=None):
+    """
+    Stream one input file into the archive as a member.
+
+    Every block read from the input is fed to the archive writer and to
+    the given digest objects, so the file is read exactly once.
+
+    Args:
+        zf (FastZipFile): Archive opened for writing.
+        file_path (str): Input image file.
+        arcname (str): Member name inside the archive.
+        hashers (list): hashlib-like objects updated with the file content.
+        verbose (bool): Print file names if True.
+        compress_type (int): zipfile.ZIP_STORED or zipfile.ZIP_DEFLATED.
+        level (int): Deflate level, None for the zlib default.
+
+    Returns:
+        int: Bytes read from the input file.
+    """
+    if verbose:
+        print(f'Adding {file_path} to AXP as {arcname}')
+    zinfo = member_info(file_path, arcname, compress_type, level)
+    bytes_read = 0
+    with open(file_path, 'rb') as src, zf.open(zinfo, 'w') as dst:
+        while True:
+            block = src.read(10 * 1024 * 1024)
+            if not block:
+                break
+            for hasher in hashers:
+                hasher.update(block)
+            dst.write(block)
+            bytes_read += len(block)
+    return bytes_read
+
+def write_chunked_member(zf, file_path, arcname, hashers, verbose, chunk_size,
+                         compress_type=zipfile.ZIP_DEFLATED, level=None):
+    """
+    Stream one input file into the archive as a series of chunk members.
+
+    The file is cut into chunk_size pieces named ARCNAME.000, ARCNAME.001,
+    ... Every block read from the input also feeds the SHA-256 of its
+    chunk, so the file is still read exactly once.
+
+    Args:
+        zf (FastZipFile): Archive opened for writing.
+        file_path (str): Input image file.
+        arcname (str): Base member name inside the archive.
+        hashers (list): hashlib-like objects updated with the file content.
+        verbose (bool): Print file names if True.
+        chunk_size (int): Size of every chunk but the last.
+        compress_type (int): zipfile.ZIP_STORED or zipfile.ZIP_DEFLATED.
+        level (int): Deflate level, None for the zlib default.
+
+    Returns:
+        tuple: (bytes read, list of dicts with file, size, crc32 and sha256 per chunk)
+    """
+    chunks = []
+    bytes_read = 0
+    with open(file_path, 'rb') as src:
+        block = src.read(min(10 * 1024 * 1024, chunk_size))
+        while block:
+            zinfo = member_info(file_path, f'{arcname}.{len(chunks):03d}', compress_type, level)
+            zinfo.file_size = chunk_size
+            sha256 = hashlib.sha256()
+            written = 0
+            with zf.open(zinfo, 'w') as dst:
+                while block:
+                    for hasher in hashers:
+                        hasher.update(block)
+                    sha256.update(block)
+                    dst.write(block)
+                    written += len(block)
+                    block = src.read(min(10 * 1024 * 1024, chunk_size - written)) if written < chunk_size else b''
+            chunks.append({'file': zinfo.filename, 'size': written,
+                           'crc32': f'{zinfo.CRC:08x}', 'sha256': sha256.hexdigest()})
+            bytes_read += written
+            block = src.read(min(10 * 1024 * 1024, chunk_size))
+    if verbose:
+        print(f'Added {file_path} to AXP as {len(chunks)} chunks {arcname}.000..{len(chunks) - 1:03d}')
+    return bytes_read, chunks
+
+def update_chunks_node(node_img, chunk_size, chunks):
+    """Record the chunks of an image in a <Chunks> node of its <Img>."""
+    node_chunks = ET.SubElement(node_img, 'Chunks', size=str(chunk_size), count=str(len(chunks)))
+    for index, chunk in enumerate(chunks):
+        ET.SubElement(node_chunks, 'Chunk', index=str(index), file=chunk['file'], size=str(chunk['size']),
+                      crc32=chunk['crc32'], sha256=chunk['sha256'])
+
+def remove_layout_nodes(node_img):
+    """Drop the <Chunks>/<Delta> nodes left over from a previous build."""
+    for tag in LAYOUT_TAGS:
+        for node in node_img.findall(tag):
+            node_img.remove(node)
+
+def get_chunk_size(args, file):
+    """Return the chunk size to split an input with, 0 to keep it whole."""
+    if args.chunk_threshold and os.path.getsize(file) > args.chunk_threshold:
+        return args.chunk_size
+    return 0
+
+def add_image_member(zf, args, file, node_img, dst_file, cache):
+    """
+    Stream one input image into the archive and fill in its <Auth>.
+
+    Images larger than --chunk-threshold are written as chunk members
+    listed in a <Chunks> node.
+
+    Args:
+        zf (FastZipFile): Archive opened for writing.
+        args (argparse.Namespace): Command-line arguments.
+        file (str): Input image file.
+        node_img (ET.Element): <Img> node of the image.
+        dst_file (str): Member name inside the archive.
+        cache (DigestCache): Cache of <Auth> digests of the inputs.
+
+    Returns:
+        list: Names of the members written.
+    """
+    part_name = node_img.find('ID').text
+    compress_type, level, reason = choose_compression(file, args.compress.get(part_name, 'auto'))
+    if args.verbose:
+        print(f'{part_name}: {describe_compression(compress_type, level)} ({reason})')
+    hasher = new_auth_hasher(node_img)
+    if hasher:
+        cached = cache.lookup(file, hasher.name)
+        if cached is not None:
+            node_img.find('Auth').text = cached
+            hasher = None
+    st = os.stat(file)
+    hashers = [hasher] if hasher else []
+    remove_layout_nodes(node_img)
+    chunk_size = get_chunk_size(args, file)
+    if chunk_size:
+        bytes_read, chunks = write_chunked_member(zf, file, dst_file, hashers, args.verbose,
+                                                  chunk_size, compress_type, level)
+        update_chunks_node(node_img, chunk_size, chunks)
+        names = [chunk['file'] for chunk in chunks]
+    else:
+        bytes_read = write_zip_member(zf, file, dst_file, hashers, args.verbose,
+                                      compress_type, level)
+        names = [dst_file]
+        # Lets --update recognise the input without reading it again
+        cache.store(file, CRC32.name, f'0x{zf.getinfo(dst_file).CRC:08x}', st)
+    if hasher:
+        node_img.find('Auth').text = hasher.hexdigest()
+        cache.store(file, hasher.name, hasher.hexdigest(), st)
+    if args.verbose:
+        passes = bytes_read / st.st_size if st.st_size else 1.0
+        print(f'  {bytes_read} of {st.st_size} bytes read ({passes:.2f} pass)')
+    return names
+
+def add_delta_member(zf, args, file, node_img, dst_file, cache, base):
+    """
+    Stream the delta of one input image against the same <Img> of the
+    base AXP and fill in its <Auth> and <Delta> nodes.
+
+    The delta member uses the compression chosen for the image itself;
+    the applier rebuilds the image with the same one.
+
+    Args:
+        zf (FastZipFile): Archive opened for writing.
+        args (argparse.Namespace): Command-line arguments.
+        file (str): Input image file.
+        node_img (ET.Element): <Img> node of the image.
+        dst_file (str): Member name of the image in the rebuilt AXP.
+        cache (DigestCache): Cache of <Auth> digests of the inputs.
+        base (AXPReader): AXP the delta is taken against.
+
+    Returns:
+        list: Names of the members written.
+    """
+    part_name = node_img.find('ID').text
+    compress_type, level, reason = choose_compression(file, args.compress.get(part_name, 'auto'))
+    if compress_type == zipfile.ZIP_STORED:
+        mode = 'stored'
+    else:
+        mode = 'deflated' if level is None else str(level)
+    hasher = new_auth_hasher(node_img)
+    if hasher:
+        cached = cache.lookup(file, hasher.name)
+        if cached is not None:
+            node_img.find('Auth').text = cached
+            hasher = None
+    st = os.stat(file)
+    remove_layout_nodes(node_img)
+
+    delta_name = f'{dst_file}.delta'
+    zinfo = member_info(file, delta_name, compress_type, level)
+    with base_image(base, part_name) as base_data:
+        encoder = DeltaEncoder(base_data, args.delta_block_size)
+        with open(file, 'rb') as src, zf.open(zinfo, 'w') as dst:
+            stats = encoder.encode(src, dst, st.st_size, [hasher] if hasher else [])
+    ET.SubElement(node_img, 'Delta', file=delta_name, block_size=str(args.delta_block_size),
+                  size=str(st.st_size), compress=mode, base=encoder.base_sha256,
+                  target=stats['target_sha256'])
+    if hasher:
+        node_img.find('Auth').text = hasher.hexdigest()
+        cache.store(file, hasher.name, hasher.hexdigest(), st)
+    if args.verbose:
+        print(f'{part_name}: delta of {file} as {delta_name} ({reason}), {stats["copied"]} bytes '
+              f'from the base, {stats["literal"]} bytes new, {zinfo.compress_size} bytes stored')
+    return [delta_name]
+
+def content_keys(inputs, cache):
+    """
+    Group the input images by content.
+
+    Inputs naming the same file share a key right away. Files that only
+    share their size with another input are told apart by SHA-256, taken
+    from the digest cache when possible; all others get a key of their own.
+
+    Args:
+        inputs (list): (file, node_img) pairs, see get_img_inputs().
+        cache (DigestCache): Cache of file digests.
+
+    Returns:
+        list: One key per input, equal for inputs with identical content.
+    """
+    stats = [os.stat(file) for file, _ in inputs]
+    sizes = {}
+    for st in stats:
+        sizes.setdefault(st.st_size, set()).add((st.st_dev, st.st_ino))
+
+    keys = []
+    for (file, _), st in zip(inputs, stats):
+        if len(sizes[st.st_size]) > 1:
+            digest = cache.digest(file, 'sha256', lambda f: calc_auth(f, hashlib.sha256()))
+            keys.append(('sha256', st.st_size, digest))
+        else:
+            keys.append(('inode', st.st_dev, st.st_ino))
+    return keys
+
+def share_member(file, node_img, node_shared, cache):
+    """
+    Point an <Img> node at the member already holding identical content.
+
+    The <Auth> value is copied when both nodes use the same algorithm,
+    otherwise it is computed for the file (or taken from the cache).
+    """
+    node_img.find('File').text = node_shared.find('File').text
+    remove_layout_nodes(node_img)
+    for tag in LAYOUT_TAGS:
+        if node_shared.find(tag) is not None:
+            node_img.append(copy.deepcopy(node_shared.find(tag)))
+    auth = node_img.find('Auth')
+    shared_auth = node_shared.find('Auth')
+    if int(auth.get('algo') or 0) == int(shared_auth.get('algo') or 0):
+        auth.text = shared_auth.text
+        return
+    hasher = new_auth_hasher(node_img)
+    if hasher:
+        auth.text = cache.digest(file, hasher.name, lambda f: calc_auth(f, hasher))
+
+def load_previous_axp(axp_path, xml_name):
+    """
+    Index the image members of an existing AXP by <Img> ID.
+
+    Args:
+        axp_path (str): Existing AXP file.
+        xml_name (str): Name of the XML member.
+
+    Returns:
+        dict: ID -> (node_img, zipfile.ZipInfo), empty if the AXP has no XML.
+    """
+    previous = {}
+    with zipfile.ZipFile(axp_path) as zf:
+        names = zf.namelist()
+        xml_name = find_xml_member(names, xml_name)
+        if xml_name is None:
+            return previous
+        old_root = ET.fromstring(zf.read(xml_name))
+        for node_img in old_root.iter('Img'):
+            node_file = node_img.find('File')
+            if node_file is None or not node_file.text or node_file.text not in names:
+                continue
+            previous[node_img.find('ID').text] = (node_img, zf.getinfo(node_file.text))
+    return previous
+
+def find_unchanged_member(args, file, node_img, previous, cache):
+    """
+    Find the member of the previous AXP that still holds this image.
+
+    A member is reused when its size and CRC-32 match the input file, its
+    <Auth> algorithm is unchanged and a compression override does not ask
+    for a different method. The member timestamp is not trusted: it has a
+    2 second resolution and reproducible builds give every input the same
+    mtime. The CRC-32 of the input is taken from the digest cache, keyed
+    by the file identity, and only computed for inputs that changed.
+
+    Returns:
+        tuple: (old node_img, zipfile.ZipInfo), or None if it must be rebuilt.
+    """
+    part_name = node_img.find('ID').text
+    if part_name not in previous:
+        return None
+    old_node, zinfo = previous[part_name]
+
+    old_auth = old_node.find('Auth')
+    new_auth = node_img.find('Auth')
+    algo = int(new_auth.get('algo') or 0)
+    if int(old_auth.get('algo') or 0) != algo or (algo > 0 and not old_auth.text):
+        return None
+
+    if zinfo.file_size != os.path.getsize(file):
+        return None
+    crc = cache.digest(file, CRC32.name, lambda f: calc_auth(f, CRC32()))
+    if int(crc, 16) != zinfo.CRC:
+        return None
+
+    mode = args.compress.get(part_name, 'auto')
+    if mode != 'auto' and choose_compression(file, mode)[0] != zinfo.compress_type:
+        return None
+    return old_node, zinfo
+
+def stream_axp(args, tree, xml_path, output_path, cache, previous=None, base=None):
+    """
+    Assemble the AXP by streaming every input straight into the archive.
+
+    Each input image is read once and written as a ZIP member, with no
+    staging directory. The <Auth> digest is taken from the digest cache
+    or computed from the same buffers, and the rewritten XML is added
+    as the last member.
+
+    Images with identical content, typically the two halves of an A/B
+    pair, are stored once and their <Img> nodes share the member.
+
+    With a previous AXP, members whose input is unchanged are copied
+    from it as raw compressed bytes together with their <Auth> value,
+    and only the other images are read and compressed again. The new
+    archive replaces the output once it is complete.
+
+    With a base AXP, the images it also holds are written as deltas
+    against it (see axp_delta.py), producing a delta package.
+
+    Args:
+        args (argparse.Namespace): Command-line arguments.
+        tree (ET.ElementTree): Parsed XML configuration.
+        xml_path (str): Input XML file path.
+        output_path (str): Output AXP file path.
+        cache (DigestCache): Cache of <Auth> digests of the inputs.
+        previous (dict): Members of the existing AXP, see load_previous_axp().
+        base (AXPReader): Previous release for a delta package.
+
+    Returns:
+        tuple: (total members written, members copied unchanged)
+    """
+    root = tree.getroot()
+    update_project_node(root, args)
+
+    xml_name = get_fname(xml_path)
+    copied_files = {xml_name}
+    total_members = 0
+    kept_members = 0
+
+    tmp_path = output_path + '.tmp'
+    old_fp = open(output_path, 'rb') if previous else None
+    try:
+        with FastZipFile(tmp_path, 'w', zipfile.ZIP_DEFLATED, allowZip64=True,
+                         jobs=args.jobs, align=args.align) as zf:
+            inputs = get_img_inputs(args, root)
+            keys = content_keys(inputs, cache) if args.dedup else [None] * len(inputs)
+            members = {}
+            for (file, node_img), key in zip(inputs, keys):
+                if key in members:
+                    share_member(file, node_img, members[key], cache)
+                    if args.verbose:
+                        print(f'{node_img.find("ID").text}: same content as '
+                              f'{members[key].find("ID").text}, sharing {node_img.find("File").text}')
+                    continue
+                if key is not None:
+                    members[key] = node_img
+                dst_file = get_unique_filename(get_fname(file), copied_files)
+                node_img.find('File').text = dst_file
+                unchanged = None
+                if previous and not get_chunk_size(args, file):
+                    unchanged = find_unchanged_member(args, file, node_img, previous, cache)
+                if unchanged:
+                    old_node, zinfo = unchanged
+                    if args.verbose:
+                        print(f'{node_img.find("ID").text}: unchanged, copying {zinfo.compress_size} '
+                              f'compressed bytes of {zinfo.filename} as {dst_file}')
+                    zf.write_raw(zinfo, old_fp, member_data_offset(old_fp, zinfo), dst_file)
+                    node_img.find('Auth').text = old_node.find('Auth').text
+                    kept_members += 1
+                    total_members += 1
+                else:
+                    if base and node_img.find('ID').text in base.ids():
+                        names = add_delta_member(zf, args, file, node_img, dst_file, cache, base)
+                    else:
+                        names = add_image_member(zf, args, file, node_img, dst_file, cache)
+                    copied_files.update(names)
+                    total_members += len(names)
+
+            xml_data = io.BytesIO()
+            tree.write(xml_data)
+            if args.verbose:
+                print(f'Adding {xml_path} to AXP as {xml_name}')
+            zf.writestr(xml_name, xml_data.getvalue())
+            total_members += 1
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    finally:
+        if old_fp:
+            old_fp.close()
+
+    return total_members, kept_members
+
+def staged_axp(args, tree, xml_path, output_path):
+    """
+    Assemble the AXP through a staging directory next to the output.
+
+    Every input is copied into the staging directory, which is kept
+    after the archive is created so its content can be inspected.
+
+    Args:
+        args (argparse.Namespace): Command-line arguments.
+        tree (ET.ElementTree): Parsed XML configuration.
+        xml_path (str): Input XML file path.
+        output_path (str): Output AXP file path.
+
+    Returns:
+        int: Total files copied.
+    """
+    root = tree.getroot()
+    zip_dir = prepare_directories(xml_path, output_path)
+
+    if args.verbose:
+        print('Starting file copy...')
+
+    copied_files = set()
+    stats = StagingStats()
+    total_files_copied = copy_files(args, root, zip_dir, copied_files, stats)
+
+    # The staged XML is rewritten below, it must not be a link to the input
+    xml_dst_path = copy_xml_file(xml_path, zip_dir, args.verbose)
+    total_files_copied += 1
+
+    if args.verbose:
+        print(f'Total {total_files_copied} files copied.')
+    print(stats.report())
+
+    copied_files.clear()
+    update_xml_content(tree, args, zip_dir, copied_files)
+    tree.write(xml_dst_path)
+    compression = {node_img.find('File').text: args.compress[node_img.find('ID').text]
+                   for _, node_img in get_img_inputs(args, root)
+                   if node_img.find('ID').text in args.compress}
+    make_zip(zip_dir, output_path, args.verbose, args.jobs, compression, args.align)
+    return total_files_copied
+
 def create_axp(args):
     """
     Creates an AXP file from the given XML file.
@@ -255,20 +758,22 @@ def create_axp(args):
             - xml (str): Input XML file path.
             - output (str): Output AXP file path.
             - verbose (bool): Enable detailed logs.
-            - debug (bool): Retain temporary directories for debugging.
+            - debug (bool): Assemble through a retained staging directory.
 
     Raises:
         Exception: On error during AXP creation.
 
     Steps:
         1. Parse XML file.
-        2. Prepare directories.
-        3. Copy referenced files.
-        4. Copy XML file.
-        5. Update XML content.
-        6. Write updated XML.
-        7. Create ZIP archive.
-        8. Clean up unless in debug mode.
+        2. Stream every input image into the archive, updating
+           <File> and <Auth> of its <Img> node.
+        3. Write updated XML as the last member.
+
+        In update mode the existing output AXP is read first and the
+        members of unchanged images are copied from it as they are.
+
+        In debug mode the images and XML are copied to a staging
+        directory first and the archive is created from it.
 
     Prints:
         - Detailed logs if verbose.
@@ -280,28 +785,27 @@ def create_axp(args):
         output_path = get_abspath(args.output)
 
         tree = ET.parse(xml_path)
-        root = tree.getroot()
-
-        zip_dir = prepare_directories(xml_path, output_path)
 
-        if args.verbose:
-            print('Starting file copy...')
-
-        copied_files = set()
-        total_files_copied = copy_files(args, root, zip_dir, copied_files)
-
-        xml_dst_path = copy_xml_file(xml_path, zip_dir, args.verbose)
-        total_files_copied += 1
-
-        if args.verbose:
-            print(f'Total {total_files_copied} files copied.')
-
-        copied_files.clear()
-        update_xml_content(tree, args, zip_dir, copied_files)
-        tree.write(xml_dst_path)
-        make_zip(zip_dir, output_path, args.verbose)
-        if not args.debug:
-            shutil.rmtree(zip_dir)
+        if args.debug:
+            staged_axp(args, tree, xml_path, output_path)
+        else:
+            previous = None
+            if args.update:
+                if os.path.isfile(output_path):
+                    previous = load_previous_axp(output_path, get_fname(xml_path))
+                if not previous:
+                    print(f"No previous AXP content found at {output_path}, creating it from scratch.")
+            with open_cache(args) as cache, contextlib.ExitStack() as stack:
+                base = stack.enter_context(AXPReader(args.delta_base)) if args.delta_base else None
+                total_members, kept_members = stream_axp(args, tree, xml_path, output_path,
+                                                         cache, previous, base)
+            if args.update:
+                print(f"{kept_members} unchanged members copied, "
+                      f"{total_members - kept_members} members written.")
+            if args.verbose:
+                print(f'Total {total_members} members written.')
+                if cache.enabled:
+                    print(cache.report())
         print(f"AXP file created successfully at {output_path}.")
     except Exception as e:
         print(f"Error creating AXP from XML: {e}")
@@ -316,8 +820,31 @@ def parse_args():
     parser.add_argument('-o', '--output', default='output.axp', help='Set output .axp file')
     parser.add_argument('-x', '--xml', default='output.xml', help='XML configuration file')
     parser.add_argument('-v', '--version', default='1.0', help='Set version')
-    parser.add_argument('-d', '--debug', action='store_true', default=False, help='Enable debug mode')
+    parser.add_argument('-d', '--debug', action='store_true', default=False, help='Enable debug mode (assemble through a kept staging directory)')
     parser.add_argument('-V', '--verbose', action='store_true', default=False, help='Enable verbose output')
+    parser.add_argument('-u', '--update', action='store_true', default=False,
+                        help='Update the existing output AXP, copying unchanged images without recompressing')
+    parser.add_argument('--no-dedup', dest='dedup', action='store_false', default=True,
+                        help='Store every image as its own member, even if its content is shared')
+    parser.add_argument('-A', '--align', type=int, nargs='?', const=4096, default=0, metavar='BYTES',
+                        help='Align the data of stored images to BYTES (default without value: 4096)')
+    parser.add_argument('--chunk-threshold', type=parse_size, default=0, metavar='SIZE',
+                        help='Split images larger than SIZE into chunk members (e.g. 256M)')
+    parser.add_argument('--chunk-size', type=parse_size, default=64 * 1024 * 1024, metavar='SIZE',
+                        help='Size of the chunks of split images (default: 64M)')
+    parser.add_argument('--delta-base', metavar='OLD_AXP',
+                        help='Create a delta package against the AXP of the previous release')
+    parser.add_argument('--delta-block-size', type=parse_size, default=DEFAULT_DELTA_BLOCK_SIZE, metavar='SIZE',
+                        help='Block size of delta packages (default: 64K)')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='Number of parallel DEFLATE processes (default: 1, 0: all CPUs)')
+    add_cache_arguments(parser)
+    parser.add_argument('-C', '--compress', action='append', metavar='PARTITION_NAME=MODE',
+                        help=('Override the sampled compression of an image, may be repeated\n'
+                              f'MODE is one of: {", ".join(COMPRESSION_MODES)}\n'
+                              'e.g.,\n'
+                              '  ROOTFS=stored\n'
+                              '  UBOOT_A=9'))
     group = parser.add_mutually_exclusive_group(required=True)
     group.add_argument('-P', '--partitions', nargs='*',
                        help=('Input image files in the format PARTITION_NAME=file_path\n'
@@ -329,6 +856,27 @@ def parse_args():
     group.add_argument('-f', '--files', nargs='*', help='Input image files')
     args = parser.parse_args()
 
+    if args.update and args.debug:
+        parser.error("--update cannot be combined with --debug")
+    if args.chunk_threshold and args.debug:
+        parser.error("--chunk-threshold cannot be combined with --debug")
+    if args.delta_base:
+        if args.debug or args.update or args.chunk_threshold:
+            parser.error("--delta-base cannot be combined with --debug, --update or --chunk-threshold")
+        if not os.path.isfile(args.delta_base):
+            parser.error(f"The base AXP file '{args.delta_base}' does not exist.")
+    if args.align and (args.align & (args.align - 1) or not 0 < args.align <= 32768):
+        parser.error("--align must be a power of two up to 32768")
+    if args.jobs < 0:
+        parser.error("--jobs must not be negative")
+    if args.jobs == 0:
+        args.jobs = default_jobs()
+
+    try:
+        args.compress = parse_compression_overrides(args.compress)
+    except ValueError as e:
+        parser.error(str(e))
+
     # Validate file paths
     if not os.path.exists(args.xml):
         parser.error(f"The XML file '{args.xml}' does not exist.")
@@ -373,6 +921,11 @@ def parse_args():
         if invalid_parts:
             parser.error(f"PARTITION_NAME: '{', '.join(invalid_parts)}' do not match any ID in the XML file.")
 
+    # Check if compression overrides match IDs in XML
+    invalid_parts = [part_name for part_name in args.compress if part_name not in ids]
+    if invalid_parts:
+        parser.error(f"Compression PARTITION_NAME: '{', '.join(invalid_parts)}' do not match any ID in the XML file.")
+
     # Validate files arguments
     if args.files:
         for file in args.files:
@@ -15,6 +15,7 @@ import os
 import re
 import tempfile
 import shutil
+from bmap import create_bmap
 
 # ANSI escape codes for colored output
 RED = "\033[91m"
@@ -273,6 +274,11 @@ def main():
         action="store_true",
         help="Use minimal mkfs parameters (for smallest image, normally used with --auto-min-size)"
     )
+    parser.add_argument(
+        "-B", "--bmap",
+        action="store_true",
+        help="Also write the block map of the image (<output>.bmap) for bmaptool or bmap.py copy"
+    )
 
     args = parser.parse_args()
 
@@ -291,5 +297,9 @@ def main():
     else:
         create_ext4_image(options)
 
+    if args.bmap:
+        result = create_bmap(args.output_image)
+        print(f"Block map created at {result['bmap']}: {result['mapped']} of {result['size']} bytes mapped.")
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
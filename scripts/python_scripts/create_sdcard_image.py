@@ -7,13 +7,37 @@
 # This script is used to create a image zip file to flash
 # device partitions vid SDCard.
 #
+# With --format tar or tar.zst the partition images are streamed into a
+# tar archive, hashed on the way, and sha1sum.txt is appended to the same
+# stream. No staging directory is needed.
+#
+# With --format raw it writes a sparse GPT disk image instead, laid out
+# from partitions.json (see disk_image.py), which can be written to an
+# SD card directly with dd, or with bmaptool or bmap.py copy using the
+# block map written next to it.
+#
 
+import io
 import os
 import sys
+import contextlib
 import zipfile
 import shutil
 import argparse
 import hashlib
+import tarfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from digest_cache import add_cache_arguments, open_cache
+from disk_image import load_partition_layout, write_disk_image, DEFAULT_START
+from bmap import create_bmap
+from filecopy import StagingStats
+from zstdio import open_zstd_writer, ZSTD_DEFAULT_LEVEL, ZSTD_MIN_LEVEL, ZSTD_MAX_LEVEL
+from fastzip import (FastZipFile, default_jobs, choose_compression, describe_compression,
+                     parse_compression_overrides, parse_size, COMPRESSION_MODES)
+
+TAR_BUFFER_SIZE = 1024 * 1024
+OUTPUT_SUFFIXES = {'zip': '.zip', 'raw': '.img', 'tar': '.tar', 'tar.zst': '.tar.zst'}
 
 def get_abspath(path):
     return os.path.normpath(os.path.abspath(path))
@@ -21,13 +45,16 @@ def get_abspath(path):
 def get_fname(path):
     return os.path.basename(path)
 
-def copy_file(src, dst, verbose):
-    if verbose:
-        print(f'Copying from {src} to {dst}')
+def copy_file(src, dst, verbose, stats=None):
+    stats = stats or StagingStats()
     if os.path.isfile(src):
-        shutil.copy(src, dst)
+        strategy, moved = stats.stage(src, dst)
+        if verbose:
+            print(f'Copying from {src} to {dst} ({strategy}, {moved} bytes moved)')
     elif os.path.isdir(src):
-        shutil.copytree(src, dst)
+        if verbose:
+            print(f'Copying from {src} to {dst}')
+        shutil.copytree(src, dst, copy_function=stats.stage)
 
 def read_block_from_file(file, block_size):
     with open(file, 'rb') as f:
@@ -44,7 +71,77 @@ def calc_sha1(file_path):
         sha1.update(block)
     return sha1.hexdigest()
 
-def create_zip(zip_dir, zip_path, verbose):
+class Sha1Manifest:
+    """
+    Hash partition images in a thread pool and write sha1sum.txt.
+
+    hashlib releases the GIL, so the images are hashed in parallel with
+    each other and with the copies made meanwhile. Digests found in the
+    cache are not recomputed. sha1sum.txt is opened right away and lines
+    are written in the order the images were added, each as soon as it
+    and all previous ones are done.
+
+    Args:
+        cache (DigestCache): Cache of SHA-1 digests.
+        sha1sum_file_path (str): sha1sum.txt to write.
+        jobs (int): Number of hashing threads.
+    """
+
+    def __init__(self, cache, sha1sum_file_path, jobs=1):
+        self.cache = cache
+        self.executor = ThreadPoolExecutor(max_workers=max(1, jobs))
+        self.entries = []
+        self.written = 0
+        self._lock = threading.Lock()
+        self._file = open(sha1sum_file_path, 'w')
+
+    def add(self, file_path, name):
+        """Start hashing file_path, listed as name in sha1sum.txt."""
+        cached = self.cache.lookup(file_path, 'sha1')
+        if cached is not None:
+            future = Future()
+            future.set_result(cached)
+            st = None
+        else:
+            st = os.stat(file_path)
+            future = self.executor.submit(calc_sha1, file_path)
+        with self._lock:
+            self.entries.append((file_path, name, future, st))
+        future.add_done_callback(lambda _: self._write_done())
+
+    def _write_done(self):
+        """Write the lines of the done images not preceded by a pending one."""
+        with self._lock:
+            while self.written < len(self.entries):
+                _, name, future, _ = self.entries[self.written]
+                if not future.done() or future.exception() is not None:
+                    return
+                self._file.write(f"{future.result()}  {name}\n")
+                self._file.flush()
+                self.written += 1
+
+    def finish(self):
+        """Wait for every digest, complete sha1sum.txt and cache the new digests."""
+        for file_path, _, future, st in self.entries:
+            sha1_hash = future.result()
+            # The cache is only used from the thread that opened it
+            if st is not None:
+                self.cache.store(file_path, 'sha1', sha1_hash, st)
+        self._write_done()
+        self._file.close()
+
+    def close(self):
+        self.executor.shutdown()
+        if not self._file.closed:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def create_zip(zip_dir, zip_path, verbose, jobs=1, compression=None):
     """
     Create a zip file from a directory.
 
@@ -52,38 +149,180 @@ def create_zip(zip_dir, zip_path, verbose):
         zip_dir (str): Directory to zip.
         zip_path (str): Output zip file path.
         verbose (bool): Print file names if True.
+        jobs (int): Number of parallel compression processes.
+        compression (dict): Compression mode per member name, 'auto' if absent.
 
     Raises:
         Exception: On error, prints message and exits.
     """
     try:
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED, allowZip64=True) as zf:
+        with FastZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED, allowZip64=True, jobs=jobs) as zf:
             for root, _, files in os.walk(zip_dir):
                 for file in files:
                     file_path = os.path.join(root, file)
                     arcname = os.path.relpath(file_path, zip_dir)
+                    mode = (compression or {}).get(arcname, 'auto')
+                    compress_type, level, reason = choose_compression(file_path, mode)
                     if verbose:
-                        print(f'Adding {file_path} to zip {zip_path}')
-                    zf.write(file_path, arcname)
+                        print(f'Adding {file_path} to zip {zip_path} '
+                              f'({describe_compression(compress_type, level)}, {reason})')
+                    zf.write(file_path, arcname, compress_type, level)
     except Exception as e:
         print(f"Error creating zip file {zip_path}: {e}")
         sys.exit(1)
 
+class HashingReader:
+    """File object wrapper updating a hasher with the data read."""
+
+    def __init__(self, fileobj, hasher):
+        self.fileobj = fileobj
+        self.hasher = hasher
+
+    def read(self, size=-1):
+        data = self.fileobj.read(size)
+        self.hasher.update(data)
+        return data
+
+def create_tar(files, tar_path, verbose, compression=None, level=ZSTD_DEFAULT_LEVEL, jobs=1):
+    """
+    Stream files into a tar archive followed by their sha1sum.txt.
+
+    Every file is read once, feeding the archive and its SHA-1 together.
+
+    Args:
+        files (list): (source path, member name) pairs, in archive order.
+        tar_path (str): Output archive, replaced atomically.
+        verbose (bool): Print file names if True.
+        compression (str): None for a plain tar, 'zst' for zstd.
+        level (int): zstd compression level.
+        jobs (int): zstd compression threads.
+
+    Raises:
+        Exception: On error, prints message and exits.
+    """
+    tmp_path = tar_path + '.tmp'
+    try:
+        with contextlib.ExitStack() as stack:
+            if compression == 'zst':
+                stream = stack.enter_context(open_zstd_writer(tmp_path, level, jobs))
+            else:
+                stream = stack.enter_context(open(tmp_path, 'wb'))
+            tar = stack.enter_context(tarfile.open(fileobj=stream, mode='w|', format=tarfile.PAX_FORMAT,
+                                                   copybufsize=TAR_BUFFER_SIZE))
+            sha1sums = []
+            newest_mtime = 0
+            for src_path, arcname in files:
+                if verbose:
+                    print(f'Adding {src_path} to tar {tar_path} as {arcname}')
+                tarinfo = tar.gettarinfo(src_path, arcname)
+                tarinfo.uid = tarinfo.gid = 0
+                tarinfo.uname = tarinfo.gname = ''
+                newest_mtime = max(newest_mtime, int(tarinfo.mtime))
+                sha1 = hashlib.sha1()
+                with open(src_path, 'rb') as f:
+                    tar.addfile(tarinfo, HashingReader(f, sha1))
+                sha1sums.append(f"{sha1.hexdigest()}  {arcname}\n")
+
+            data = ''.join(sha1sums).encode()
+            tarinfo = tarfile.TarInfo('sha1sum.txt')
+            tarinfo.size = len(data)
+            # Not the build time, so identical inputs give an identical bundle
+            tarinfo.mtime = int(os.environ.get('SOURCE_DATE_EPOCH', newest_mtime))
+            tarinfo.mode = 0o644
+            tar.addfile(tarinfo, io.BytesIO(data))
+        os.replace(tmp_path, tar_path)
+    except Exception as e:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        print(f"Error creating tar file {tar_path}: {e}")
+        sys.exit(1)
+
+def create_raw_image(args, partition_map):
+    """
+    Write the partitions to a sparse GPT disk image at args.output.
+    """
+    try:
+        layout = load_partition_layout(args.json, parse_size(args.start))
+        disk_size = parse_size(args.disk_size) if args.disk_size else None
+        if args.verbose:
+            for part in layout:
+                print(f"Partition {part['name']:<16} offset {part['offset']:#012x} size {part['size']:#012x}")
+        result = write_disk_image(args.output, layout, partition_map, disk_size, args.verbose)
+        bmap = None if args.no_bmap else create_bmap(args.output)
+    except (OSError, ValueError) as e:
+        print(f"Error creating disk image {args.output}: {e}")
+        sys.exit(1)
+    allocated = os.stat(args.output).st_blocks * 512
+    print(f"Disk image created successfully at {args.output}: {result['disk_size']} bytes, "
+          f"{result['written']} bytes written, {allocated} bytes allocated.")
+    if bmap:
+        print(f"Block map created at {bmap['bmap']}: {bmap['mapped']} bytes mapped in {bmap['ranges']} ranges.")
+
 def main():
     parser = argparse.ArgumentParser(
         description='Create a zip file from specified files.',
         formatter_class=argparse.RawTextHelpFormatter
     )
-    parser.add_argument('-o', '--output', default='sdcard.zip', help='Set output .zip file')
+    parser.add_argument('-o', '--output', help='Set output file (default: sdcard.zip, or sdcard.img/.tar/.tar.zst)')
     parser.add_argument('-P', '--partitions', nargs='+', required=True,
                        help=('Input files in the format PARTITION_NAME=file_path\n'
                              'e.g.,\n'
                              '  BOOT=path/to/boot.img\n'
                              '  SYSTEM=path/to/system.img'))
     parser.add_argument('-v', '--verbose', action='store_true', default=False, help='Enable verbose output')
-    parser.add_argument('-d', '--debug', action='store_true', default=False, help='Enable debug mode (keeps temporary directory)')
+    parser.add_argument('-d', '--debug', action='store_true', default=False, help='Enable debug mode (keeps temporary directory, zip only)')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='Number of parallel DEFLATE processes, zstd and SHA-1 threads (default: 1, 0: all CPUs)')
+    add_cache_arguments(parser)
+    parser.add_argument('-C', '--compress', action='append', metavar='PARTITION_NAME=MODE',
+                        help=('Override the sampled compression of a partition, may be repeated\n'
+                              f'MODE is one of: {", ".join(COMPRESSION_MODES)}\n'
+                              'e.g.,\n'
+                              '  SYSTEM=stored'))
+    parser.add_argument('-F', '--format', choices=tuple(OUTPUT_SUFFIXES), default='zip',
+                        help=('Output format (default: zip)\n'
+                              '  zip: files and sha1sum.txt for the FDL SDCard flow\n'
+                              '  tar: the same content as an uncompressed tar stream\n'
+                              '  tar.zst: the tar stream compressed by multi-threaded zstd\n'
+                              '  raw: sparse GPT disk image, needs --json'))
+    parser.add_argument('-L', '--zstd-level', type=int, default=ZSTD_DEFAULT_LEVEL,
+                        help=f'zstd compression level of tar.zst (default: {ZSTD_DEFAULT_LEVEL})')
+    parser.add_argument('-J', '--json', help='partitions.json giving the raw image layout')
+    parser.add_argument('--start', default=str(DEFAULT_START),
+                        help='Offset of the first partition in the raw image (default: 1M)')
+    parser.add_argument('--disk-size', help='Raw image size (default: smallest 1M multiple fitting the layout)')
+    parser.add_argument('--no-bmap', action='store_true', default=False,
+                        help='Do not write the block map (<output>.bmap) of the raw image')
     args = parser.parse_args()
 
+    if args.output is None:
+        args.output = 'sdcard' + OUTPUT_SUFFIXES[args.format]
+    if not ZSTD_MIN_LEVEL <= args.zstd_level <= ZSTD_MAX_LEVEL:
+        parser.error(f"--zstd-level must be between {ZSTD_MIN_LEVEL} and {ZSTD_MAX_LEVEL}")
+    if args.compress and args.format != 'zip':
+        parser.error("--compress only applies to the zip format")
+    # tar and raw stream the inputs: no staging directory is kept and no
+    # digest is cached
+    if args.debug and args.format != 'zip':
+        parser.error("--debug only applies to the zip format")
+    if (args.digest_cache or args.no_digest_cache) and args.format != 'zip':
+        parser.error("--digest-cache and --no-digest-cache only apply to the zip format")
+    if args.format == 'raw':
+        if not args.json:
+            parser.error("--format raw requires --json")
+        if not os.path.isfile(args.json):
+            parser.error(f"The JSON file '{args.json}' does not exist.")
+
+    if args.jobs < 0:
+        parser.error("--jobs must not be negative")
+    if args.jobs == 0:
+        args.jobs = default_jobs()
+
+    try:
+        compress_overrides = parse_compression_overrides(args.compress)
+    except ValueError as e:
+        parser.error(str(e))
+
     # Validate partition arguments and file existence
     partition_map = {}
     partition_names_seen = set()
@@ -101,6 +340,21 @@ def main():
             parser.error(f"The file '{file_path}' is not a valid file.")
         partition_map[part_name] = file_path
 
+    invalid_parts = [part_name for part_name in compress_overrides if part_name not in partition_map]
+    if invalid_parts:
+        parser.error(f"Compression PARTITION_NAME: '{', '.join(invalid_parts)}' do not match any partition.")
+
+    if args.format == 'raw':
+        create_raw_image(args, partition_map)
+        return
+    if args.format in ('tar', 'tar.zst'):
+        files = [(file_path, part_name.lower() + os.path.splitext(file_path)[1])
+                 for part_name, file_path in partition_map.items()]
+        create_tar(files, args.output, args.verbose, 'zst' if args.format == 'tar.zst' else None,
+                   args.zstd_level, args.jobs)
+        print(f"Tar file created successfully at {args.output}.")
+        return
+
     # Create a temporary directory
     output_fullpath = get_abspath(args.output)
     # zip_dir will be the output path without its extension
@@ -114,27 +368,32 @@ def main():
         shutil.rmtree(zip_dir)
     os.makedirs(zip_dir)
 
-    # Copy files to the temporary directory
-    copied_file_paths = []
-    for part_name, file_path in partition_map.items():
-        _, ext = os.path.splitext(file_path)
-        dst_filename = part_name.lower() + ext
-        dst_path = os.path.join(zip_dir, dst_filename)
-        copy_file(file_path, dst_path, args.verbose)
-        copied_file_paths.append(dst_path)
-
-    # Generate sha1sum.txt
+    # Copy files to the temporary directory, hashing the inputs meanwhile.
+    # The copies are byte-identical to the inputs, whose digests can be cached
     sha1sum_file_path = os.path.join(zip_dir, "sha1sum.txt")
-    with open(sha1sum_file_path, 'w') as f_sha1:
-        for fp in copied_file_paths:
-            sha1_hash = calc_sha1(fp)
-            f_sha1.write(f"{sha1_hash}  {get_fname(fp)}\n")
+    compression = {}
+    stats = StagingStats()
+    with open_cache(args) as cache, Sha1Manifest(cache, sha1sum_file_path, args.jobs) as manifest:
+        for part_name, file_path in partition_map.items():
+            _, ext = os.path.splitext(file_path)
+            dst_filename = part_name.lower() + ext
+            dst_path = os.path.join(zip_dir, dst_filename)
+            manifest.add(file_path, dst_filename)
+            copy_file(file_path, dst_path, args.verbose, stats)
+            if part_name in compress_overrides:
+                compression[dst_filename] = compress_overrides[part_name]
+
+        # Complete sha1sum.txt
+        manifest.finish()
 
+    print(stats.report())
     if args.verbose:
         print(f"Generated sha1sum.txt at {sha1sum_file_path}")
+        if cache.enabled:
+            print(cache.report())
 
     # Create the zip file
-    create_zip(zip_dir, args.output, args.verbose)
+    create_zip(zip_dir, args.output, args.verbose, args.jobs, compression)
 
     # Remove the temporary directory
     if not args.debug:
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+# Copyright (C) 2025, Charleye
+#
+# Persistent file digest cache shared by create_axp.py,
+# create_sdcard_image.py and calculate_hash.py.
+#
+# Digests are stored in a small SQLite database keyed by the file
+# identity (device, inode, size, mtime_ns, ctime_ns) and the algorithm
+# name, so an unchanged multi-GB image is never hashed twice. The ctime
+# catches files rewritten in place with their mtime set back, as
+# reproducible builds do with SOURCE_DATE_EPOCH. Entries are only
+# recorded when the file did not change while it was hashed and neither
+# its mtime nor its ctime is within RACY_WINDOW_NS of the current time,
+# where a later write could keep the same timestamps. The least recently used entries
+# are evicted once the cache holds more than max_entries digests.
+#
+# The default location is $XDG_CACHE_HOME/axp-tools/digests.sqlite,
+# overridden by the AXP_DIGEST_CACHE environment variable.
+#
+# For any questions, please contact: wangkart@aliyun.com
+
+import os
+import time
+import sqlite3
+
+DEFAULT_MAX_ENTRIES = 4096
+RACY_WINDOW_NS = 2 * 1000 * 1000 * 1000
+
+def default_cache_path():
+    path = os.environ.get('AXP_DIGEST_CACHE')
+    if path:
+        return path
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'axp-tools', 'digests.sqlite')
+
+def file_key(st):
+    return (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, st.st_ctime_ns)
+
+class DigestCache:
+    """
+    On-disk cache of file digests.
+
+    Args:
+        path (str): SQLite database file, None for the default location.
+        max_entries (int): Number of digests kept after eviction.
+        enabled (bool): When False every lookup misses and nothing is stored.
+    """
+
+    def __init__(self, path=None, max_entries=DEFAULT_MAX_ENTRIES, enabled=True):
+        self.path = path or default_cache_path()
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._db = None
+        self.enabled = False
+        if not enabled:
+            return
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._db = sqlite3.connect(self.path, timeout=30)
+            columns = [row[1] for row in self._db.execute("PRAGMA table_info(digests)")]
+            if columns and 'ctime_ns' not in columns:
+                # Database of an older version, keyed without the ctime
+                self._db.execute("DROP TABLE digests")
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS digests (
+                    dev INTEGER, ino INTEGER, size INTEGER, mtime_ns INTEGER, ctime_ns INTEGER,
+                    algo TEXT, digest TEXT, last_used INTEGER,
+                    PRIMARY KEY (dev, ino, size, mtime_ns, ctime_ns, algo))""")
+            self.enabled = True
+        except (OSError, sqlite3.Error) as e:
+            print(f"Warning: digest cache {self.path} disabled: {e}")
+            self._db = None
+
+    def lookup(self, file_path, algo):
+        """
+        Return the cached digest of a file, or None on a miss.
+        """
+        if self._db is None:
+            return None
+        key = file_key(os.stat(file_path))
+        try:
+            row = self._db.execute(
+                "SELECT digest FROM digests WHERE dev=? AND ino=? AND size=? AND mtime_ns=? AND ctime_ns=? "
+                "AND algo=?",
+                (*key, algo)).fetchone()
+            if row is not None:
+                self._db.execute(
+                    "UPDATE digests SET last_used=? WHERE dev=? AND ino=? AND size=? AND mtime_ns=? "
+                    "AND ctime_ns=? AND algo=?",
+                    (time.time_ns(), *key, algo))
+                self._db.commit()
+        except sqlite3.Error as e:
+            print(f"Warning: digest cache lookup failed: {e}")
+            row = None
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def store(self, file_path, algo, digest, st):
+        """
+        Record the digest of a file hashed from the state described by st.
+
+        Nothing is stored if the file changed since st was taken or was
+        modified too recently to be trusted.
+        """
+        if self._db is None:
+            return
+        now = time.time_ns()
+        current = os.stat(file_path)
+        if file_key(current) != file_key(st):
+            return
+        if now - max(st.st_mtime_ns, st.st_ctime_ns) < RACY_WINDOW_NS:
+            return
+        try:
+            self._db.execute(
+                "INSERT OR REPLACE INTO digests VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (*file_key(st), algo, digest, now))
+            self._db.commit()
+        except sqlite3.Error as e:
+            print(f"Warning: digest cache update failed: {e}")
+
+    def digest(self, file_path, algo, compute):
+        """
+        Return the digest of a file, computing and caching it on a miss.
+
+        Args:
+            file_path (str): File to hash.
+            algo (str): Algorithm name used in the cache key.
+            compute (callable): compute(file_path) returning the digest string.
+        """
+        cached = self.lookup(file_path, algo)
+        if cached is not None:
+            return cached
+        st = os.stat(file_path)
+        value = compute(file_path)
+        if value is not None:
+            self.store(file_path, algo, value, st)
+        return value
+
+    def close(self):
+        if self._db is None:
+            return
+        try:
+            self._db.execute(
+                "DELETE FROM digests WHERE rowid NOT IN "
+                "(SELECT rowid FROM digests ORDER BY last_used DESC LIMIT ?)",
+                (self.max_entries,))
+            self._db.commit()
+        except sqlite3.Error as e:
+            print(f"Warning: digest cache eviction failed: {e}")
+        finally:
+            self._db.close()
+            self._db = None
+
+    def report(self):
+        return f"Digest cache: {self.hits} hits, {self.misses} misses"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def add_cache_arguments(parser):
+    """Add the --digest-cache/--no-digest-cache options to a parser."""
+    parser.add_argument('--digest-cache', default=None, metavar='PATH',
+                        help=f'Digest cache database (default: {default_cache_path()})')
+    parser.add_argument('--no-digest-cache', action='store_true', default=False,
+                        help='Do not read or update the digest cache')
+
+def open_cache(args):
+    return DigestCache(args.digest_cache, enabled=not args.no_digest_cache)
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+#
+# SPDX-License-Identifier: GPL-2.0+
+#
+# Copyright (C) 2025, Charleye <wangkart@aliyun.com>
+#
+# Raw GPT disk image writer used by create_sdcard_image.py.
+#
+# The partitions of partitions.json are laid out back to back, in JSON
+# order, from a start offset (1 MiB by default), the same way the device
+# partition table of create_partition_image.py is built. The image is
+# created as a sparse file: only the GPT and the non-zero blocks of the
+# partition images are written with os.pwrite(), everything else stays a
+# hole, so the image costs the bytes actually written and can be flashed
+# with dd or bmaptool without loop devices or root.
+#
+
+import os
+import json
+import uuid
+import zlib
+import struct
+
+SECTOR_SIZE = 512
+GPT_ENTRIES = 128
+GPT_ENTRY_SIZE = 128
+# Sectors taken by one copy of the partition entry array
+GPT_ENTRY_SECTORS = GPT_ENTRIES * GPT_ENTRY_SIZE // SECTOR_SIZE
+GPT_HEADER_SIZE = 92
+GPT_REVISION = 0x00010000
+
+# Linux filesystem data
+LINUX_DATA_GUID = uuid.UUID('0fc63daf-8483-4772-8e79-3d69d8477de4')
+# Namespace of the disk and partition GUIDs, derived from the layout so
+# that the same inputs always produce the same image
+GUID_NAMESPACE = uuid.UUID('6e1c5e2a-4f0b-4c2e-9a51-6a78c7d3a4b1')
+
+# GPT partition attribute bits
+ATTR_LEGACY_BIOS_BOOTABLE = 1 << 2
+ATTR_READ_ONLY = 1 << 60
+
+# Dummy partitions naming the boot device, not laid out
+DEVICE_NAMES = {"emmc", "nand", "nor", "hyper"}
+
+UNIT_SIZES = {
+    "1M": 1024 * 1024,
+    "512K": 512 * 1024,
+    "1K": 1024,
+    "1": 1,
+    "1Sector": 512
+}
+
+DEFAULT_START = 1024 * 1024
+DEFAULT_ALIGNMENT = 1024 * 1024
+IO_BLOCK_SIZE = 4 * 1024 * 1024
+HOLE_BLOCK_SIZE = 64 * 1024
+ZERO_BLOCK = bytes(HOLE_BLOCK_SIZE)
+
+def parse_json_size(size_str):
+    if isinstance(size_str, str) and size_str.startswith('0x'):
+        return int(size_str, 16)
+    return int(size_str)
+
+def load_partition_layout(json_path, start=DEFAULT_START):
+    """
+    Compute the offset of every partition of a partitions.json file.
+
+    Args:
+        json_path (str): partitions.json file.
+        start (int): Offset of the first partition, a multiple of SECTOR_SIZE.
+
+    Returns:
+        list: dicts with name, offset, size (bytes) and attrs, in JSON order.
+        Dummy device entries and empty partitions are left out.
+
+    Raises:
+        ValueError: If the file is not a valid partitions.json.
+    """
+    if start % SECTOR_SIZE or start < (2 + GPT_ENTRY_SECTORS) * SECTOR_SIZE:
+        raise ValueError(f"The partition start {start} must be a multiple of {SECTOR_SIZE} "
+                         f"after the primary GPT ({(2 + GPT_ENTRY_SECTORS) * SECTOR_SIZE} bytes).")
+    try:
+        with open(json_path, 'r') as f:
+            data = json.load(f)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid JSON file: {e}")
+
+    json_partitions = next((item['partitions'] for item in data if 'partitions' in item), None)
+    if json_partitions is None:
+        raise ValueError("The JSON file does not contain 'partitions' field.")
+    json_unit = next((item.get('unit') for item in data if 'unit' in item), None)
+    if json_unit not in UNIT_SIZES:
+        raise ValueError(f"Unsupported 'unit' field: {json_unit}. Allowed values are {', '.join(UNIT_SIZES)}.")
+
+    layout = []
+    offset = start
+    for partition in json_partitions:
+        name = partition['name']
+        size = parse_json_size(partition['size']) * UNIT_SIZES[json_unit]
+        if name.lower() in DEVICE_NAMES or size == 0:
+            continue
+        if size % SECTOR_SIZE:
+            raise ValueError(f"Partition {name} size {size} is not a multiple of {SECTOR_SIZE}.")
+        layout.append({'name': name, 'offset': offset, 'size': size, 'attrs': partition.get('attrs', '')})
+        offset += size
+    if not layout:
+        raise ValueError("The JSON file does not define any partition.")
+    return layout
+
+def disk_size_for(layout, alignment=DEFAULT_ALIGNMENT):
+    """Return the smallest aligned disk size holding the layout and the backup GPT."""
+    end = max(part['offset'] + part['size'] for part in layout)
+    end += (GPT_ENTRY_SECTORS + 1) * SECTOR_SIZE
+    return -(-end // alignment) * alignment
+
+def gpt_entries(layout, disk_guid):
+    """Return the packed partition entry array of a layout."""
+    entries = bytearray(GPT_ENTRIES * GPT_ENTRY_SIZE)
+    for index, part in enumerate(layout):
+        attrs = 0
+        if 'bootable' in part['attrs']:
+            attrs |= ATTR_LEGACY_BIOS_BOOTABLE
+        if 'ro' in part['attrs'].split(','):
+            attrs |= ATTR_READ_ONLY
+        part_guid = uuid.uuid5(disk_guid, f"{index}:{part['name']}")
+        struct.pack_into('<16s16sQQQ72s', entries, index * GPT_ENTRY_SIZE,
+                         LINUX_DATA_GUID.bytes_le, part_guid.bytes_le,
+                         part['offset'] // SECTOR_SIZE,
+                         (part['offset'] + part['size']) // SECTOR_SIZE - 1,
+                         attrs, part['name'].encode('utf-16-le')[:72])
+    return bytes(entries)
+
+def gpt_header(current_lba, backup_lba, entries_lba, last_lba, disk_guid, entries_crc):
+    header = struct.pack('<8sIIIIQQQQ16sQIII', b'EFI PART', GPT_REVISION, GPT_HEADER_SIZE, 0, 0,
+                         current_lba, backup_lba, 2 + GPT_ENTRY_SECTORS,
+                         last_lba - 1 - GPT_ENTRY_SECTORS, disk_guid.bytes_le,
+                         entries_lba, GPT_ENTRIES, GPT_ENTRY_SIZE, entries_crc)
+    crc = zlib.crc32(header)
+    return header[:16] + struct.pack('<I', crc) + header[20:]
+
+def protective_mbr(disk_lbas):
+    mbr = bytearray(SECTOR_SIZE)
+    # One partition of type 0xEE covering the disk after the MBR
+    struct.pack_into('<B3sB3sII', mbr, 446, 0, b'\x00\x02\x00', 0xEE, b'\xff\xff\xff',
+                     1, min(disk_lbas - 1, 0xFFFFFFFF))
+    mbr[510:512] = b'\x55\xaa'
+    return bytes(mbr)
+
+def write_gpt(fd, layout, disk_size):
+    """
+    Write the protective MBR and the primary and backup GPT.
+
+    Returns:
+        int: Number of bytes written.
+    """
+    disk_lbas = disk_size // SECTOR_SIZE
+    last_lba = disk_lbas - 1
+    disk_guid = uuid.uuid5(GUID_NAMESPACE, ','.join(f"{p['name']}@{p['offset']}+{p['size']}" for p in layout))
+    entries = gpt_entries(layout, disk_guid)
+    entries_crc = zlib.crc32(entries)
+    backup_entries_lba = last_lba - GPT_ENTRY_SECTORS
+
+    writes = [
+        (0, protective_mbr(disk_lbas)),
+        (SECTOR_SIZE, gpt_header(1, last_lba, 2, last_lba, disk_guid, entries_crc)),
+        (2 * SECTOR_SIZE, entries),
+        (backup_entries_lba * SECTOR_SIZE, entries),
+        (last_lba * SECTOR_SIZE, gpt_header(last_lba, 1, backup_entries_lba, last_lba, disk_guid, entries_crc)),
+    ]
+    for offset, data in writes:
+        os.pwrite(fd, data, offset)
+    return sum(len(data) for _, data in writes)
+
+def write_partition(fd, offset, file_path):
+    """
+    Write a partition image at offset, skipping all-zero blocks.
+
+    Returns:
+        int: Number of bytes written.
+    """
+    written = 0
+    with open(file_path, 'rb', buffering=0) as src:
+        position = offset
+        while True:
+            block = src.read(IO_BLOCK_SIZE)
+            if not block:
+                break
+            view = memoryview(block)
+            run_start = None
+            for start in range(0, len(view), HOLE_BLOCK_SIZE):
+                piece = view[start:start + HOLE_BLOCK_SIZE]
+                if piece == ZERO_BLOCK[:len(piece)]:
+                    if run_start is not None:
+                        written += os.pwrite(fd, view[run_start:start], position + run_start)
+                        run_start = None
+                elif run_start is None:
+                    run_start = start
+            if run_start is not None:
+                written += os.pwrite(fd, view[run_start:], position + run_start)
+            position += len(block)
+    return written
+
+def write_disk_image(image_path, layout, partition_map, disk_size=None, verbose=False):
+    """
+    Create a sparse GPT disk image holding partition images.
+
+    Args:
+        image_path (str): Output image, replaced atomically.
+        layout (list): Partition layout from load_partition_layout().
+        partition_map (dict): Partition name (case insensitive) -> image file.
+        disk_size (int): Image size, the smallest fitting 1 MiB multiple if None.
+        verbose (bool): Print the partitions written.
+
+    Returns:
+        dict: disk_size and written bytes.
+
+    Raises:
+        ValueError: If a partition is unknown or an image does not fit.
+    """
+    parts = {part['name'].lower(): part for part in layout}
+    for part_name, file_path in partition_map.items():
+        part = parts.get(part_name.lower())
+        if part is None:
+            raise ValueError(f"Partition {part_name} is not defined in the partition layout.")
+        if os.path.getsize(file_path) > part['size']:
+            raise ValueError(f"Image {file_path} ({os.path.getsize(file_path)} bytes) does not fit "
+                             f"partition {part['name']} ({part['size']} bytes).")
+    minimum_size = disk_size_for(layout, SECTOR_SIZE)
+    if disk_size is None:
+        disk_size = disk_size_for(layout)
+    elif disk_size % SECTOR_SIZE or disk_size < minimum_size:
+        raise ValueError(f"Disk size {disk_size} must be a multiple of {SECTOR_SIZE} "
+                         f"and at least {minimum_size} bytes.")
+
+    tmp_path = image_path + '.tmp'
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        os.ftruncate(fd, disk_size)
+        written = write_gpt(fd, layout, disk_size)
+        for part_name, file_path in partition_map.items():
+            part = parts[part_name.lower()]
+            if verbose:
+                print(f"Writing {file_path} to partition {part['name']} at offset {part['offset']:#x}")
+            written += write_partition(fd, part['offset'], file_path)
+        os.fsync(fd)
+    except BaseException:
+        os.close(fd)
+        os.remove(tmp_path)
+        raise
+    os.close(fd)
+    os.replace(tmp_path, image_path)
+    return {'disk_size': disk_size, 'written': written}
@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+# Copyright (C) 2025, Charleye
+#
+# zipfile.ZipFile with a multi-core DEFLATE backend, shared by
+# create_axp.py and create_sdcard_image.py.
+#
+# Each deflated member is split into fixed-size blocks which are
+# compressed in a process pool. Every block but the last ends with a
+# sync flush, so the pieces concatenate into one ordinary deflate
+# stream (the same technique pigz uses). Each block is primed with the
+# last 32 KiB of its predecessor to keep the ratio close to a single
+# stream. The archive itself is written by the standard zipfile module
+# and can be read by any unzip implementation.
+#
+# Stored members can be aligned to a page boundary with a zipalign-style
+# padding field, so axp_reader.py can map them without extracting.
+#
+# write_raw() copies an already compressed member out of another
+# archive byte for byte, which lets create_axp.py update an AXP without
+# recompressing unchanged images.
+#
+# choose_compression() samples the start, middle and end of an input
+# and stores members that do not shrink (squashfs, gzip/lz4 payloads,
+# encrypted images) instead of burning CPU on them.
+#
+# default_jobs() and parse_size() are the command line helpers shared
+# by the other scripts.
+#
+# For any questions, please contact: wangkart@aliyun.com
+
+import os
+import zlib
+import struct
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+DEFAULT_BLOCK_SIZE = 1024 * 1024
+DEFLATE_WINDOW = 32 * 1024
+COPY_BLOCK_SIZE = 10 * 1024 * 1024
+
+LOCAL_HEADER_FORMAT = '<4s2B4HL2L2H'
+LOCAL_HEADER_SIZE = struct.calcsize(LOCAL_HEADER_FORMAT)
+LOCAL_HEADER_MAGIC = b'PK\003\004'
+ZIP64_EXTRA_ID = 0x0001
+ZIP64_LOCAL_EXTRA_SIZE = 20
+# Padding field written by Android's zipalign: alignment, then zero bytes
+ALIGNMENT_EXTRA_ID = 0xD935
+ALIGNMENT_EXTRA_SIZE = 6
+
+SAMPLE_SIZE = 256 * 1024
+# Sampled compressed/original ratio above which a member is stored,
+# and above which the fastest deflate level is good enough
+STORED_RATIO = 0.95
+FAST_RATIO = 0.80
+
+COMPRESSION_MODES = ['auto', 'stored', 'deflated'] + [str(level) for level in range(10)]
+
+def default_jobs():
+    return os.cpu_count() or 1
+
+def parse_size(value):
+    """
+    Return a size in bytes given as a number or a string with an optional
+    K, M or G suffix, e.g. 64M.
+
+    Raises:
+        ValueError: If the value is not a positive size.
+    """
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+    if isinstance(value, (int, float)):
+        size = int(value)
+    else:
+        text = value.strip().upper()
+        if text and text[-1] in units:
+            size = int(float(text[:-1]) * units[text[-1]])
+        else:
+            size = int(text)
+    if size <= 0:
+        raise ValueError(f"size must be positive: {value}")
+    return size
+
+def deflate_block(block, zdict, level, final):
+    """
+    Compress one block into a raw deflate fragment.
+
+    Args:
+        block (bytes): Uncompressed data.
+        zdict (bytes): Preceding data used as the dictionary, may be empty.
+        level (int): zlib compression level.
+        final (bool): Terminate the deflate stream after this block.
+
+    Returns:
+        bytes: Raw deflate data, byte aligned.
+    """
+    if zdict:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15, zdict=zdict)
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    data = compressor.compress(block)
+    return data + compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+def sample_compress_ratio(file_path, sample_size=SAMPLE_SIZE):
+    """
+    Estimate how well a file deflates from its first, middle and last blocks.
+
+    Args:
+        file_path (str): File to sample.
+        sample_size (int): Bytes read at each of the three positions.
+
+    Returns:
+        float: Compressed size divided by sampled size (1.0 for empty files).
+    """
+    file_size = os.path.getsize(file_path)
+    if file_size <= 3 * sample_size:
+        offsets = [(0, file_size)]
+    else:
+        offsets = [(0, sample_size),
+                   ((file_size - sample_size) // 2, sample_size),
+                   (file_size - sample_size, sample_size)]
+
+    sampled = compressed = 0
+    with open(file_path, 'rb') as f:
+        for offset, size in offsets:
+            f.seek(offset)
+            data = f.read(size)
+            sampled += len(data)
+            compressed += len(zlib.compress(data, 1))
+    return compressed / sampled if sampled else 1.0
+
+def choose_compression(file_path, mode='auto', level=None):
+    """
+    Choose the ZIP compression method and level of a member.
+
+    Args:
+        file_path (str): Input file of the member.
+        mode (str): 'auto', 'stored', 'deflated' or a level from '0' to '9'.
+        level (int): Deflate level used when sampling finds the data compressible.
+
+    Returns:
+        tuple: (compress_type, compresslevel, reason)
+    """
+    if mode == 'stored' or mode == '0':
+        return zipfile.ZIP_STORED, None, 'override'
+    if mode == 'deflated':
+        return zipfile.ZIP_DEFLATED, level, 'override'
+    if mode != 'auto':
+        return zipfile.ZIP_DEFLATED, int(mode), 'override'
+
+    ratio = sample_compress_ratio(file_path)
+    if ratio >= STORED_RATIO:
+        return zipfile.ZIP_STORED, None, f'sampled ratio {ratio:.2f}'
+    if ratio >= FAST_RATIO:
+        return zipfile.ZIP_DEFLATED, 1, f'sampled ratio {ratio:.2f}'
+    return zipfile.ZIP_DEFLATED, level, f'sampled ratio {ratio:.2f}'
+
+def describe_compression(compress_type, level):
+    if compress_type == zipfile.ZIP_STORED:
+        return 'stored'
+    return 'deflated' if level is None else f'deflated level {level}'
+
+def parse_compression_overrides(items):
+    """
+    Parse NAME=MODE compression overrides.
+
+    Raises:
+        ValueError: On malformed items, unknown modes or duplicate names.
+    """
+    overrides = {}
+    for item in items or []:
+        if '=' not in item:
+            raise ValueError(f"Invalid compression format: {item}. Expected format NAME=MODE")
+        name, mode = item.split('=', 1)
+        if mode not in COMPRESSION_MODES:
+            raise ValueError(f"Invalid compression mode '{mode}' for {name}. "
+                             f"Allowed values are {', '.join(COMPRESSION_MODES)}.")
+        if name in overrides:
+            raise ValueError(f"Duplicate compression override for {name}")
+        overrides[name] = mode
+    return overrides
+
+def member_info(file_path, arcname, compress_type, level=None):
+    """
+    Build the ZipInfo of a member written through FastZipFile.open().
+
+    Returns:
+        zipfile.ZipInfo: Entry carrying the file metadata and compression.
+    """
+    zinfo = zipfile.ZipInfo.from_file(file_path, arcname)
+    zinfo.compress_type = compress_type
+    # Honoured by ZipFile.open(); public as compress_level since Python 3.13
+    zinfo._compresslevel = level
+    return zinfo
+
+def copy_file_data(src, src_offset, dst, length):
+    """
+    Copy a byte range of src to the current position of dst.
+
+    os.copy_file_range() is used when available, letting the kernel (or
+    a reflink-capable filesystem) move the data without a round trip
+    through user space. Otherwise the range is copied in large blocks.
+
+    Args:
+        src (file): Source file opened in binary mode.
+        src_offset (int): Offset of the range in src.
+        dst (file): Destination file opened in binary mode.
+        length (int): Number of bytes to copy.
+    """
+    dst.flush()
+    dst_offset = dst.tell()
+    copied = 0
+    if hasattr(os, 'copy_file_range'):
+        try:
+            while copied < length:
+                count = os.copy_file_range(src.fileno(), dst.fileno(), length - copied,
+                                           src_offset + copied, dst_offset + copied)
+                if count == 0:
+                    break
+                copied += count
+        except OSError:
+            pass
+    src.seek(src_offset + copied)
+    dst.seek(dst_offset + copied)
+    while copied < length:
+        block = src.read(min(COPY_BLOCK_SIZE, length - copied))
+        if not block:
+            raise EOFError(f"Unexpected end of file while copying {length} bytes")
+        dst.write(block)
+        copied += len(block)
+
+def member_data_offset(fp, zinfo):
+    """
+    Return the offset of the (compressed) data of a member in its archive.
+
+    Args:
+        fp (file): Archive opened in binary mode.
+        zinfo (zipfile.ZipInfo): Member read from the central directory.
+    """
+    fp.seek(zinfo.header_offset)
+    header = fp.read(LOCAL_HEADER_SIZE)
+    fields = struct.unpack(LOCAL_HEADER_FORMAT, header)
+    if fields[0] != LOCAL_HEADER_MAGIC:
+        raise zipfile.BadZipFile(f"Bad local file header for {zinfo.filename}")
+    name_len, extra_len = fields[-2], fields[-1]
+    return zinfo.header_offset + LOCAL_HEADER_SIZE + name_len + extra_len
+
+def strip_extra_fields(extra, field_ids):
+    """Remove the given fields from an extra block, they are rebuilt on write."""
+    result = b''
+    while len(extra) >= 4:
+        field_id, size = struct.unpack('<HH', extra[:4])
+        if field_id not in field_ids:
+            result += extra[:4 + size]
+        extra = extra[4 + size:]
+    return result
+
+def alignment_extra(zinfo, header_offset, zip64, alignment):
+    """
+    Return the extra block of a member with a padding field that makes
+    its data start at a multiple of alignment.
+
+    Args:
+        zinfo (zipfile.ZipInfo): Member about to be written.
+        header_offset (int): Offset of its local file header.
+        zip64 (bool): Whether the local header gets a ZIP64 field.
+        alignment (int): Required data alignment in bytes.
+    """
+    extra = strip_extra_fields(zinfo.extra, (ALIGNMENT_EXTRA_ID,))
+    filename, _ = zinfo._encodeFilenameFlags()
+    data_offset = (header_offset + LOCAL_HEADER_SIZE + len(filename) +
+                   len(extra) + ALIGNMENT_EXTRA_SIZE)
+    if zip64:
+        data_offset += ZIP64_LOCAL_EXTRA_SIZE
+    padding = -data_offset % alignment
+    return extra + struct.pack('<HHH', ALIGNMENT_EXTRA_ID, 2 + padding, alignment) + bytes(padding)
+
+class ParallelDeflater:
+    """
+    zlib.compressobj() look-alike producing raw deflate data in parallel.
+
+    The output only depends on the data, level and block size, never on
+    the number of workers, so builds stay reproducible.
+    """
+
+    def __init__(self, executor, jobs, level=zlib.Z_DEFAULT_COMPRESSION,
+                 block_size=DEFAULT_BLOCK_SIZE):
+        self._executor = executor
+        self._level = level
+        self._block_size = block_size
+        self._max_pending = 2 * jobs
+        self._buffer = bytearray()
+        self._zdict = b''
+        self._futures = deque()
+
+    def _submit(self, block, final):
+        self._futures.append(
+            self._executor.submit(deflate_block, block, self._zdict, self._level, final))
+        self._zdict = block[-DEFLATE_WINDOW:]
+
+    def _collect(self, wait_all=False):
+        output = []
+        while self._futures:
+            if not (wait_all or len(self._futures) > self._max_pending or self._futures[0].done()):
+                break
+            output.append(self._futures.popleft().result())
+        return b''.join(output)
+
+    def compress(self, data):
+        self._buffer += data
+        # Keep the last full block back so flush() never emits an empty one
+        while len(self._buffer) > self._block_size:
+            block = bytes(self._buffer[:self._block_size])
+            del self._buffer[:self._block_size]
+            self._submit(block, False)
+        return self._collect()
+
+    def flush(self):
+        self._submit(bytes(self._buffer), True)
+        self._buffer = bytearray()
+        return self._collect(wait_all=True)
+
+class FastZipFile(zipfile.ZipFile):
+    """
+    ZipFile whose deflated members are compressed by a process pool.
+
+    With jobs=1 it behaves exactly like zipfile.ZipFile. Members added
+    through write(), writestr() or open(..., 'w') all use the parallel
+    backend.
+
+    With align set, the data of every stored member added from a ZipInfo
+    starts at a multiple of align bytes (like zipalign), so it can be
+    mapped straight out of the archive.
+    """
+
+    def __init__(self, file, mode='r', compression=zipfile.ZIP_STORED, allowZip64=True,
+                 compresslevel=None, jobs=1, block_size=DEFAULT_BLOCK_SIZE, align=0, **kwargs):
+        super().__init__(file, mode, compression, allowZip64, compresslevel, **kwargs)
+        self.jobs = max(1, jobs)
+        self.block_size = block_size
+        self.align = align
+        self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.jobs)
+        return self._executor
+
+    def open(self, name, mode='r', pwd=None, **kwargs):
+        if (mode == 'w' and self.align and isinstance(name, zipfile.ZipInfo) and
+                name.compress_type == zipfile.ZIP_STORED):
+            # Same decision as ZipFile._open_to_write()
+            zip64 = kwargs.get('force_zip64', False) or name.file_size * 1.05 > zipfile.ZIP64_LIMIT
+            offset = self.start_dir if self._seekable else self.fp.tell()
+            name.extra = alignment_extra(name, offset, zip64, self.align)
+        fp = super().open(name, mode, pwd, **kwargs)
+        if mode == 'w' and self.jobs > 1 and fp._zinfo.compress_type == zipfile.ZIP_DEFLATED:
+            # zipfile has no hook for custom compressors; _ZipWriteFile
+            # only calls compress()/flush() on this attribute.
+            level = getattr(fp._zinfo, 'compress_level', getattr(fp._zinfo, '_compresslevel', None))
+            if level is None:
+                level = zlib.Z_DEFAULT_COMPRESSION
+            fp._compressor = ParallelDeflater(self._get_executor(), self.jobs, level, self.block_size)
+        return fp
+
+    def write_raw(self, zinfo, src, data_offset, arcname=None):
+        """
+        Copy a member of another archive without recompressing it.
+
+        Args:
+            zinfo (zipfile.ZipInfo): Member as read from the source archive.
+            src (file): Source archive opened in binary mode.
+            data_offset (int): Offset of the member data, see member_data_offset().
+            arcname (str): New member name, defaults to the original one.
+
+        Returns:
+            zipfile.ZipInfo: The entry added to this archive.
+        """
+        member = zipfile.ZipInfo(arcname or zinfo.filename, zinfo.date_time)
+        member.compress_type = zinfo.compress_type
+        member.CRC = zinfo.CRC
+        member.compress_size = zinfo.compress_size
+        member.file_size = zinfo.file_size
+        member.external_attr = zinfo.external_attr
+        member.create_system = zinfo.create_system
+        member.extra = strip_extra_fields(zinfo.extra, (ZIP64_EXTRA_ID, ALIGNMENT_EXTRA_ID))
+        zip64 = (member.file_size > zipfile.ZIP64_LIMIT or
+                 member.compress_size > zipfile.ZIP64_LIMIT)
+
+        with self._lock:
+            if self._writing:
+                raise ValueError("Can't write to the ZIP file while there is "
+                                 "another write handle open on it.")
+            self.fp.seek(self.start_dir)
+            member.header_offset = self.fp.tell()
+            if self.align and member.compress_type == zipfile.ZIP_STORED:
+                member.extra = alignment_extra(member, member.header_offset, zip64, self.align)
+            self.fp.write(member.FileHeader(zip64))
+            copy_file_data(src, data_offset, self.fp, member.compress_size)
+            self.start_dir = self.fp.tell()
+            self.filelist.append(member)
+            self.NameToInfo[member.filename] = member
+            self._didModify = True
+        return member
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+# Copyright (C) 2025, Charleye
+#
+# Staging copies for create_axp.py and create_sdcard_image.py.
+#
+# stage_file() tries the cheapest way to make dst hold the content of src:
+#   reflink          FICLONE ioctl, shares the extents (btrfs, XFS, ...)
+#   copy_file_range  Kernel side copy, no round trip through user space
+#   hardlink         Same inode as the input, dst must be treated read-only
+#   copy             Buffered copy through user space
+# and reports the strategy used with the number of bytes it moved.
+#
+# For any questions, please contact: wangkart@aliyun.com
+
+import os
+import shutil
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# _IOW(0x94, 9, int) from linux/fs.h
+FICLONE = 0x40049409
+STRATEGIES = ('reflink', 'copy_file_range', 'hardlink', 'copy')
+COPY_BLOCK_SIZE = 8 * 1024 * 1024
+
+def _reflink(fsrc, fdst):
+    if fcntl is None:
+        return False
+    try:
+        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        return True
+    except OSError:
+        return False
+
+def _copy_file_range(fsrc, fdst, size):
+    """Return the number of bytes copied by the kernel, up to size."""
+    if not hasattr(os, 'copy_file_range'):
+        return 0
+    copied = 0
+    try:
+        while copied < size:
+            count = os.copy_file_range(fsrc.fileno(), fdst.fileno(), size - copied, copied, copied)
+            if count == 0:
+                break
+            copied += count
+    except OSError:
+        pass
+    return copied
+
+def _buffered_copy(fsrc, fdst, offset):
+    """Copy src to dst from offset on, return the number of bytes copied."""
+    fsrc.seek(offset)
+    fdst.seek(offset)
+    copied = 0
+    while True:
+        block = fsrc.read(COPY_BLOCK_SIZE)
+        if not block:
+            return copied
+        fdst.write(block)
+        copied += len(block)
+
+def stage_file(src, dst):
+    """
+    Make dst a copy of the regular file src.
+
+    Returns:
+        tuple: (strategy, bytes moved). reflink and hardlink move no data,
+        copy_file_range moves the bytes in the kernel and copy through
+        user space. A copy_file_range interrupted part way is finished with
+        a buffered copy and reported as such.
+    """
+    size = os.path.getsize(src)
+    with open(src, 'rb') as fsrc:
+        with open(dst, 'wb') as fdst:
+            if _reflink(fsrc, fdst):
+                strategy, moved = 'reflink', 0
+            else:
+                moved = _copy_file_range(fsrc, fdst, size)
+                strategy = 'copy_file_range' if moved == size else None
+                if moved and moved < size:
+                    moved += _buffered_copy(fsrc, fdst, moved)
+                    strategy = 'copy'
+        if strategy is None:
+            os.remove(dst)
+            try:
+                os.link(src, dst)
+                return 'hardlink', 0
+            except OSError:
+                pass
+            with open(dst, 'wb') as fdst:
+                strategy, moved = 'copy', _buffered_copy(fsrc, fdst, 0)
+    shutil.copymode(src, dst)
+    return strategy, moved
+
+class StagingStats:
+    """Files and bytes moved per staging strategy."""
+
+    def __init__(self):
+        self.files = dict.fromkeys(STRATEGIES, 0)
+        self.moved = dict.fromkeys(STRATEGIES, 0)
+
+    def stage(self, src, dst):
+        """stage_file() recording the result, usable as a copytree() copy_function."""
+        strategy, moved = stage_file(src, dst)
+        self.files[strategy] += 1
+        self.moved[strategy] += moved
+        return strategy, moved
+
+    def report(self):
+        used = [f"{self.files[s]} {s}" for s in STRATEGIES if self.files[s]]
+        return (f"Staging: {', '.join(used) or 'no files'}; "
+                f"{sum(self.moved.values())} bytes moved")
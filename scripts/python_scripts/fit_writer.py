@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+#
+# SPDX-License-Identifier: GPL-2.0+
+#
+# Copyright (C) 2025 Charleye <wangkart@aliyun.com>
+#
+# Native FIT (.itb) writer for generate_its.py.
+#
+# write_fit() turns a tree of FdtNode objects into a flattened device
+# tree (version 17) without going through dtc and mkimage. Payloads are
+# given as FitPayload properties and streamed from their files straight
+# into the output, hashed on the way, so each payload is read once; the
+# hash-N subnodes of an image get their value property filled in as
+# mkimage does. Two layouts are supported:
+#   embedded   payloads are the data properties of their image nodes
+#   external   mkimage -E: payloads follow the FDT, aligned to align
+#              bytes (mkimage -B), and are referenced by data-offset and
+#              data-size, or by data-position when a position is given
+#              (mkimage -p)
+# Signing and encryption are left to mkimage, e.g.
+#   mkimage -F -k keys -r kernel.itb
+#
+
+import os
+import time
+import zlib
+import functools
+import struct
+import hashlib
+
+FDT_MAGIC = 0xd00dfeed
+FDT_BEGIN_NODE = 1
+FDT_END_NODE = 2
+FDT_PROP = 3
+FDT_NOP = 4
+FDT_END = 9
+FDT_VERSION = 17
+FDT_LAST_COMP_VERSION = 16
+FDT_HEADER_SIZE = 40
+# Empty memory reservation map, a single terminating entry
+FDT_RSVMAP = bytes(16)
+FDT_STRUCT_OFFSET = FDT_HEADER_SIZE + len(FDT_RSVMAP)
+DEFAULT_ALIGN = 4
+COPY_BLOCK_SIZE = 4 * 1024 * 1024
+
+class FdtNode:
+    """
+    A device tree node.
+
+    Property values are encoded by type:
+        str             NUL terminated string
+        list of str     string list
+        int, tuple      32-bit big-endian cells
+        bytes           raw bytes
+        FitPayload      the content of a file
+    """
+
+    def __init__(self, name, props=None, nodes=None):
+        self.name = name
+        self.props = dict(props or {})
+        self.nodes = list(nodes or [])
+
+    def add_node(self, node):
+        self.nodes.append(node)
+        return node
+
+    def node(self, name):
+        for node in self.nodes:
+            if node.name == name:
+                return node
+        return None
+
+class FitPayload:
+    """Data property read from a file when the FIT is written."""
+
+    def __init__(self, path):
+        self.path = path
+
+    @functools.cached_property
+    def size(self):
+        return os.path.getsize(self.path)
+
+class _Crc32:
+    digest_size = 4
+
+    def __init__(self):
+        self.crc = 0
+
+    def update(self, data):
+        self.crc = zlib.crc32(data, self.crc)
+
+    def digest(self):
+        return struct.pack('>I', self.crc)
+
+def new_hash(algo):
+    """Return a hash object for a FIT hash node algo, None if unsupported."""
+    if algo == 'crc32':
+        return _Crc32()
+    if algo in ('md5', 'sha1', 'sha256', 'sha384', 'sha512'):
+        return hashlib.new(algo)
+    return None
+
+class _Digest:
+    """Hash value property, known once its payload has been streamed."""
+
+    def __init__(self, payload, algo):
+        self.payload = payload
+        self.algo = algo
+        self.size = new_hash(algo).digest_size
+
+def align_up(value, align):
+    return (value + align - 1) // align * align
+
+def encode_value(value):
+    if isinstance(value, bytes):
+        return value
+    if isinstance(value, str):
+        return value.encode() + b'\0'
+    if isinstance(value, int):
+        return struct.pack('>I', value)
+    if isinstance(value, tuple):
+        return struct.pack(f'>{len(value)}I', *value)
+    if isinstance(value, list):
+        return b''.join(s.encode() + b'\0' for s in value)
+    raise TypeError(f"Unsupported property value: {value!r}")
+
+class _StructBlock:
+    """
+    Structure and strings blocks. Payloads and digests are kept as
+    placeholders with their offset in the structure block.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+        self.strings = bytearray()
+        self._string_offsets = {}
+
+    def _append(self, chunk, size):
+        self.chunks.append((self.size, chunk))
+        self.size += size
+
+    def _pad(self):
+        if self.size % 4:
+            self._append(bytes(4 - self.size % 4), 4 - self.size % 4)
+
+    def _name_offset(self, name):
+        if name not in self._string_offsets:
+            self._string_offsets[name] = len(self.strings)
+            self.strings += name.encode() + b'\0'
+        return self._string_offsets[name]
+
+    def add_node(self, node):
+        name = node.name.encode() + b'\0'
+        self._append(struct.pack('>I', FDT_BEGIN_NODE) + name, 4 + len(name))
+        self._pad()
+        for name, value in node.props.items():
+            size = value.size if isinstance(value, (FitPayload, _Digest)) else None
+            if size is None:
+                value = encode_value(value)
+                size = len(value)
+            self._append(struct.pack('>III', FDT_PROP, size, self._name_offset(name)), 12)
+            self._append(value, size)
+            self._pad()
+        for child in node.nodes:
+            self.add_node(child)
+        self._append(struct.pack('>I', FDT_END_NODE), 4)
+
+    def finish(self):
+        self._append(struct.pack('>I', FDT_END), 4)
+
+def _prepare(node, external, align, position, layout, in_images=False):
+    """
+    Copy the tree, adding hash values and moving payloads out of the
+    tree for the external layout. layout collects the external payloads
+    as (payload, offset from the first one).
+    """
+    props = dict(node.props)
+    data = props.get('data')
+    payload = data if in_images and isinstance(data, FitPayload) else None
+    nodes = []
+    for child in node.nodes:
+        child = _prepare(child, external, align, position, layout, node.name == 'images' and not in_images)
+        if payload and child.name.startswith('hash') and 'value' not in child.props:
+            algo = child.props.get('algo')
+            if new_hash(algo) is None:
+                raise ValueError(f"{node.name}: unsupported hash algo {algo!r}")
+            child.props['value'] = _Digest(payload, algo)
+        nodes.append(child)
+    if payload and external:
+        offset = sum(align_up(p.size, align) for p, _ in layout)
+        layout.append((payload, offset))
+        del props['data']
+        props['data-size'] = payload.size
+        if position is None:
+            props['data-offset'] = offset
+        else:
+            props['data-position'] = position + offset
+    return FdtNode(node.name, props, nodes)
+
+def _stream_payload(out, payload, offset, algos):
+    hashes = {algo: new_hash(algo) for algo in algos}
+    out.seek(offset)
+    with open(payload.path, 'rb') as f:
+        size = 0
+        while True:
+            block = f.read(COPY_BLOCK_SIZE)
+            if not block:
+                break
+            for h in hashes.values():
+                h.update(block)
+            out.write(block)
+            size += len(block)
+    if size != payload.size:
+        raise OSError(f"{payload.path} changed while writing the FIT")
+    return {algo: h.digest() for algo, h in hashes.items()}
+
+def write_fit(root, output_path, external=False, align=DEFAULT_ALIGN, position=None, timestamp=None):
+    """
+    Write a FIT image.
+
+    Args:
+        root (FdtNode): Root node, with images and configurations subnodes.
+        output_path (str): Output .itb file, replaced atomically.
+        external (bool): Place the payloads after the FDT (mkimage -E).
+        align (int): Alignment of the external payloads and of the FDT
+            size in that layout (mkimage -B).
+        position (int): Absolute position of the first external payload
+            (mkimage -p), right after the FDT if None.
+        timestamp (int): Root timestamp, SOURCE_DATE_EPOCH or the current
+            time if None.
+
+    Returns:
+        dict: fdt_size, total size and number of payloads.
+
+    Raises:
+        ValueError: Bad alignment, position or hash algo.
+    """
+    if align <= 0 or align & (align - 1):
+        raise ValueError(f"Alignment must be a power of two: {align}")
+    if timestamp is None:
+        timestamp = int(os.environ.get('SOURCE_DATE_EPOCH', time.time()))
+
+    layout = []
+    tree = _prepare(root, external, align, position, layout)
+    tree.props['timestamp'] = timestamp & 0xFFFFFFFF
+    block = _StructBlock()
+    block.add_node(tree)
+    block.finish()
+
+    strings_offset = FDT_STRUCT_OFFSET + block.size
+    fdt_size = strings_offset + len(block.strings)
+    if external:
+        fdt_size = align_up(fdt_size, align)
+        data_start = fdt_size if position is None else position
+        if data_start < fdt_size:
+            raise ValueError(f"Position {position:#x} overlaps the FDT ({fdt_size} bytes)")
+        payloads = [(payload, data_start + offset) for payload, offset in layout]
+        total_size = data_start + sum(align_up(p.size, align) for p, _ in layout)
+    else:
+        payloads = [(chunk, FDT_STRUCT_OFFSET + offset)
+                    for offset, chunk in block.chunks if isinstance(chunk, FitPayload)]
+        total_size = fdt_size
+
+    algos = {}
+    for _, chunk in block.chunks:
+        if isinstance(chunk, _Digest):
+            algos.setdefault(id(chunk.payload), set()).add(chunk.algo)
+
+    header = struct.pack('>10I', FDT_MAGIC, fdt_size, FDT_STRUCT_OFFSET, strings_offset,
+                         FDT_HEADER_SIZE, FDT_VERSION, FDT_LAST_COMP_VERSION, 0,
+                         len(block.strings), block.size)
+    tmp_path = output_path + '.tmp'
+    try:
+        with open(tmp_path, 'wb') as out:
+            # Payloads first, so the digests are known when the FDT is written
+            digests = {}
+            for payload, offset in payloads:
+                digests[id(payload)] = _stream_payload(out, payload, offset, algos.get(id(payload), ()))
+            out.seek(0)
+            out.write(header + FDT_RSVMAP)
+            for offset, chunk in block.chunks:
+                if isinstance(chunk, FitPayload):
+                    out.seek(FDT_STRUCT_OFFSET + offset + chunk.size)
+                elif isinstance(chunk, _Digest):
+                    out.write(digests[id(chunk.payload)][chunk.algo])
+                else:
+                    out.write(chunk)
+            out.write(block.strings)
+            out.truncate(total_size)
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return {'fdt_size': fdt_size, 'size': total_size, 'payloads': len(payloads)}
+
+def read_root_property(path, name):
+    """
+    Return the value of a property of the root node of an FDT file, None
+    if the file is not an FDT or the root node has no such property.
+    """
+    with open(path, 'rb') as f:
+        blob = f.read()
+    if len(blob) < FDT_HEADER_SIZE:
+        return None
+    magic, _, struct_offset, strings_offset = struct.unpack_from('>4I', blob)
+    if magic != FDT_MAGIC:
+        return None
+    pos = struct_offset
+    depth = 0
+    try:
+        while True:
+            token, = struct.unpack_from('>I', blob, pos)
+            pos += 4
+            if token == FDT_BEGIN_NODE:
+                if depth:
+                    # Properties come before subnodes
+                    return None
+                depth += 1
+                pos = align_up(blob.index(b'\0', pos) + 1, 4)
+            elif token == FDT_PROP:
+                size, name_offset = struct.unpack_from('>II', blob, pos)
+                pos += 8
+                end = blob.index(b'\0', strings_offset + name_offset)
+                if blob[strings_offset + name_offset:end].decode() == name:
+                    return blob[pos:pos + size]
+                pos = align_up(pos + size, 4)
+            elif token != FDT_NOP:
+                return None
+    except (struct.error, ValueError, UnicodeDecodeError):
+        return None
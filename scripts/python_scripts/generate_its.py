@@ -3,7 +3,10 @@
 # This script generates Image Tree Source (ITS) files for various firmware components.
 # It takes paths to firmware images (bl31, uboot, tee, kernel, dtb, rootfs, extlinux.conf)
 # as input and generates corresponding .its files that can be used with the mkimage tool
-# to create bootable images.
+# to create bootable images. With --fit the FIT images (.itb) are also written
+# directly by fit_writer.py, embedded or with external data (-E, -B, -p).
+# With --manifest the files of many boards are generated in one run, see
+# load_manifest().
 #
 # Copyright (C) 2025 Charleye <wangkart@aliyun.com>
 #
@@ -12,12 +15,30 @@
 # published by the Free Software Foundation.
 
 import argparse
+import contextlib
+import functools
+import json
 import os
+import re
 import subprocess
-import gzip
-import lz4.frame
-import bz2
 import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from comp_advisor import DEFAULT_PROFILE, advise, format_advice, load_profile
+from digest_cache import add_cache_arguments, open_cache
+from fastzip import default_jobs, parse_size
+from fit_writer import FdtNode, FitPayload, read_root_property, write_fit
+from payload_cache import PayloadCache, add_payload_cache_arguments, sha256_file
+from payload_compress import compress_payloads, DEFAULT_LEVELS, SUFFIXES
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+# Keeps the messages of boards generated in parallel on their own lines
+_print_lock = threading.Lock()
 
 def write_its(output_file, content):
     """
@@ -29,7 +50,27 @@ def write_its(output_file, content):
     """
     with open(output_file, 'w') as f:
         f.write(content)
-    print(f"Successfully generated ITS file: {output_file}")
+    with _print_lock:
+        print(f"Successfully generated ITS file: {output_file}")
+
+def write_fit_image(output_file, root, args):
+    """
+    Writes a FIT image from its tree with the layout selected by args.
+
+    Args:
+        output_file (str): The path to the output .itb file.
+        root (FdtNode): The root node of the FIT.
+        args (Namespace): The parsed command line arguments.
+    """
+    try:
+        result = write_fit(root, output_file, args.external, args.align, args.position)
+    except (OSError, ValueError) as e:
+        print(f"Error writing FIT image {output_file}: {e}")
+        sys.exit(1)
+    layout = "external data" if args.external else "embedded data"
+    with _print_lock:
+        print(f"Successfully generated FIT image: {output_file} "
+              f"({result['size']} bytes, {result['payloads']} payloads, {layout})")
 
 def create_image_node(kwargs):
     """
@@ -77,7 +118,8 @@ def create_image_node(kwargs):
 """
     return image_node
 
-def create_config_node(description, sha_algo="sha256", rsa_algo="rsa2048", config_name="conf-1", is_kernel=False, has_ramdisk=False):
+def create_config_node(description, sha_algo="sha256", rsa_algo="rsa2048", config_name="conf-1", is_kernel=False, has_ramdisk=False,
+                       fdt_name="fdt-1", compatible=None, is_default=True):
     """
     Generates the configuration node content for an ITS file.
 
@@ -88,6 +130,9 @@ def create_config_node(description, sha_algo="sha256", rsa_algo="rsa2048", confi
         config_name (str, optional): Name of the configuration node. Defaults to "conf-1".
         is_kernel (bool, optional): Whether the config node is for kernel. Defaults to False.
         has_ramdisk (bool, optional): Whether the config node includes ramdisk. Defaults to False.
+        fdt_name (str, optional): FDT image node of a kernel config. Defaults to "fdt-1".
+        compatible (list, optional): Compatible strings of the board. Defaults to None.
+        is_default (bool, optional): Whether to make it the default configuration. Defaults to True.
 
     Returns:
         str: The configuration node content.
@@ -95,14 +140,21 @@ def create_config_node(description, sha_algo="sha256", rsa_algo="rsa2048", confi
     signature_algo = f"{sha_algo},{rsa_algo}"
     key_name_hint = f"akcipher{rsa_algo[3:]}"
 
-    config_node = f"""
-        default = "{config_name}";
+    config_node = ""
+    if is_default:
+        config_node += f"""
+        default = "{config_name}";"""
+    config_node += f"""
         {config_name} {{
             description = "{description}";"""
+    if compatible:
+        compatible_str = ", ".join(f'"{c}"' for c in compatible)
+        config_node += f"""
+            compatible = {compatible_str};"""
     if is_kernel:
         config_node += f"""
             kernel = "kernel";
-            fdt = "fdt-1";"""
+            fdt = "{fdt_name}";"""
         if has_ramdisk:
             config_node += f"""
             ramdisk = "ramdisk-1";"""
@@ -167,18 +219,119 @@ def create_its(kwargs, is_kernel=False):
 """
     return content
 
-def create_kernel_its(kwargs):
+def parse_cells(cells):
     """
-    Generates the content for a kernel ITS file with separate kernel, dtb, and rootfs images.
+    Converts a cell list as used in the ITS text (e.g., "0x1 0x00104000"
+    or "<1>") to a tuple of integers.
+    """
+    return tuple(int(cell, 0) for cell in cells.strip("<>").split())
+
+def create_image_tree(kwargs):
+    """
+    Builds the image node of a FIT, the counterpart of create_image_node().
 
     Args:
         kwargs (dict): A dictionary containing the arguments.
 
     Returns:
-        str: The content of the kernel ITS file.
+        FdtNode: The image node.
+    """
+    props = {
+        'data': FitPayload(kwargs['data_path']),
+        'description': kwargs['description'],
+        'type': kwargs['image_type'],
+        'arch': kwargs['arch'],
+        'compression': kwargs.get('compression', 'none'),
+        'load': parse_cells(kwargs['load_addr'])
+    }
+    if kwargs.get('entry_point'):
+        props['entry'] = parse_cells(kwargs['entry_point'])
+    if kwargs.get('os_name'):
+        props['os'] = kwargs['os_name']
+    if 'kernel-version' in kwargs:
+        props['kernel-version'] = parse_cells(kwargs['kernel-version'])
+    if 'fdt-version' in kwargs:
+        props['fdt-version'] = parse_cells(kwargs['fdt-version'])
+    node = FdtNode(kwargs.get('node_name', 'firmware-1'), props)
+    if kwargs.get('cipher'):
+        node.add_node(FdtNode("cipher", {
+            'algo': "aes256",
+            'key-name-hint': "dev",
+            'iv': parse_cells(kwargs['cipher']['iv'])
+        }))
+    node.add_node(FdtNode("hash-1", {'algo': kwargs.get('sha_algo', 'sha256')}))
+    return node
+
+def create_config_tree(description, sha_algo="sha256", rsa_algo="rsa2048", config_name="conf-1", is_kernel=False, has_ramdisk=False,
+                       fdt_name="fdt-1", compatible=None):
+    """
+    Builds a configuration node of a FIT, the counterpart of
+    create_config_node(), which takes the same arguments. The default
+    property belongs to the configurations node of the caller.
+
+    Returns:
+        FdtNode: The configuration node.
+    """
+    config = FdtNode(config_name, {'description': description})
+    if compatible:
+        config.props['compatible'] = list(compatible)
+    if is_kernel:
+        config.props['kernel'] = "kernel"
+        config.props['fdt'] = fdt_name
+        sign_images = ["fdt", "kernel"]
+        if has_ramdisk:
+            config.props['ramdisk'] = "ramdisk-1"
+            sign_images.insert(1, "ramdisk")
+    else:
+        config.props['firmware'] = "firmware-1"
+        config.props['loadables'] = "firmware-1"
+        sign_images = ["firmware"]
+    config.add_node(FdtNode("signature", {
+        'sign-images': sign_images,
+        'algo': f"{sha_algo},{rsa_algo}",
+        'key-name-hint': f"akcipher{rsa_algo[3:]}"
+    }))
+    return config
+
+def create_fit(kwargs, is_kernel=False):
+    """
+    Builds the tree of a FIT, the counterpart of create_its().
+
+    Returns:
+        FdtNode: The root node.
+    """
+    return FdtNode("", {
+        'description': kwargs['description'],
+        '#address-cells': 2
+    }, [
+        FdtNode("images", nodes=[create_image_tree(kwargs)]),
+        FdtNode("configurations", {'default': "conf-1"}, [
+            create_config_tree(kwargs['description'], kwargs.get('sha_algo', "sha256"),
+                               kwargs.get('rsa_algo', "rsa2048"), is_kernel=is_kernel)
+        ])
+    ])
+
+def kernel_node_kwargs(kwargs):
+    """
+    Collects the image nodes and the configuration of a kernel ITS/FIT.
+
+    Args:
+        kwargs (dict): A dictionary containing the arguments. The optional
+            'compressions' dict overrides 'compression' for the kernel,
+            ramdisk and fdt images. For several DTBs, 'fdts' lists the fdt
+            images (node_name, path, and optionally compression and
+            description) and 'configs' the configurations (config_name,
+            fdt_name, and optionally name and compatible); otherwise
+            dtb_path is the single fdt-1 of conf-1.
+
+    Returns:
+        tuple: The kwargs of the kernel, ramdisk and fdt image nodes (in
+        that order, without ramdisk when there is no rootfs) and the list
+        of create_config_node() kwargs, the default configuration first.
     """
     load_addr_str = hex_to_addr_tuple(kwargs['load_addr'])
     entry_point_str = hex_to_addr_tuple(kwargs['entry_point'])
+    compressions = kwargs.get('compressions') or {}
 
     common_image_props = {
         'arch': "arm64",
@@ -196,25 +349,33 @@ def create_kernel_its(kwargs):
         'entry_point': entry_point_str,
         'node_name': "kernel",
         'kernel-version': "<1>",
-        **common_image_props
+        **common_image_props,
+        'compression': compressions.get('kernel', kwargs['compression'])
     }
     if kwargs.get('cipher'):
         kernel_image_props['cipher'] = kwargs['cipher']
-    kernel_image_node = create_image_node(kernel_image_props)
+    image_props = [kernel_image_props]
 
     has_ramdisk = False
     if kwargs.get('rootfs_path'):
         has_ramdisk = True
 
-    config_node = create_config_node(
-        description="Linux kernel with FDT and ramdisk" if has_ramdisk else "Linux kernel with FDT",
-        sha_algo=kwargs['sha_algo'],
-        rsa_algo=kwargs['rsa_algo'],
-        is_kernel=True,
-        has_ramdisk=has_ramdisk
-    )
+    config_kwargs = []
+    for config in kwargs.get('configs') or [{}]:
+        description = "Linux kernel with FDT and ramdisk" if has_ramdisk else "Linux kernel with FDT"
+        if config.get('name'):
+            description += f" for {config['name']}"
+        config_kwargs.append({
+            'description': description,
+            'sha_algo': kwargs['sha_algo'],
+            'rsa_algo': kwargs['rsa_algo'],
+            'config_name': config.get('config_name', "conf-1"),
+            'is_kernel': True,
+            'has_ramdisk': has_ramdisk,
+            'fdt_name': config.get('fdt_name', "fdt-1"),
+            'compatible': config.get('compatible')
+        })
 
-    ramdisk_image_node = ""
     if has_ramdisk:
         rootfs_load_addr = kwargs.get('rootfs_load_addr')
         if rootfs_load_addr is None:
@@ -229,49 +390,86 @@ def create_kernel_its(kwargs):
             'os_name': "linux",
             'load_addr': rootfs_load_addr,
             'node_name': "ramdisk-1",
-            **common_image_props
+            **common_image_props,
+            'compression': compressions.get('ramdisk', kwargs['compression'])
         }
         # Ensure ramdisk_image_props does not have 'entry_point'
         if 'entry_point' in ramdisk_image_props:
             del ramdisk_image_props['entry_point']
         if kwargs.get('cipher'):
             ramdisk_image_props['cipher'] = kwargs['cipher']
-        ramdisk_image_node = create_image_node(ramdisk_image_props)
+        image_props.append(ramdisk_image_props)
 
     dtb_load_addr = kwargs.get('dtb_load_addr')
     if dtb_load_addr is None:
         dtb_load_addr = "0x0"
     dtb_load_addr = hex_to_addr_tuple(dtb_load_addr)
 
-    fdt_image_props = {
-        **kwargs,
-        'data_path': kwargs['dtb_path'],
-        'description': "kernel FDT",
-        'image_type': "flat_dt",
-        'arch': "arm64",
-        'load_addr': dtb_load_addr,
-        'node_name': "fdt-1",
-        'fdt-version': "<1>",
-        **common_image_props
-    }
-    # Ensure fdt_image_props does not have 'entry_point'
-    if 'entry_point' in fdt_image_props:
-        del fdt_image_props['entry_point']
-    if kwargs.get('cipher'):
-        fdt_image_props['cipher'] = kwargs['cipher']
-    fdt_image_node = create_image_node(fdt_image_props)
+    for fdt in kwargs.get('fdts') or [{'node_name': "fdt-1", 'path': kwargs['dtb_path']}]:
+        fdt_image_props = {
+            **kwargs,
+            'data_path': fdt['path'],
+            'description': fdt.get('description', "kernel FDT"),
+            'image_type': "flat_dt",
+            'arch': "arm64",
+            'load_addr': dtb_load_addr,
+            'node_name': fdt['node_name'],
+            'fdt-version': "<1>",
+            **common_image_props,
+            'compression': fdt.get('compression', compressions.get('fdt', kwargs['compression']))
+        }
+        # Ensure fdt_image_props does not have 'entry_point'
+        if 'entry_point' in fdt_image_props:
+            del fdt_image_props['entry_point']
+        if kwargs.get('cipher'):
+            fdt_image_props['cipher'] = kwargs['cipher']
+        image_props.append(fdt_image_props)
+
+    return image_props, config_kwargs
+
+def create_kernel_its(kwargs):
+    """
+    Generates the content for a kernel ITS file with separate kernel, dtb, and rootfs images.
+
+    Args:
+        kwargs (dict): A dictionary containing the arguments.
+
+    Returns:
+        str: The content of the kernel ITS file.
+    """
+    image_props, config_kwargs = kernel_node_kwargs(kwargs)
+    image_nodes = "".join(create_image_node(props) for props in image_props)
+    config_node = "".join(create_config_node(**config, is_default=(i == 0))
+                          for i, config in enumerate(config_kwargs))
 
     content = f"""
 /dts-v1/;
 / {{
     description = "kernel image with one or more FDT blobs";
     #address-cells = <2>;
-    images {{{kernel_image_node}{ramdisk_image_node}{fdt_image_node}    }};
+    images {{{image_nodes}    }};
     configurations {{{config_node}    }};
 }};
 """
     return content
 
+def create_kernel_fit(kwargs):
+    """
+    Builds the tree of a kernel FIT, the counterpart of create_kernel_its().
+
+    Returns:
+        FdtNode: The root node.
+    """
+    image_props, config_kwargs = kernel_node_kwargs(kwargs)
+    return FdtNode("", {
+        'description': "kernel image with one or more FDT blobs",
+        '#address-cells': 2
+    }, [
+        FdtNode("images", nodes=[create_image_tree(props) for props in image_props]),
+        FdtNode("configurations", {'default': config_kwargs[0]['config_name']},
+                [create_config_tree(**config) for config in config_kwargs])
+    ])
+
 def hex_to_addr_tuple(hex_addr):
     """
     Converts a hexadecimal address to a tuple of two 32-bit hexadecimal numbers.
@@ -320,70 +518,192 @@ def hex_to_iv_tuple(hex_iv):
 
     return f"0x{iv_part1} 0x{iv_part2} 0x{iv_part3} 0x{iv_part4}"
 
-def is_compressed(file_path, comp_type, debug):
+# Magic numbers at the start of the files checked by detect_format(),
+# as (offset, magic, format)
+FORMAT_MAGICS = [
+    (0, b'\x1f\x8b', "gzip"),
+    (0, b'\x04\x22\x4d\x18', "lz4"),       # LZ4 frame
+    (0, b'\x02\x21\x4c\x18', "lz4"),       # LZ4 legacy (lz4 -l, Linux kernel)
+    (0, b'\x28\xb5\x2f\xfd', "zstd"),
+    (0, b'\xfd7zXZ\x00', "xz"),
+    (0, b'hsqs', "squashfs"),
+    (0, b'sqsh', "squashfs"),
+    (0, b'\xd0\x0d\xfe\xed', "fdt"),       # FDT, FIT images included
+]
+SNIFF_SIZE = 16
+# Formats that are compressed streams, as opposed to images (squashfs, FDT)
+COMPRESSION_FORMATS = ("gzip", "lz4", "bzip2", "zstd", "xz", "lzma")
+
+def sniff_format(header):
+    """
+    Returns the format of data starting with header, or None if unknown.
+    """
+    for offset, magic, fmt in FORMAT_MAGICS:
+        if header[offset:offset + len(magic)] == magic:
+            return fmt
+    if header[:3] == b'BZh' and header[3:4].isdigit() and header[3:4] != b'0':
+        return "bzip2"
+    # lzma_alone: properties byte 0x5d, a power of two dictionary size and
+    # an unknown (all ones) or plausible uncompressed size
+    if len(header) >= 13 and header[0] == 0x5d:
+        dict_size = int.from_bytes(header[1:5], 'little')
+        size = int.from_bytes(header[5:13], 'little')
+        if dict_size & (dict_size - 1) == 0 and dict_size >= 4096 and (size == 2 ** 64 - 1 or size < 2 ** 40):
+            return "lzma"
+    return None
+
+@functools.lru_cache(maxsize=None)
+def _detect_format(file_path, mtime_ns, size):
+    with open(file_path, 'rb') as f:
+        return sniff_format(f.read(SNIFF_SIZE))
+
+def detect_format(file_path, debug=False):
+    """
+    Detects the format of a file from its first SNIFF_SIZE bytes.
+
+    The result is memoized per (path, mtime), so the callers checking the
+    same image several times read it once.
+
+    Returns:
+        str: One of the FORMAT_MAGICS formats, "bzip2" or "lzma", or None
+        if the format is not recognized.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+    """
+    st = os.stat(file_path)
+    fmt = _detect_format(os.path.abspath(file_path), st.st_mtime_ns, st.st_size)
+    if debug:
+        print(f"Debug: {file_path} detected as {fmt or 'unknown'}")
+    return fmt
+
+# Payloads compressed by compress_all(),
+# (path, mtime_ns, size, comp_type) -> compressed file path
+_compressed_payloads = {}
+
+def payload_key(file_path, comp_type):
+    st = os.stat(file_path)
+    return (os.path.abspath(file_path), st.st_mtime_ns, st.st_size, comp_type)
+
+def compress_all(paths, comp_type, debug=False, jobs=0, cache=None, export=False):
     """
-    Checks if a file is compressed using the specified compression type.
-    Returns True if compressed, False otherwise.
+    Compresses every payload of paths that is not compressed yet. The
+    payloads are compressed concurrently and the time spent on each is
+    reported. With a PayloadCache, payloads whose content was compressed
+    before are taken from the cache and new ones are compressed into it
+    rather than next to their inputs. With export, the cache entries are
+    then placed next to the inputs, where they stay when a later run
+    evicts them, and those paths are returned instead.
+
+    Returns:
+        dict: path -> path of the compressed file (the path itself if it
+        already was), None if it could not be compressed.
     """
+    result = {}
+    tasks = []
+    # Payloads with the same content as a queued one, compressed into the
+    # same cache entry: path -> entry
+    same_content = {}
+    for path in dict.fromkeys(path for path in paths if path):
+        try:
+            fmt = detect_format(path, debug)
+        except FileNotFoundError:
+            print(f"File not found: {path}")
+            result[path] = None
+            continue
+        if fmt == comp_type:
+            if debug:
+                print(f"Debug: {path} is already {comp_type} compressed")
+            result[path] = path
+        elif fmt in COMPRESSION_FORMATS:
+            print(f"Error: {path} is already compressed with {fmt}, cannot compress with {comp_type}")
+            sys.exit(1)
+        elif comp_type not in SUFFIXES:
+            print(f"Unsupported compression type: {comp_type}")
+            result[path] = path
+        elif payload_key(path, comp_type) in _compressed_payloads:
+            result[path] = _compressed_payloads[payload_key(path, comp_type)]
+        elif cache is None:
+            tasks.append((path, path + SUFFIXES[comp_type], comp_type, None))
+        else:
+            key = (cache.input_digest(path), comp_type, DEFAULT_LEVELS[comp_type], SUFFIXES[comp_type])
+            cached = cache.lookup(*key)
+            if cached:
+                print(f"Reusing {cached} for {path}")
+                _compressed_payloads[payload_key(path, comp_type)] = cached
+                result[path] = cached
+            elif cache.entry_path(*key) in (dst for _, dst, _, _ in tasks):
+                same_content[path] = cache.entry_path(*key)
+            else:
+                tasks.append((path, cache.prepare(*key), comp_type, None))
+
     try:
-        if comp_type == "gzip":
-            with gzip.open(file_path, 'rb') as f:
-                try:
-                    f.peek(1)
-                    return True
-                except OSError as e:
-                    if debug:
-                        print(f"Debug: gzip.open failed to peek {file_path}. Reason: {e}")
-                    return False
-        elif comp_type == "lz4":
+        timings = compress_payloads(tasks, jobs)
+    except (OSError, ValueError, subprocess.CalledProcessError) as e:
+        print(f"Error compressing payloads: {e}")
+        result.update((src, None) for src, _, _, _ in tasks)
+        result.update((path, None) for path in same_content)
+        return result
+
+    for src, dst, _, _ in tasks:
+        _compressed_payloads[payload_key(src, comp_type)] = dst
+        result[src] = dst
+        timing = timings[src]
+        print(f"Compressed {src}: {timing['size']} -> {timing['compressed']} bytes "
+              f"in {timing['seconds']:.2f} s ({timing['method']})")
+    for path, dst in same_content.items():
+        _compressed_payloads[payload_key(path, comp_type)] = dst
+        result[path] = dst
+        print(f"Reusing {dst} for {path}")
+
+    if export and cache is not None:
+        for path, dst in result.items():
+            stable_path = path + SUFFIXES.get(comp_type, '')
+            if dst is None or dst in (path, stable_path):
+                continue
             try:
-                with lz4.frame.open(file_path, 'rb') as f:
-                    try:
-                        f.read(1)
-                        return True
-                    except Exception as e: # lz4.frame.LZ4FError doesn't exist in all versions
-                        if debug:
-                            print(f"Debug: lz4.frame failed to decompress {file_path}. Reason: {e}")
-                        # Fallback to using the file command
-                        try:
-                            result = subprocess.run(['file', file_path], capture_output=True, text=True, check=False)
-                            if "LZ4 compressed data" in result.stdout:
-                                return True
-                            else:
-                                if debug:
-                                    print(f"Debug: File command indicates {file_path} is not LZ4 compressed.")
-                                return False
-                        except FileNotFoundError:
-                            print(f"Error: 'file' command not found. Please ensure it is installed.")
-                            return False
-            except FileNotFoundError:
-                print(f"File not found: {file_path}")
-                return None  # Indicate file not found
-            except Exception as e:
-                print(f"Error checking lz4 compression for {file_path}: {e}")
-                return False
-        elif comp_type == "bzip2":
-            with bz2.open(file_path, 'rb') as f:
-                try:
-                    f.read(1)
-                    return True
-                except OSError as e:
-                    if debug:
-                        print(f"Debug: bz2.open failed to read {file_path}. Reason: {e}")
-                    return False
+                strategy = cache.export(dst, stable_path)
+            except OSError as e:
+                print(f"Error placing {dst} at {stable_path}: {e}")
+                result[path] = None
+                continue
+            if debug:
+                print(f"Debug: {dst} placed at {stable_path} ({strategy})")
+            _compressed_payloads[payload_key(path, comp_type)] = stable_path
+            result[path] = stable_path
+    return result
+
+def advise_compression(payloads, profile, debug=False, jobs=0, cache=None):
+    """
+    Runs the compression advisor on the payloads and prints its advice.
+
+    Args:
+        payloads (dict): image type -> path.
+        profile (dict): Board profile, see comp_advisor.py.
+
+    Returns:
+        dict: image type -> recommended compression. Payloads that are
+        already compressed keep their format.
+    """
+    comps = {}
+    candidates = {}
+    for name, path in payloads.items():
+        try:
+            fmt = detect_format(path, debug)
+        except FileNotFoundError:
+            print(f"File not found: {path}")
+            continue
+        if fmt in COMPRESSION_FORMATS:
+            print(f"{name}: {path} is already {fmt} compressed")
+            comps[name] = fmt
         else:
-            print(f"Unsupported compression type: {comp_type}")
-            return False
-    except FileNotFoundError:
-        print(f"File not found: {file_path}")
-        return None  # Indicate file not found
-    except (gzip.BadGzipFile, OSError):
-        if debug:
-            print(f"Debug: {file_path} is not a valid {comp_type} file")
-        return False
-    except Exception as e:
-        print(f"Error checking {comp_type} compression for {file_path}: {e}")
-        return False
+            candidates[name] = path
+    if candidates:
+        results = advise(candidates, profile,
+                         lambda codec, paths: compress_all(paths, codec, debug, jobs, cache))
+        print(format_advice(candidates, results, profile))
+        comps.update((name, results[name][0]['codec']) for name in candidates if results[name])
+    return comps
 
 def check_and_compress(file_path, comp_type, debug=False):
     """
@@ -392,59 +712,26 @@ def check_and_compress(file_path, comp_type, debug=False):
     """
     if not file_path:
         return None
+    return compress_all([file_path], comp_type, debug)[file_path]
 
-    # Check if already compressed with another algorithm
-    for c_type in ["gzip", "lz4", "bzip2"]:
-        if is_compressed(file_path, c_type, debug):
-            if c_type == comp_type:
-                if debug:
-                    print(f"Debug: {file_path} is already {comp_type} compressed")
-                return file_path
-            else:
-                print(f"Error: {file_path} is already compressed with {c_type}, cannot compress with {comp_type}")
-                sys.exit(1)
-
-    suffix = {"gzip": ".gz", "lz4": ".lz4", "bzip2": ".bz2"}.get(comp_type)
-    if not suffix:
-        print(f"Unsupported compression type: {comp_type}")
-        return file_path
-
-    compressed_file_path = file_path + suffix
-    compress_cmd = {
-        "gzip": ['gzip', '-f', '-k', file_path],
-        "lz4": ['lz4', '-f', file_path, compressed_file_path],
-        "bzip2": ['bzip2', '-f', '-k', file_path]
-    }.get(comp_type)
-
-    is_already_compressed = is_compressed(file_path, comp_type, debug)
-    if is_already_compressed is None:
-        return None
-
-    if is_already_compressed:
-        if debug:
-            print(f"Debug: {file_path} is already {comp_type} compressed")
-        return file_path
-
-    # Create a new compressed file
-    try:
-        subprocess.run(compress_cmd, check=True)  # -k keeps the original file
-        return compressed_file_path
-    except subprocess.CalledProcessError as e:
-        print(f"Error compressing {file_path}: {e}")
-        return None
-
-def create_multi_spl_its(params):
+def multi_spl_node_kwargs(params):
     """
-    Generates the content of a multi_spl.its file.
+    Collects the image nodes of a multi_spl ITS/FIT, compressing the
+    images first if compression is specified.
 
     Args:
-        params (dict): Dictionary containing necessary parameters.
+        params (dict): Dictionary containing necessary parameters. The
+            optional 'comps' dict overrides 'comp' per image type.
+
+    Returns:
+        tuple: The kwargs of the u-boot, atf and optee (if any) image
+        nodes, and the list of their node names in configuration order.
     """
     paths = params['paths']
     default_addresses = params['default_addresses']
     sha_algo = params.get('sha_algo', "sha256")
-    rsa_algo = params.get('rsa_algo', "rsa2048")
     comp = params.get('comp', "none")
+    comps = {img_type: (params.get('comps') or {}).get(img_type, comp) for img_type in paths}
     debug = params.get('debug', False)
     cipher_iv = params.get('cipher_iv', None)
 
@@ -468,8 +755,8 @@ def create_multi_spl_its(params):
     # Compress images if compression is specified
     compressed_paths = {}
     for img_type, path in paths.items():
-        if path and comp != "none":
-            compressed_path = check_and_compress(path, comp, debug)
+        if path and comps[img_type] != "none":
+            compressed_path = check_and_compress(path, comps[img_type], debug)
             if compressed_path is None:
                 print(f"Error: Failed to compress {img_type} image.")
                 sys.exit(1)
@@ -477,20 +764,28 @@ def create_multi_spl_its(params):
         else:
             compressed_paths[img_type] = path if path else None
 
-    atf_kwargs = create_image_node_kwargs("atf", compressed_paths['bl31'], default_addresses['bl31'], sha_algo, comp)
-    atf_node = create_image_node(atf_kwargs)
-
-    uboot_kwargs = create_image_node_kwargs("u-boot", compressed_paths['uboot'], default_addresses['uboot'], sha_algo, comp)
-    uboot_node = create_image_node(uboot_kwargs)
-
-    tee_node = ""
+    image_props = [
+        create_image_node_kwargs("u-boot", compressed_paths['uboot'], default_addresses['uboot'], sha_algo, comps['uboot']),
+        create_image_node_kwargs("atf", compressed_paths['bl31'], default_addresses['bl31'], sha_algo, comps['bl31'])
+    ]
     if paths.get('tee'):
-        tee_kwargs = create_image_node_kwargs("optee", compressed_paths['tee'], default_addresses['tee'], sha_algo, comp)
-        tee_node = create_image_node(tee_kwargs)
+        image_props.append(create_image_node_kwargs("optee", compressed_paths['tee'], default_addresses['tee'], sha_algo, comps['tee']))
 
     firmware_list = ["u-boot", "atf"]
     if paths.get('tee'):
         firmware_list.append("optee")
+    return image_props, firmware_list
+
+def create_multi_spl_its(params):
+    """
+    Generates the content of a multi_spl.its file.
+
+    Args:
+        params (dict): Dictionary containing necessary parameters.
+    """
+    sha_algo = params.get('sha_algo', "sha256")
+    rsa_algo = params.get('rsa_algo', "rsa2048")
+    image_props, firmware_list = multi_spl_node_kwargs(params)
     firmware_str = ", ".join(f'"{fw}"' for fw in firmware_list)
 
     config_node = f"""
@@ -507,7 +802,7 @@ def create_multi_spl_its(params):
         }};
 """
 
-    images_str = f"""{uboot_node}{atf_node}{tee_node}"""
+    images_str = "".join(create_image_node(props) for props in image_props)
 
     content = f"""
 /dts-v1/;
@@ -520,23 +815,86 @@ def create_multi_spl_its(params):
 """
     return content
 
+def create_multi_spl_fit(params):
+    """
+    Builds the tree of a multi_spl FIT, the counterpart of create_multi_spl_its().
+
+    Returns:
+        FdtNode: The root node.
+    """
+    sha_algo = params.get('sha_algo', "sha256")
+    rsa_algo = params.get('rsa_algo', "rsa2048")
+    image_props, firmware_list = multi_spl_node_kwargs(params)
+    config = FdtNode("conf-1", {
+        'description': "SPL Loaded Multiple Firmwares",
+        'firmware': firmware_list,
+        'loadables': firmware_list
+    }, [FdtNode("signature", {
+        'sign-images': "firmware",
+        'algo': f"{sha_algo},{rsa_algo}",
+        'key-name-hint': f"akcipher{rsa_algo[3:]}"
+    })])
+    return FdtNode("", {
+        'description': "multiple firmware blobs loaded by SPL",
+        '#address-cells': 2
+    }, [
+        FdtNode("images", nodes=[create_image_tree(props) for props in image_props]),
+        FdtNode("configurations", {'default': "conf-1"}, [config])
+    ])
+
 def ensure_uncompressed(path, debug):
     """
     Ensures that a file is not compressed using any supported compression type.
     Exits if the file is compressed but compression is set to none.
     """
-    for c_type in ["gzip", "lz4", "bzip2"]:
-        if is_compressed(path, c_type, debug):
-            print(f"Error: {path} is compressed with {c_type}, but compression is set to none.")
-            sys.exit(1)
-
-def main():
+    try:
+        fmt = detect_format(path, debug)
+    except FileNotFoundError:
+        print(f"File not found: {path}")
+        return
+    if fmt in COMPRESSION_FORMATS:
+        print(f"Error: {path} is compressed with {fmt}, but compression is set to none.")
+        sys.exit(1)
+
+# Default load addresses and entry points for different image types
+DEFAULT_ADDRESSES = {
+    'bl31': {'load_addr': "0x100104000", 'entry_point': "0x100104000", 'os_name': "arm-trusted-firmware", 'description': "ARM Trusted Firmware"},
+    'uboot': {'load_addr': "0x100200000", 'entry_point': "0x100200000", 'os_name': "u-boot", 'description': "U-Boot"},
+    'tee': {'load_addr': "0x104000000", 'entry_point': "0x104000000", 'os_name': "tee", 'description': "Trusted Execution Environment Image"},
+    'extlinux': {'load_addr': "0x10FF00000", 'entry_point': None, 'os_name': "linux", 'description': "Linux Boot Configurations"},
+    'kernel': {'load_addr': "0x110000000", 'entry_point': "0x110000000"},
+    'ramdisk': {'load_addr': "0x119000000", 'entry_point': None},
+    'fdt': {'load_addr': "0x118000000", 'entry_point': None}
+}
+
+# Command line options a board of a manifest can set, see load_manifest()
+MANIFEST_OPTIONS = {
+    'bl31': '--bl31', 'uboot': '--uboot', 'tee': '--tee', 'kernel': '--kernel',
+    'dtb': '--dtb', 'dtbs': '--dtbs', 'rootfs': '--rootfs', 'extlinux': '--extlinux',
+    'output_dir': '--output_dir', 'load_addr': '--load_addr', 'entry_point': '--entry_point',
+    'sha_algo': '--sha_algo', 'rsa_algo': '--rsa_algo', 'comp': '--comp',
+    'board_profile': '--board-profile', 'dtb_load_addr': '--dtb_load_addr',
+    'rootfs_load_addr': '--rootfs_load_addr', 'multi_spl': '--multi_spl', 'fit': '--fit',
+    'external': '--external', 'align': '--align', 'position': '--position',
+    'cipher_iv': '--cipher_iv'
+}
+# Manifest options that are paths, relative to the manifest directory
+MANIFEST_PATHS = ('bl31', 'uboot', 'tee', 'kernel', 'dtb', 'rootfs', 'extlinux',
+                  'output_dir', 'board_profile')
+
+def build_parser():
+    """
+    Builds the command line parser, also used for the boards of a manifest.
+    """
     parser = argparse.ArgumentParser(description='Generate ITS files for different firmware components.')
     parser.add_argument('--bl31', type=str, help='Path to ARM Trusted Firmware image')
     parser.add_argument('--uboot', type=str, help='Path to U-Boot image')
     parser.add_argument('--tee', type=str, help='Path to OP-TEE image')
     parser.add_argument('--kernel', type=str, help='Path to Linux Kernel Image')
     parser.add_argument('--dtb', type=str, help='Path to Kernel dtb file')
+    parser.add_argument('--dtbs', type=str, nargs='+', metavar='[NAME=]DTB',
+                        help='Kernel dtb files of several boards, one configuration each and one fdt image '
+                             'per distinct dtb content (NAME defaults to the file name without .dtb)')
     parser.add_argument('--rootfs', type=str, help='Path to rootfs image')
     parser.add_argument('--extlinux', type=str, help='Path to extlinux.conf')
     parser.add_argument('--output_dir', type=str, default='.', help='Output directory for ITS files (default: current directory)')
@@ -544,52 +902,227 @@ def main():
     parser.add_argument('--entry_point', type=str, help='Entry point for the image in hex format (e.g., 0x100104000)', default=None)
     parser.add_argument('--sha_algo', type=str, help='SHA algorithm (e.g., sha256)', choices=['sha256', 'sha384', 'sha512'], default="sha256")
     parser.add_argument('--rsa_algo', type=str, help='RSA algorithm (e.g., rsa2048)', choices=['rsa2048', 'rsa3072', 'rsa4096'], default="rsa2048")
-    parser.add_argument('--comp', type=str, help='Compression type (e.g., none)', choices=['none', 'gzip', 'lz4', 'bzip2'], default="none")
+    parser.add_argument('--comp', type=str, help='Compression type (e.g., none)', choices=['none', 'gzip', 'lz4', 'bzip2', 'zstd', 'auto'], default="none")
+    parser.add_argument('--advise', action='store_true', default=False,
+                        help='Print the boot time of each compression for every payload and exit')
+    parser.add_argument('--board-profile', type=str, default=None, metavar='FILE',
+                        help=f"Board profile (JSON) of the compression advisor used by --advise and "
+                             f"--comp auto (default: {DEFAULT_PROFILE['name']}, SD card)")
+    parser.add_argument('-j', '--jobs', type=int, default=0,
+                        help='Number of payloads compressed in parallel, and threads for large ones (default: all CPUs)')
     parser.add_argument('--dtb_load_addr', type=str, help='Load address for the dtb in hex format (e.g., 0x18000000)', default=None)
     parser.add_argument('--rootfs_load_addr', type=str, help='Load address for the rootfs in hex format (e.g., 0x19000000)', default=None)
     parser.add_argument('-d', '--debug', action='store_true', help='Enable debug output', default=False)
     parser.add_argument('--multi_spl', action='store_true', help='Generate multi_spl.its', default=False)
+    parser.add_argument('--fit', action='store_true', default=False,
+                        help='Also write the FIT images (.itb) directly, without dtc or mkimage '
+                             '(unencrypted, cannot be combined with --cipher_iv)')
+    parser.add_argument('-E', '--external', action='store_true', default=False,
+                        help='Place the FIT payloads after the FDT, as mkimage -E does')
+    parser.add_argument('-B', '--align', type=lambda x: int(x, 16), default=4,
+                        help='Alignment of external payloads in hex (e.g., 0x1000, default: 4)')
+    parser.add_argument('-p', '--position', type=lambda x: int(x, 16), default=None,
+                        help='Absolute position of the first external payload in hex, as mkimage -p')
     parser.add_argument('--cipher_iv', type=str, help='IV for cipher in hex format (e.g., 0x...)', default=None)
+    add_payload_cache_arguments(parser)
+    add_cache_arguments(parser)
 
-    args = parser.parse_args()
-
-    # Check for multiple occurrences of arguments
-    arg_names = ['bl31', 'uboot', 'tee', 'kernel', 'dtb', 'rootfs', 'extlinux']
-    for arg_name in arg_names:
-        if getattr(args, arg_name) and sys.argv.count('--' + arg_name) > 1:
-            parser.error(f"Argument --{arg_name} can only be specified once.")
-
-    os.makedirs(args.output_dir, exist_ok=True)
+    parser.add_argument('-m', '--manifest', type=str, default=None, metavar='FILE',
+                        help='Generate the ITS/FIT files of every board described in a YAML or JSON manifest')
+    return parser
 
-    # Define default load addresses and entry points for different image types
-    default_addresses = {
-        'bl31': {'load_addr': "0x100104000", 'entry_point': "0x100104000", 'os_name': "arm-trusted-firmware", 'description': "ARM Trusted Firmware"},
-        'uboot': {'load_addr': "0x100200000", 'entry_point': "0x100200000", 'os_name': "u-boot", 'description': "U-Boot"},
-        'tee': {'load_addr': "0x104000000", 'entry_point': "0x104000000", 'os_name': "tee", 'description': "Trusted Execution Environment Image"},
-        'extlinux': {'load_addr': "0x10FF00000", 'entry_point': None, 'os_name': "linux", 'description': "Linux Boot Configurations"},
-        'kernel': {'load_addr': "0x110000000", 'entry_point': "0x110000000"},
-        'ramdisk': {'load_addr': "0x119000000", 'entry_point': None},
-        'fdt': {'load_addr': "0x118000000", 'entry_point': None}
-    }
+def check_args(parser, args):
+    """
+    Validates the options of a board.
 
-    # Consolidate cipher_iv logic
-    cipher_iv = None
+    Returns:
+        dict: The board profile of the compression advisor.
+    """
+    if args.kernel and not (args.dtb or args.dtbs):
+        parser.error("--kernel requires --dtb or --dtbs")
+    if args.dtb and args.dtbs:
+        parser.error("--dtb and --dtbs cannot be used together")
+    if args.dtbs:
+        if not args.kernel:
+            parser.error("--dtbs requires --kernel")
+        names = [parse_dtb_arg(entry)[0] for entry in args.dtbs]
+        for name in names:
+            if not re.fullmatch(r'[A-Za-z0-9,._+-]+', name):
+                parser.error(f"Invalid board name in --dtbs: {name!r}")
+        if len(set(names)) != len(names):
+            parser.error("Board names in --dtbs must be unique")
+    if args.multi_spl and not (args.bl31 and args.uboot):
+        parser.error("--multi_spl requires --bl31 and --uboot")
+    if (args.external or args.position is not None) and not args.fit:
+        parser.error("--external and --position require --fit")
+    if args.position is not None and not args.external:
+        parser.error("--position requires --external")
+    if args.align <= 0 or args.align & (args.align - 1):
+        parser.error("--align must be a power of two")
     if args.cipher_iv:
         try:
-            cipher_iv = hex_to_iv_tuple(args.cipher_iv)
+            hex_to_iv_tuple(args.cipher_iv)
         except (TypeError, ValueError) as e:
             parser.error(f"Invalid cipher_iv: {e}")
+        # fit_writer does not encrypt: U-Boot would "decrypt" plaintext payloads
+        if args.fit:
+            parser.error("--fit cannot be combined with --cipher_iv, the payloads would not be "
+                         "encrypted; build the FIT from the ITS with mkimage -k <keys> instead")
+
+    profile = DEFAULT_PROFILE
+    if args.board_profile:
+        try:
+            profile = load_profile(args.board_profile)
+        except (OSError, ValueError) as e:
+            parser.error(f"Invalid --board-profile: {e}")
+    return profile
+
+def parse_dtb_arg(entry):
+    """
+    Splits a --dtbs entry, [NAME=]DTB, into the board name and the dtb
+    path. The name defaults to the file name without .dtb.
+    """
+    name, sep, path = entry.partition('=')
+    if not sep:
+        path = entry
+        name = os.path.basename(entry)
+        if name.endswith('.dtb'):
+            name = name[:-len('.dtb')]
+    return name, path
+
+def dtb_payload_name(n):
+    """Name of the payload of fdt-n, as used for its compression."""
+    return 'dtb' if n == 1 else f'dtb-{n}'
+
+def dtb_configurations(args):
+    """
+    Deduplicates the dtbs of --dtbs by content.
+
+    Returns:
+        tuple: The fdt images, one fdt-N per distinct dtb content in order
+        of first appearance, and the configurations, one conf-NAME per
+        board referencing the fdt image of its dtb and carrying the
+        compatible strings of its root node; see kernel_node_kwargs().
+    """
+    fdts = {}
+    configs = []
+    for entry in args.dtbs:
+        name, path = parse_dtb_arg(entry)
+        try:
+            key = sha256_file(path)
+            compatible = read_root_property(path, 'compatible')
+        except FileNotFoundError:
+            # Reported as not found with the other payloads
+            key = path
+            compatible = None
+        if key not in fdts:
+            fdts[key] = {'node_name': f"fdt-{len(fdts) + 1}", 'path': path, 'names': []}
+        fdts[key]['names'].append(name)
+        config = {'config_name': f"conf-{name}", 'fdt_name': fdts[key]['node_name'], 'name': name}
+        if compatible:
+            config['compatible'] = compatible.rstrip(b'\0').decode(errors='replace').split('\0')
+        configs.append(config)
+    for fdt in fdts.values():
+        fdt['description'] = f"kernel FDT for {', '.join(fdt.pop('names'))}"
+    return list(fdts.values()), configs
+
+def board_payloads(args):
+    """
+    Returns:
+        dict: image type -> path of every payload selected by args.
+    """
+    payloads = {'bl31': args.bl31, 'uboot': args.uboot, 'tee': args.tee}
+    if not args.multi_spl:
+        payloads['extlinux'] = args.extlinux
+    if args.kernel:
+        payloads.update(kernel=args.kernel, dtb=args.dtb, rootfs=args.rootfs)
+        if args.dtbs:
+            fdts, _ = dtb_configurations(args)
+            payloads.update((dtb_payload_name(n), fdt['path']) for n, fdt in enumerate(fdts, 1))
+    return {name: path for name, path in payloads.items() if path}
+
+def prepare_payloads(boards, args, payload_cache_size):
+    """
+    Decides the compression of every image of the boards, running the
+    advisor for --comp auto, and compresses all their payloads up front,
+    concurrently. A payload shared by several boards is compressed once;
+    the calls to check_and_compress() made by generate() reuse the results.
 
+    Args:
+        boards (list): (name, board args, board profile) tuples.
+        args (Namespace): The command line arguments.
+        payload_cache_size (int): Size the payload cache is trimmed to.
+
+    Returns:
+        list: image type -> compression dict of each board.
+    """
+    all_comps = []
+    for _, board_args, _ in boards:
+        # Compression of each image type, the advisor's choice with --comp auto
+        default_comp = 'none' if board_args.comp == 'auto' else board_args.comp
+        comps = dict.fromkeys(['bl31', 'uboot', 'tee', 'extlinux', 'kernel', 'dtb', 'rootfs'], default_comp)
+        comps.update(dict.fromkeys(board_payloads(board_args), default_comp))
+        all_comps.append(comps)
+
+    advising = [args.advise or board_args.comp == 'auto' for _, board_args, _ in boards]
+    if not any(advising) and all(board_args.comp == 'none' for _, board_args, _ in boards):
+        return all_comps
+
+    digests = cache = None
+    with contextlib.ExitStack() as stack:
+        if not args.no_payload_cache:
+            digests = stack.enter_context(open_cache(args))
+            cache = stack.enter_context(PayloadCache(args.payload_cache, payload_cache_size, digests))
+        if any(advising):
+            # Without the payload cache, the candidates are compressed to
+            # a temporary one rather than next to the inputs
+            advice_cache = cache or PayloadCache(stack.enter_context(tempfile.TemporaryDirectory()))
+            for (name, board_args, profile), comps, advise_board in zip(boards, all_comps, advising):
+                if advise_board:
+                    if name:
+                        print(f"Board {name}:")
+                    comps.update(advise_compression(board_payloads(board_args), profile,
+                                                    args.debug, args.jobs, advice_cache))
+            if cache is None:
+                _compressed_payloads.clear()
+        if not args.advise:
+            # compression -> paths, across all boards
+            groups = {}
+            for (_, board_args, _), comps in zip(boards, all_comps):
+                for name, path in board_payloads(board_args).items():
+                    groups.setdefault(comps[name], {})[path] = None
+            for comp, paths in groups.items():
+                if comp != 'none':
+                    compress_all(list(paths), comp, args.debug, args.jobs, cache, export=True)
+    if cache:
+        print(digests.report())
+        print(cache.report())
+    return all_comps
+
+def generate(args, comps, addresses=DEFAULT_ADDRESSES):
+    """
+    Writes the ITS files of a board, and its FIT images with --fit.
+
+    Args:
+        args (Namespace): The options of the board.
+        comps (dict): image type -> compression, see prepare_payloads().
+        addresses (dict): Load addresses and entry points per image type.
+    """
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    cipher_iv = hex_to_iv_tuple(args.cipher_iv) if args.cipher_iv else None
+    default_comp = 'none' if args.comp == 'auto' else args.comp
     img_types = ['bl31', 'uboot', 'tee', 'extlinux']
+
     if not args.multi_spl:
         for img_type in img_types:
             path = getattr(args, img_type)
             if path:
-                default_addr = default_addresses[img_type]
-                if args.comp == 'none':
+                default_addr = addresses[img_type]
+                if comps[img_type] == 'none':
                     ensure_uncompressed(path, args.debug)
-                if args.comp != 'none':
-                    path = check_and_compress(path, args.comp, args.debug)
+                if comps[img_type] != 'none':
+                    path = check_and_compress(path, comps[img_type], args.debug)
 
                 load_addr = args.load_addr if args.load_addr else default_addr['load_addr']
                 entry_point = args.entry_point if args.entry_point else default_addr['entry_point']
@@ -606,34 +1139,47 @@ def main():
                     'entry_point': entry_point,
                     'sha_algo': args.sha_algo,
                     'rsa_algo': args.rsa_algo,
-                    'compression': args.comp,
+                    'compression': comps[img_type],
                     'cipher': {'iv': cipher_iv} if cipher_iv else None
                 }
                 content = create_its(its_kwargs)
                 write_its(os.path.join(args.output_dir, f'{img_type}.its'), content)
+                if args.fit:
+                    write_fit_image(os.path.join(args.output_dir, f'{img_type}.itb'), create_fit(its_kwargs), args)
 
     if args.kernel:
-        if not args.dtb:
-            parser.error("--kernel requires --dtb")
-
-        default_kernel_addr = default_addresses['kernel']
-        default_fdt_addr = default_addresses['fdt']
-        default_ramdisk_addr = default_addresses['ramdisk']
+        default_kernel_addr = addresses['kernel']
+        default_fdt_addr = addresses['fdt']
+        default_ramdisk_addr = addresses['ramdisk']
 
         kernel_path = args.kernel
         dtb_path = args.dtb
         rootfs_path = args.rootfs
 
-        if args.comp == 'none':
-            paths_to_check = {'kernel': kernel_path, 'dtb': dtb_path, 'rootfs': rootfs_path}
-            for name, path in paths_to_check.items():
-                if path:
-                    ensure_uncompressed(path, args.debug)
-
-        if args.comp != 'none':
-            kernel_path = check_and_compress(kernel_path, args.comp, args.debug)
-            dtb_path = check_and_compress(dtb_path, args.comp, args.debug)
-            rootfs_path = check_and_compress(rootfs_path, args.comp, args.debug)
+        paths_to_check = {'kernel': kernel_path, 'dtb': dtb_path, 'rootfs': rootfs_path}
+        for name, path in paths_to_check.items():
+            if path and comps[name] == 'none':
+                ensure_uncompressed(path, args.debug)
+
+        if comps['kernel'] != 'none':
+            kernel_path = check_and_compress(kernel_path, comps['kernel'], args.debug)
+        if comps['dtb'] != 'none':
+            dtb_path = check_and_compress(dtb_path, comps['dtb'], args.debug)
+        if comps['rootfs'] != 'none':
+            rootfs_path = check_and_compress(rootfs_path, comps['rootfs'], args.debug)
+
+        fdts = configs = None
+        if args.dtbs:
+            fdts, configs = dtb_configurations(args)
+            for n, fdt in enumerate(fdts, 1):
+                fdt['compression'] = comps.get(dtb_payload_name(n), comps['dtb'])
+                if fdt['compression'] == 'none':
+                    ensure_uncompressed(fdt['path'], args.debug)
+                else:
+                    fdt['path'] = check_and_compress(fdt['path'], fdt['compression'], args.debug)
+            with _print_lock:
+                print(f"Kernel configurations in {args.output_dir}: {len(configs)} boards, "
+                      f"{len(fdts)} distinct fdt images")
 
         kernel_kwargs = {
             'kernel_path': kernel_path,
@@ -643,35 +1189,186 @@ def main():
             'entry_point': args.entry_point if args.entry_point else default_kernel_addr['entry_point'],
             'sha_algo': args.sha_algo,
             'rsa_algo': args.rsa_algo,
-            'compression': args.comp,
-            'dtb_load_addr': args.dtb_load_addr if args.dtb_load_addr else default_addresses['fdt']['load_addr'],
-            'rootfs_load_addr': args.rootfs_load_addr if args.rootfs_load_addr else default_addresses['ramdisk']['load_addr'],
+            'compression': comps['kernel'],
+            'compressions': {'ramdisk': comps['rootfs'], 'fdt': comps['dtb']},
+            'dtb_load_addr': args.dtb_load_addr if args.dtb_load_addr else addresses['fdt']['load_addr'],
+            'rootfs_load_addr': args.rootfs_load_addr if args.rootfs_load_addr else addresses['ramdisk']['load_addr'],
             'cipher': {'iv': cipher_iv} if cipher_iv else None
         }
+        if fdts:
+            kernel_kwargs.update(fdts=fdts, configs=configs)
         kernel_content = create_kernel_its(kernel_kwargs)
         write_its(os.path.join(args.output_dir, 'kernel.its'), kernel_content)
+        if args.fit:
+            write_fit_image(os.path.join(args.output_dir, 'kernel.itb'), create_kernel_fit(kernel_kwargs), args)
 
     if args.multi_spl:
-        if not (args.bl31 and args.uboot):
-            parser.error("--multi_spl requires --bl31 and --uboot")
         paths = {'bl31': args.bl31, 'uboot': args.uboot, 'tee': args.tee if args.tee else None}
-        if args.comp == 'none':
-            for img_type, path in paths.items():
-                if path:
-                    ensure_uncompressed(path, args.debug)
+        for img_type, path in paths.items():
+            if path and comps[img_type] == 'none':
+                ensure_uncompressed(path, args.debug)
 
         params = {
             'paths': paths,
-            'default_addresses': default_addresses,
+            'default_addresses': addresses,
             'sha_algo': args.sha_algo,
             'rsa_algo': args.rsa_algo,
-            'comp': args.comp,
+            'comp': default_comp,
+            'comps': {img_type: comps[img_type] for img_type in paths},
             'debug': args.debug,
             'cipher_iv': cipher_iv
         }
 
         content = create_multi_spl_its(params)
         write_its(os.path.join(args.output_dir, 'multi_spl.its'), content)
+        if args.fit:
+            write_fit_image(os.path.join(args.output_dir, 'multi_spl.itb'), create_multi_spl_fit(params), args)
+
+def load_manifest(path):
+    """
+    Loads a board manifest, YAML (with PyYAML) or JSON:
+
+        defaults:               # options shared by every board
+          comp: lz4
+          fit: true
+        boards:
+          evb-v1:
+            output_dir: out/evb-v1
+            bl31: bl31.bin
+            uboot: u-boot.bin
+            kernel: Image
+            dtb: evb-v1.dtb
+            addresses:          # overrides of DEFAULT_ADDRESSES
+              kernel: {load_addr: "0x110000000"}
+
+    Board options are the command line options in MANIFEST_OPTIONS,
+    with the values they take there; true/false for the flags. Paths are
+    relative to the directory of the manifest.
+
+    Returns:
+        list: (board name, command line arguments, addresses) tuples.
+
+    Raises:
+        ValueError: Malformed manifest.
+    """
+    with open(path, 'r') as f:
+        if path.endswith(('.yaml', '.yml')):
+            if yaml is None:
+                raise ValueError("YAML manifests need PyYAML (e.g., pip install pyyaml)")
+            try:
+                data = yaml.safe_load(f)
+            except yaml.YAMLError as e:
+                raise ValueError(f"{path}: {e}") from e
+        else:
+            try:
+                data = json.load(f)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}: {e}") from e
+    if not isinstance(data, dict) or not isinstance(data.get('boards'), dict) or not data['boards']:
+        raise ValueError(f"{path}: a manifest needs a boards mapping")
+    defaults = data.get('defaults') or {}
+    base_dir = os.path.dirname(os.path.abspath(path))
+
+    boards = []
+    for name, options in data['boards'].items():
+        if not isinstance(options, dict):
+            raise ValueError(f"{path}: board {name} must be a mapping")
+        options = {**defaults, **options}
+        addresses = {img_type: dict(addr) for img_type, addr in DEFAULT_ADDRESSES.items()}
+        for img_type, addr in (options.pop('addresses', None) or {}).items():
+            if img_type not in DEFAULT_ADDRESSES or not isinstance(addr, dict) or \
+                    set(addr) - {'load_addr', 'entry_point'}:
+                raise ValueError(f"{path}: board {name}: invalid addresses of {img_type}")
+            for key, value in addr.items():
+                try:
+                    int(str(value), 16)
+                except ValueError:
+                    raise ValueError(f"{path}: board {name}: invalid {img_type} {key} {value}") from None
+                addresses[img_type][key] = str(value)
+
+        argv = []
+        for key, value in options.items():
+            if key not in MANIFEST_OPTIONS:
+                raise ValueError(f"{path}: board {name}: unknown option {key}")
+            if value is None or value is False:
+                continue
+            if key == 'dtbs':
+                if isinstance(value, dict):
+                    value = [f"{board}={dtb}" for board, dtb in value.items()]
+                if not isinstance(value, list) or not value:
+                    raise ValueError(f"{path}: board {name}: dtbs must be a list or a mapping")
+                argv.append(MANIFEST_OPTIONS[key])
+                for entry in value:
+                    board, dtb = parse_dtb_arg(str(entry))
+                    argv.append(f"{board}={os.path.normpath(os.path.join(base_dir, dtb))}")
+                continue
+            if value is True:
+                argv.append(MANIFEST_OPTIONS[key])
+                continue
+            if key in MANIFEST_PATHS:
+                value = os.path.normpath(os.path.join(base_dir, str(value)))
+            elif key in ('align', 'position') and isinstance(value, int):
+                value = hex(value)
+            argv += [MANIFEST_OPTIONS[key], str(value)]
+        boards.append((str(name), argv, addresses))
+    return boards
+
+def main():
+    parser = build_parser()
+    args = parser.parse_args()
+
+    # Check for multiple occurrences of arguments
+    arg_names = ['bl31', 'uboot', 'tee', 'kernel', 'dtb', 'dtbs', 'rootfs', 'extlinux']
+    for arg_name in arg_names:
+        if getattr(args, arg_name) and sys.argv.count('--' + arg_name) > 1:
+            parser.error(f"Argument --{arg_name} can only be specified once.")
+
+    if args.jobs < 0:
+        parser.error("--jobs must not be negative")
+    try:
+        payload_cache_size = parse_size(args.payload_cache_size)
+    except ValueError:
+        parser.error(f"Invalid --payload-cache-size: {args.payload_cache_size}")
+
+    if not args.manifest:
+        boards = [(None, args, check_args(parser, args))]
+        addresses = [DEFAULT_ADDRESSES]
+    else:
+        if any(getattr(args, dest) != parser.get_default(dest) for dest in MANIFEST_OPTIONS):
+            parser.error("--manifest cannot be combined with board options, set them in the manifest")
+        try:
+            manifest = load_manifest(args.manifest)
+        except (OSError, ValueError) as e:
+            parser.error(f"Invalid --manifest: {e}")
+        boards = []
+        addresses = []
+        for name, argv, board_addresses in manifest:
+            try:
+                board_args = parser.parse_args(argv)
+                profile = check_args(parser, board_args)
+            except SystemExit:
+                print(f"Error in board {name} of {args.manifest}")
+                raise
+            board_args.debug = args.debug
+            boards.append((name, board_args, profile))
+            addresses.append(board_addresses)
+        output_dirs = [os.path.abspath(board_args.output_dir) for _, board_args, _ in boards]
+        if len(set(output_dirs)) != len(output_dirs):
+            parser.error("Every board of the manifest needs its own output_dir")
+
+    all_comps = prepare_payloads(boards, args, payload_cache_size)
+    if args.advise:
+        return
+
+    # Independent boards are generated in parallel
+    if len(boards) == 1:
+        generate(boards[0][1], all_comps[0], addresses[0])
+        return
+    with ThreadPoolExecutor(max_workers=min(args.jobs or default_jobs(), len(boards))) as executor:
+        futures = [executor.submit(generate, board_args, comps, board_addresses)
+                   for (_, board_args, _), comps, board_addresses in zip(boards, all_comps, addresses)]
+        for future in futures:
+            future.result()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+#
+# SPDX-License-Identifier: GPL-2.0+
+#
+# Copyright (C) 2025 Charleye <wangkart@aliyun.com>
+#
+# Content-addressed cache of compressed FIT payloads for generate_its.py.
+#
+# A compressed payload is stored under the SHA-256 of its input, the
+# algorithm and the level, e.g. ab/ab12...ef-gzip-6.gz, so an unchanged
+# kernel, dtb or ramdisk is never compressed twice, whatever its path.
+# Input digests come from digest_cache.py, so unchanged inputs are not
+# even re-read. Entries are written atomically and their mtime is
+# refreshed on every hit; once the cache holds more than max_size bytes
+# the least recently used entries are evicted, never the ones used by
+# the current run. Since a later run may evict them at any time, entries
+# are never referenced directly: export() places a reflink, hardlink or
+# copy of an entry at a stable path for the ITS files to point at.
+#
+# The default location is $XDG_CACHE_HOME/axp-tools/payloads,
+# overridden by the AXP_PAYLOAD_CACHE environment variable.
+#
+
+import os
+import hashlib
+from filecopy import stage_file
+
+DEFAULT_MAX_SIZE = 4 * 1024 * 1024 * 1024
+HASH_BLOCK_SIZE = 4 * 1024 * 1024
+
+def default_cache_dir():
+    path = os.environ.get('AXP_PAYLOAD_CACHE')
+    if path:
+        return path
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'axp-tools', 'payloads')
+
+def sha256_file(file_path):
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        while True:
+            block = f.read(HASH_BLOCK_SIZE)
+            if not block:
+                return sha256.hexdigest()
+            sha256.update(block)
+
+class PayloadCache:
+    """
+    On-disk cache of compressed payloads.
+
+    Args:
+        path (str): Cache directory, None for the default location.
+        max_size (int): Total size of the entries kept after eviction.
+        digests (DigestCache): Cache of the input digests, may be None.
+    """
+
+    def __init__(self, path=None, max_size=DEFAULT_MAX_SIZE, digests=None):
+        self.path = os.path.abspath(path or default_cache_dir())
+        self.max_size = max_size
+        self.digests = digests
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self._used = set()
+
+    def input_digest(self, file_path):
+        if self.digests is not None:
+            return self.digests.digest(file_path, 'sha256', sha256_file)
+        return sha256_file(file_path)
+
+    def entry_path(self, digest, algo, level, suffix):
+        """Return the path of the entry of a payload, whether it exists or not."""
+        return os.path.join(self.path, digest[:2], f"{digest}-{algo}-{level}{suffix}")
+
+    def lookup(self, digest, algo, level, suffix):
+        """
+        Return the cached compressed payload, or None on a miss.
+        """
+        path = self.entry_path(digest, algo, level, suffix)
+        self._used.add(path)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return path
+
+    def prepare(self, digest, algo, level, suffix):
+        """
+        Return the path to compress a missed payload to, creating its
+        directory. The caller writes it atomically.
+        """
+        path = self.entry_path(digest, algo, level, suffix)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._used.add(path)
+        return path
+
+    def export(self, entry, dst_path):
+        """
+        Make dst_path, replaced atomically, hold the content of an entry.
+        Entries are never written in place, so a hardlink is as safe as
+        a copy.
+
+        Returns:
+            str: The stage_file() strategy used.
+        """
+        tmp_path = dst_path + '.tmp'
+        try:
+            strategy, _ = stage_file(entry, tmp_path)
+            os.replace(tmp_path, dst_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return strategy
+
+    def entries(self):
+        """Return (mtime, size, path) of every entry."""
+        result = []
+        if not os.path.isdir(self.path):
+            return result
+        for root, _, files in os.walk(self.path):
+            for name in files:
+                # Entries being written by another run
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                result.append((st.st_mtime_ns, st.st_size, path))
+        return result
+
+    def evict(self):
+        """Remove least recently used entries until max_size is honoured."""
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_size:
+                break
+            if path in self._used:
+                continue
+            try:
+                os.remove(path)
+                self.evicted += 1
+                total -= size
+            except FileNotFoundError:
+                pass
+        return total
+
+    def close(self):
+        self.size = self.evict()
+
+    def report(self):
+        return (f"Payload cache: {self.hits} hits, {self.misses} misses, "
+                f"{self.evicted} evicted, {getattr(self, 'size', 0)} bytes in {self.path}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def add_payload_cache_arguments(parser):
+    """Add the --payload-cache/--payload-cache-size/--no-payload-cache options to a parser."""
+    parser.add_argument('--payload-cache', default=None, metavar='DIR',
+                        help=f'Compressed payload cache directory (default: {default_cache_dir()})')
+    parser.add_argument('--payload-cache-size', type=str, default='4G', metavar='SIZE',
+                        help='Size the payload cache is trimmed to, e.g. 512M (default: 4G)')
+    parser.add_argument('--no-payload-cache', action='store_true', default=False,
+                        help='Compress every payload again instead of reusing earlier compressions')
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+#
+# SPDX-License-Identifier: GPL-2.0+
+#
+# Copyright (C) 2025 Charleye <wangkart@aliyun.com>
+#
+# In-process compression of FIT payloads for generate_its.py.
+#
+# compress_payloads() compresses several images at once in a process
+# pool. Images larger than PARALLEL_THRESHOLD are split further:
+#   gzip   pigz-style single member, blocks deflated by a thread pool with
+#          fastzip.ParallelDeflater and joined by sync flushes
+#   zstd   multi-threaded zstd (see zstdio.py)
+# bzip2 uses the bz2 module, lz4 the lz4 package when installed and the
+# lz4 tool otherwise. Every output is a single standard stream (one gzip
+# member, one lz4 frame with independent blocks, ...), which is what the
+# U-Boot decompressors behind mkimage's compression property expect.
+#
+
+import os
+import bz2
+import time
+import zlib
+import struct
+import subprocess
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from fastzip import ParallelDeflater, default_jobs
+from zstdio import open_zstd_writer
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+SUFFIXES = {"gzip": ".gz", "lz4": ".lz4", "bzip2": ".bz2", "zstd": ".zst"}
+# Same defaults as the gzip, lz4, bzip2 and zstd tools
+DEFAULT_LEVELS = {"gzip": 6, "lz4": 1, "bzip2": 9, "zstd": 3}
+PARALLEL_THRESHOLD = 16 * 1024 * 1024
+GZIP_BLOCK_SIZE = 1024 * 1024
+IO_BLOCK_SIZE = 4 * 1024 * 1024
+
+def read_blocks(src, block_size=IO_BLOCK_SIZE):
+    while True:
+        block = src.read(block_size)
+        if not block:
+            return
+        yield block
+
+def gzip_file(src_path, dst_path, level, threads=1):
+    """
+    Write a single member gzip file, deflated in parallel when threads > 1.
+    The header has no name and a zero mtime, so the output is reproducible.
+    """
+    xfl = 2 if level == 9 else 4 if level == 1 else 0
+    crc = 0
+    size = 0
+    with open(src_path, 'rb') as src, open(dst_path, 'wb') as dst:
+        dst.write(struct.pack('<BBBBIBB', 0x1f, 0x8b, 8, 0, 0, xfl, 3))
+        if threads > 1:
+            executor = ThreadPoolExecutor(max_workers=threads)
+            compressor = ParallelDeflater(executor, threads, level, GZIP_BLOCK_SIZE)
+        else:
+            executor = None
+            compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+        try:
+            for block in read_blocks(src):
+                crc = zlib.crc32(block, crc)
+                size += len(block)
+                dst.write(compressor.compress(block))
+            dst.write(compressor.flush())
+        finally:
+            if executor:
+                executor.shutdown()
+        dst.write(struct.pack('<II', crc, size & 0xFFFFFFFF))
+
+def bzip2_file(src_path, dst_path, level):
+    with open(src_path, 'rb') as src, bz2.open(dst_path, 'wb', compresslevel=level) as dst:
+        for block in read_blocks(src):
+            dst.write(block)
+
+def lz4_file(src_path, dst_path, level):
+    if lz4 is None:
+        subprocess.run(['lz4', '-q', '-f', f'-{level}', src_path, dst_path], check=True)
+        return
+    # Same frame as the lz4 tool: independent 4 MiB blocks, content checksum
+    with open(src_path, 'rb') as src, lz4.frame.open(
+            dst_path, 'wb', compression_level=level, block_size=lz4.frame.BLOCKSIZE_MAX4MB,
+            block_linked=False, content_checksum=True) as dst:
+        for block in read_blocks(src):
+            dst.write(block)
+
+def zstd_file(src_path, dst_path, level, threads=1):
+    with open(src_path, 'rb') as src, open_zstd_writer(dst_path, level, threads) as dst:
+        for block in read_blocks(src):
+            dst.write(block)
+
+def compress_file(src_path, dst_path, comp_type, level=None, threads=1):
+    """
+    Compress src_path into dst_path, replaced atomically.
+
+    Args:
+        comp_type (str): gzip, lz4, bzip2 or zstd.
+        level (int): Compression level, the tool default if None.
+        threads (int): Threads used for gzip and zstd.
+
+    Returns:
+        dict: size, compressed size, seconds and the method used.
+    """
+    if comp_type not in SUFFIXES:
+        raise ValueError(f"Unsupported compression type: {comp_type}")
+    level = DEFAULT_LEVELS[comp_type] if level is None else level
+    threads = max(1, threads)
+    tmp_path = dst_path + '.tmp'
+    start = time.perf_counter()
+    try:
+        if comp_type == "gzip":
+            gzip_file(src_path, tmp_path, level, threads)
+            method = f"gzip -{level}" + (f", {threads} threads" if threads > 1 else "")
+        elif comp_type == "zstd":
+            zstd_file(src_path, tmp_path, level, threads)
+            method = f"zstd -{level}" + (f", {threads} threads" if threads > 1 else "")
+        elif comp_type == "bzip2":
+            bzip2_file(src_path, tmp_path, level)
+            method = f"bzip2 -{level}"
+        else:
+            lz4_file(src_path, tmp_path, level)
+            method = f"lz4 -{level}" + ("" if lz4 else " (tool)")
+        os.replace(tmp_path, dst_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return {'size': os.path.getsize(src_path), 'compressed': os.path.getsize(dst_path),
+            'seconds': time.perf_counter() - start, 'method': method}
+
+def compress_payloads(tasks, jobs=0):
+    """
+    Compress several payloads concurrently.
+
+    Args:
+        tasks (list): (source path, output path, comp_type, level) tuples.
+        jobs (int): Worker processes, all CPUs if 0. Payloads larger than
+            PARALLEL_THRESHOLD are also given that many threads.
+
+    Returns:
+        dict: source path -> compress_file() result.
+
+    Raises:
+        Exception: The first error raised by a worker.
+    """
+    jobs = jobs or default_jobs()
+    if not tasks:
+        return {}
+    if len(tasks) == 1 or jobs == 1:
+        return {src: compress_file(src, dst, comp_type, level,
+                                   jobs if os.path.getsize(src) > PARALLEL_THRESHOLD else 1)
+                for src, dst, comp_type, level in tasks}
+    with ProcessPoolExecutor(max_workers=min(jobs, len(tasks))) as executor:
+        futures = {src: executor.submit(compress_file, src, dst, comp_type, level,
+                                        jobs if os.path.getsize(src) > PARALLEL_THRESHOLD else 1)
+                   for src, dst, comp_type, level in tasks}
+        return {src: future.result() for src, future in futures.items()}
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+# Copyright (C) 2025, Charleye
+#
+# This script checks or unpacks an AXP file created by create_axp.py.
+#
+# verify reads the embedded XML and streams every member once through
+# its ZIP CRC-32 and the <Auth> algorithms of all <Img> nodes sharing it,
+# and checks the chunks of split images against their <Chunk> checksums.
+# extract writes the members to a directory with large sequential writes
+# (or a kernel side copy for stored members). Members are processed in
+# parallel by a thread pool, or by a process pool with --processes.
+#
+# Usage:
+#   python3 verify_axp.py verify <axp_file> [-j JOBS] [--processes] [ID...]
+#   python3 verify_axp.py extract <axp_file> [-o DIR] [-j JOBS] [--processes] [ID...]
+#
+# Options:
+#   -j, --jobs          Number of members processed in parallel (default: all CPUs)
+#   --processes         Use a process pool instead of threads
+#   -o, --output        Extract directory (default: AXP file name without extension)
+#   -V, --verbose       Enable verbose output
+#
+# For any questions, please contact: wangkart@aliyun.com
+
+import os
+import sys
+import time
+import zlib
+import hashlib
+import zipfile
+import argparse
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from axp_reader import AXPReader
+from create_axp import AUTH_ALGOS
+from fastzip import default_jobs, copy_file_data
+
+IO_BLOCK_SIZE = 16 * 1024 * 1024
+
+def group_members(axp, img_ids):
+    """
+    Group the images to process by the members holding them.
+
+    Returns:
+        dict: tuple of member names -> list of <Img> IDs, in XML order.
+    """
+    members = {}
+    for img_id in img_ids:
+        names = tuple(zinfo.filename for zinfo, _ in axp.parts(img_id))
+        members.setdefault(names, []).append(img_id)
+    return members
+
+def verify_member(axp_path, img_id, algos):
+    """
+    Stream the members of one image through their CRC-32 and the given
+    <Auth> algorithms. The chunks of a chunked image are also checked
+    against the CRC-32 and SHA-256 recorded in their <Chunk> node.
+
+    Args:
+        axp_path (str): AXP file.
+        img_id (str): <ID> of an image stored in the member.
+        algos (list): <Auth> algorithm codes to compute.
+
+    Returns:
+        dict: size, seconds, digests (algo -> hex digest) and error,
+        None when every member and chunk checksum matched.
+    """
+    start = time.perf_counter()
+    hashers = {algo: AUTH_ALGOS[algo]() for algo in algos}
+    result = {'size': 0, 'digests': {}, 'error': None}
+    try:
+        with AXPReader(axp_path) as axp:
+            for index, (zinfo, node_chunk) in enumerate(axp.parts(img_id)):
+                crc = 0
+                sha256 = hashlib.sha256() if node_chunk is not None else None
+                for block in axp.read_member_blocks(zinfo, IO_BLOCK_SIZE):
+                    crc = zlib.crc32(block, crc)
+                    for hasher in hashers.values():
+                        hasher.update(block)
+                    if sha256:
+                        sha256.update(block)
+                    result['size'] += len(block)
+                if crc != zinfo.CRC:
+                    result['error'] = f"CRC-32 mismatch in {zinfo.filename}"
+                elif node_chunk is not None and node_chunk.get('crc32') != f'{crc:08x}':
+                    result['error'] = f"chunk {index} CRC-32 mismatch"
+                elif node_chunk is not None and node_chunk.get('sha256') != sha256.hexdigest():
+                    result['error'] = f"chunk {index} SHA-256 mismatch"
+                if result['error']:
+                    break
+    except (OSError, zipfile.BadZipFile, zlib.error) as e:
+        result['error'] = str(e)
+    result['digests'] = {algo: hasher.hexdigest() for algo, hasher in hashers.items()}
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+def extract_member(axp_path, img_id, dst_path):
+    """
+    Write the members of one image to dst_path, joining its chunks.
+
+    Stored members are copied with copy_file_data(), deflated ones are
+    decompressed and written in IO_BLOCK_SIZE pieces. The output is
+    preallocated so it is laid out sequentially.
+
+    Returns:
+        dict: size, seconds and error.
+    """
+    start = time.perf_counter()
+    result = {'size': 0, 'error': None}
+    try:
+        with AXPReader(axp_path) as axp, open(dst_path, 'wb', buffering=0) as dst:
+            parts = axp.parts(img_id)
+            total_size = sum(zinfo.file_size for zinfo, _ in parts)
+            if total_size and hasattr(os, 'posix_fallocate'):
+                try:
+                    os.posix_fallocate(dst.fileno(), 0, total_size)
+                except OSError:
+                    pass
+            with open(axp_path, 'rb') as src:
+                for zinfo, _ in parts:
+                    if zinfo.compress_type == zipfile.ZIP_STORED:
+                        copy_file_data(src, axp.member_offset(zinfo), dst, zinfo.file_size)
+                        result['size'] += zinfo.file_size
+                    else:
+                        for block in axp.read_member_blocks(zinfo, IO_BLOCK_SIZE):
+                            dst.write(block)
+                            result['size'] += len(block)
+            dst.truncate(result['size'])
+    except (OSError, zipfile.BadZipFile, zlib.error) as e:
+        result['error'] = str(e)
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+def format_rate(size, seconds):
+    return f"{size / (1024 * 1024) / seconds:10.1f} MB/s" if seconds else "       inf MB/s"
+
+def new_executor(args):
+    jobs = args.jobs or default_jobs()
+    return ProcessPoolExecutor(jobs) if args.processes else ThreadPoolExecutor(jobs)
+
+def verify_axp(args):
+    """
+    Verify the members and <Auth> values of an AXP.
+
+    Returns:
+        int: Number of failed images.
+    """
+    with AXPReader(args.axp) as axp:
+        img_ids = args.ids or axp.all_ids()
+        # Every <Img> of the XML is reported, not only the stored ones
+        stored = set(axp.ids())
+        missing = {}
+        skipped = []
+        for img_id in img_ids:
+            names = axp.missing_members(img_id)
+            if names:
+                delta = axp.xml_node(img_id).find('Delta') is not None
+                hint = ", delta image, apply it with axp_delta.py first" if delta else ""
+                missing[img_id] = f"FAIL (missing member {', '.join(names)}{hint})"
+            elif img_id not in stored:
+                skipped.append(img_id)
+        members = group_members(axp, [img_id for img_id in img_ids if img_id in stored])
+        auths = {img_id: axp.node(img_id).find('Auth') for ids in members.values() for img_id in ids}
+
+    start = time.perf_counter()
+    with new_executor(args) as executor:
+        futures = {}
+        for name, ids in members.items():
+            algos = sorted({int(auths[img_id].get('algo') or 0) for img_id in ids} & AUTH_ALGOS.keys())
+            futures[name] = executor.submit(verify_member, args.axp, ids[0], algos)
+        results = {name: future.result() for name, future in futures.items()}
+    elapsed = time.perf_counter() - start
+
+    failures = len(missing)
+    total_size = 0
+    rows = {img_id: f"{img_id:<16} {'-':<24} {'-':>12} {'-':>8} {'-':>15}  {status}"
+            for img_id, status in [*missing.items(), *((img_id, "- (no file)") for img_id in skipped)]}
+    for names, ids in members.items():
+        result = results[names]
+        name = names[0] if len(names) == 1 else f'{names[0]} (+{len(names) - 1})'
+        total_size += result['size']
+        for img_id in ids:
+            auth = auths[img_id]
+            algo = int(auth.get('algo') or 0)
+            if result['error']:
+                status = f"FAIL ({result['error']})"
+            elif algo and algo not in AUTH_ALGOS:
+                status = f"FAIL (unknown Auth algo {algo})"
+            elif algo and (auth.text or '').strip().lower() != result['digests'][algo].lower():
+                status = f"FAIL (Auth {auth.text} != {result['digests'][algo]})"
+            else:
+                status = "OK" if algo else "OK (CRC-32 only)"
+            if status.startswith('FAIL'):
+                failures += 1
+            rows[img_id] = (f"{img_id:<16} {name:<24} {result['size']:>12} {result['seconds']:>8.2f} "
+                            f"{format_rate(result['size'], result['seconds']):>15}  {status}")
+
+    # In XML order, missing images included
+    print(f"{'ID':<16} {'file':<24} {'size':>12} {'seconds':>8} {'throughput':>15}  status")
+    for img_id in dict.fromkeys(img_ids):
+        print(rows[img_id])
+
+    print(f"{len(auths) + len(missing) + len(skipped)} images in {sum(len(names) for names in members)} members, "
+          f"{total_size} bytes verified in {elapsed:.2f} s ({format_rate(total_size, elapsed).strip()}), "
+          f"{failures} failed.")
+    if not auths:
+        print("Error: no image was verified.")
+        return max(failures, 1)
+    return failures
+
+def extract_axp(args):
+    """
+    Extract the members of an AXP and its XML into a directory.
+
+    Returns:
+        int: Number of members that could not be extracted.
+    """
+    output_dir = args.output or os.path.splitext(args.axp)[0]
+    os.makedirs(output_dir, exist_ok=True)
+    with AXPReader(args.axp) as axp:
+        members = group_members(axp, args.ids or axp.ids())
+        files = {names: axp.node(ids[0]).find('File').text for names, ids in members.items()}
+        with open(os.path.join(output_dir, os.path.basename(axp.xml_name)), 'wb') as f:
+            f.write(axp.xml_data)
+
+    start = time.perf_counter()
+    with new_executor(args) as executor:
+        futures = {files[names]: executor.submit(extract_member, args.axp, ids[0],
+                                                 os.path.join(output_dir, os.path.basename(files[names])))
+                   for names, ids in members.items()}
+        results = {name: future.result() for name, future in futures.items()}
+    elapsed = time.perf_counter() - start
+
+    failures = 0
+    total_size = 0
+    for name, result in results.items():
+        total_size += result['size']
+        if result['error']:
+            failures += 1
+            print(f"Error extracting {name}: {result['error']}")
+        elif args.verbose:
+            print(f"{name:<24} {result['size']:>12} {result['seconds']:>8.2f} "
+                  f"{format_rate(result['size'], result['seconds']):>15}")
+
+    print(f"{len(members)} files, {total_size} bytes extracted to {output_dir} "
+          f"in {elapsed:.2f} s ({format_rate(total_size, elapsed).strip()}).")
+    return failures
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Verify or extract an AXP file.',
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    verify = subparsers.add_parser('verify', help='Check member CRCs and <Auth> digests')
+    verify.set_defaults(func=verify_axp)
+    extract = subparsers.add_parser('extract', help='Extract the members into a directory')
+    extract.add_argument('-o', '--output', help='Extract directory (default: AXP file name without extension)')
+    extract.set_defaults(func=extract_axp)
+
+    for sub in (verify, extract):
+        sub.add_argument('axp', help='AXP file')
+        sub.add_argument('ids', nargs='*', metavar='ID', help='Images to process (default: all)')
+        sub.add_argument('-j', '--jobs', type=int, default=0,
+                         help='Number of members processed in parallel (default: all CPUs)')
+        sub.add_argument('--processes', action='store_true', default=False,
+                         help='Use a process pool instead of threads')
+        sub.add_argument('-V', '--verbose', action='store_true', default=False, help='Enable verbose output')
+
+    args = parser.parse_args()
+    if args.jobs < 0:
+        parser.error("--jobs must not be negative")
+    if not os.path.isfile(args.axp):
+        parser.error(f"The AXP file '{args.axp}' does not exist.")
+    return args
+
+def main():
+    args = parse_args()
+    try:
+        failures = args.func(args)
+    except (OSError, KeyError, zipfile.BadZipFile) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    if failures:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
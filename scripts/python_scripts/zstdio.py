@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+# Copyright (C) 2025, Charleye
+#
+# Streaming zstd files for the packaging scripts.
+#
+# The zstandard package is used when installed, with its multi-threaded
+# compressor. Otherwise the data is piped through the zstd command line
+# tool (-T for threads). Both produce standard .zst frames.
+#
+# For any questions, please contact: wangkart@aliyun.com
+
+import shutil
+import contextlib
+import subprocess
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ZSTD_MIN_LEVEL = 1
+ZSTD_MAX_LEVEL = 19
+ZSTD_DEFAULT_LEVEL = 3
+
+def zstd_backend():
+    """Return 'zstandard', 'zstd' (command line tool) or None."""
+    if zstandard is not None:
+        return 'zstandard'
+    if shutil.which('zstd'):
+        return 'zstd'
+    return None
+
+def _check_backend():
+    backend = zstd_backend()
+    if backend is None:
+        raise OSError("zstd support needs the zstandard package or the zstd tool "
+                      "(e.g., pip install zstandard or sudo apt-get install zstd)")
+    return backend
+
+@contextlib.contextmanager
+def open_zstd_writer(path, level=ZSTD_DEFAULT_LEVEL, threads=1):
+    """
+    Open path for writing a zstd compressed stream.
+
+    Args:
+        path (str): Output file.
+        level (int): Compression level, ZSTD_MIN_LEVEL to ZSTD_MAX_LEVEL.
+        threads (int): Compression threads.
+
+    Yields:
+        file: Binary file object taking the uncompressed data.
+    """
+    if not ZSTD_MIN_LEVEL <= level <= ZSTD_MAX_LEVEL:
+        raise ValueError(f"zstd level must be between {ZSTD_MIN_LEVEL} and {ZSTD_MAX_LEVEL}")
+    if _check_backend() == 'zstandard':
+        cctx = zstandard.ZstdCompressor(level=level, threads=threads if threads > 1 else 0)
+        with open(path, 'wb') as raw, cctx.stream_writer(raw, closefd=False) as writer:
+            yield writer
+        return
+
+    with open(path, 'wb') as raw:
+        proc = subprocess.Popen(['zstd', '-q', f'-{level}', f'-T{threads}', '-c'],
+                                stdin=subprocess.PIPE, stdout=raw)
+        try:
+            yield proc.stdin
+        finally:
+            proc.stdin.close()
+            returncode = proc.wait()
+    if returncode:
+        raise OSError(f"zstd failed with code {returncode}")
+
+@contextlib.contextmanager
+def open_zstd_reader(path):
+    """
+    Open a zstd compressed file for reading.
+
+    Yields:
+        file: Binary file object returning the decompressed data.
+    """
+    if _check_backend() == 'zstandard':
+        with open(path, 'rb') as raw, zstandard.ZstdDecompressor().stream_reader(raw) as reader:
+            yield reader
+        return
+
+    proc = subprocess.Popen(['zstd', '-q', '-d', '-c', path], stdout=subprocess.PIPE)
+    try:
+        yield proc.stdout
+    finally:
+        proc.stdout.close()
+        returncode = proc.wait()
+    if returncode:
+        raise OSError(f"zstd failed with code {returncode}")